@@ -0,0 +1,170 @@
+"""Compare checkpoint sizes of the default and the compact serializer.
+
+Builds the checkpoints a conversation produces (initial translation followed by
+refinements) for documents of several lengths. The size gained by storing the
+repeated strings once and the size gained by zstd are reported separately,
+along with the serialization time of each serializer.
+
+The documents are drawn from a vocabulary of a few thousand words with a
+Zipf distribution, close to how words repeat in real text. A real corpus can
+be used instead by passing a UTF-8 text file, the source and the translation
+being taken from different parts of it.
+
+Usage:
+    python benchmarks/checkpoint_size.py
+    python benchmarks/checkpoint_size.py corpus.txt
+"""
+
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+import zstandard
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from translate_graph.checkpoint_serializer import CompactSerializer  # noqa: E402
+
+VOCABULARY_SIZE = 5000
+WORD_COUNTS = (200, 2000, 10000)
+
+
+def build_vocabulary(size: int, seed: int) -> list[str]:
+    """Build pseudo-random words with the lengths of English words."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        length = max(1, min(14, round(rng.gauss(6, 2.5))))
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return sorted(words)
+
+
+class DocumentSource:
+    """Documents of a given length, from a Zipf vocabulary or a corpus."""
+
+    def __init__(self, corpus: str = None):
+        """Initialize the source, from a corpus if one is given."""
+        self.corpus_words = corpus.split() if corpus else None
+        self.vocabulary = build_vocabulary(VOCABULARY_SIZE, seed=0)
+        # Zipf weights: the n-th most frequent word appears about 1/n as often
+        self.weights = [1 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+
+    def document(self, word_count: int, seed: int) -> str:
+        """Build a document of the given length, different for each seed."""
+        rng = random.Random(seed)
+        if self.corpus_words:
+            start = rng.randrange(max(1, len(self.corpus_words) - word_count))
+            return " ".join(self.corpus_words[start : start + word_count])
+
+        words = rng.choices(self.vocabulary, self.weights, k=word_count)
+        sentences = []
+        while words:
+            length = rng.randint(8, 20)
+            sentence, words = words[:length], words[length:]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+        return " ".join(sentences)
+
+
+def build_checkpoint(source: DocumentSource, word_count: int, refinements: int) -> dict:
+    """Build the last checkpoint of a conversation with some refinements."""
+    original_text = source.document(word_count, seed=1)
+    messages = [HumanMessage(content=original_text)]
+    translation = source.document(word_count, seed=2)
+    messages.append(AIMessage(content=translation))
+    rng = random.Random(3)
+    for index in range(refinements):
+        messages.append(HumanMessage(content=f"Use another word for term {index}"))
+        # Refinements mostly keep the previous translation
+        words = translation.split()
+        position = rng.randrange(len(words))
+        words[position] = source.document(1, seed=index + 10).rstrip(".").lower()
+        translation = " ".join(words)
+        messages.append(AIMessage(content=translation))
+
+    return {
+        "v": 4,
+        "id": "1ef4f797-8335-6428-8001-8a1503f9b875",
+        "ts": "2024-05-04T06:32:42.235444+00:00",
+        "channel_values": {
+            "messages": messages,
+            "original_text": original_text,
+            "source_language": "en",
+            "target_language": "es",
+            "user_id": "user",
+            "__interrupt__": translation,
+        },
+        "channel_versions": {"messages": 2 * refinements + 2},
+        "versions_seen": {},
+    }
+
+
+def measure(serializer, checkpoint: dict, repeat: int = 20) -> tuple[int, float]:
+    """Return the serialized size and the mean round-trip time in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = serializer.dumps_typed(checkpoint)
+        serializer.loads_typed(payload)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+    return len(payload[1]), elapsed_ms
+
+
+def main():
+    """Run the benchmark and print the results."""
+    default_serializer = JsonPlusSerializer()
+    compact_serializer = CompactSerializer()
+    compressor = zstandard.ZstdCompressor(level=compact_serializer.level)
+    decompressor = zstandard.ZstdDecompressor()
+    corpus = (
+        Path(sys.argv[1]).read_text(encoding="utf-8") if len(sys.argv) == 2 else None
+    )
+    source = DocumentSource(corpus)
+
+    table = Table(title="Checkpoint size: default vs compact serializer")
+    table.add_column("Words")
+    table.add_column("Refinements")
+    table.add_column("Default (bytes)", justify="right")
+    table.add_column("Dedup (bytes)", justify="right")
+    table.add_column("Dedup + zstd (bytes)", justify="right")
+    table.add_column("Dedup gain", justify="right")
+    table.add_column("zstd gain", justify="right")
+    table.add_column("zstd alone", justify="right")
+    table.add_column("Default (ms)", justify="right")
+    table.add_column("Compact (ms)", justify="right")
+
+    for word_count in WORD_COUNTS:
+        for refinements in (0, 3):
+            checkpoint = build_checkpoint(source, word_count, refinements)
+            default_size, default_ms = measure(default_serializer, checkpoint)
+            compact_size, compact_ms = measure(compact_serializer, checkpoint)
+            # Envelope before compression: the size with deduplication only
+            dedup_size = len(
+                decompressor.decompress(compact_serializer.dumps_typed(checkpoint)[1])
+            )
+            # Compression of the default payload, without deduplication
+            zstd_size = len(
+                compressor.compress(default_serializer.dumps_typed(checkpoint)[1])
+            )
+            table.add_row(
+                str(word_count),
+                str(refinements),
+                f"{default_size:,}",
+                f"{dedup_size:,}",
+                f"{compact_size:,}",
+                f"{default_size / dedup_size:.1f}x",
+                f"{dedup_size / compact_size:.1f}x",
+                f"{default_size / zstd_size:.1f}x",
+                f"{default_ms:.2f}",
+                f"{compact_ms:.2f}",
+            )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
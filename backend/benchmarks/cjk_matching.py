@@ -0,0 +1,134 @@
+"""Compare glossary matching by words and by character n-grams on CJK and Thai text.
+
+Builds pseudo-random documents from the characters of each script, plants known
+glossary terms inside their sentences and reports the matching time and the
+share of planted terms found (recall) by each mode. A real corpus can
+be used instead by passing a UTF-8 text file and its language code.
+
+Usage:
+    python benchmarks/cjk_matching.py
+    python benchmarks/cjk_matching.py corpus.txt zh
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from translate_graph.match_words import (  # noqa: E402
+    CHARACTERS_MODE,
+    WORDS_MODE,
+    GlossaryMatcher,
+)
+
+
+def char_range(first: int, last: int) -> str:
+    """Get the characters between two code points, both included."""
+    return "".join(chr(code) for code in range(first, last + 1))
+
+
+# Characters of each script and the separator between its sentences
+ALPHABETS = {
+    "zh": (char_range(0x4E00, 0x4E00 + 3000), "。"),
+    "ja": (char_range(0x3041, 0x3096) + char_range(0x4E00, 0x4E00 + 1500), "。"),
+    "th": (char_range(0x0E01, 0x0E30), " "),
+}
+
+GLOSSARY_SIZES = (100, 1000)
+DOCUMENT_CHARS = (2000, 20000)
+PLANTED_TERMS = 50
+
+
+def build_glossary(alphabet: str, size: int, seed: int) -> dict:
+    """Build a glossary of pseudo-random terms of 2 to 6 characters."""
+    rng = random.Random(seed)
+    glossary = {}
+    while len(glossary) < size:
+        term = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 6)))
+        glossary[term] = {"id": len(glossary), "target": f"term {len(glossary)}"}
+    return glossary
+
+
+def build_document(
+    alphabet: str, separator: str, chars: int, terms: list[str], seed: int
+) -> str:
+    """Build sentences of random characters with the given terms planted inside them."""
+    rng = random.Random(seed)
+    sentences = []
+    for term in terms:
+        length = chars // len(terms)
+        sentence = "".join(rng.choice(alphabet) for _ in range(length))
+        position = rng.randint(0, length)
+        sentences.append(sentence[:position] + term + sentence[position:])
+    return separator.join(sentences)
+
+
+def measure(
+    matcher: GlossaryMatcher, text: str, planted: list[str]
+) -> tuple[float, float]:
+    """Return the matching time in milliseconds and the recall of the planted terms."""
+    started = time.perf_counter()
+    spans = matcher.find_spans(text)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    found = {span.term for span in spans}
+    return elapsed_ms, sum(term in found for term in planted) / len(planted)
+
+
+def run(table: Table, language: str, text: str, glossary: dict, planted: list[str]):
+    """Add the results of both modes on a document to the table."""
+    row = [language, f"{len(glossary):,}", f"{len(text):,}"]
+    for mode in (WORDS_MODE, CHARACTERS_MODE):
+        compile_started = time.perf_counter()
+        matcher = GlossaryMatcher(glossary, mode=mode)
+        compile_ms = (time.perf_counter() - compile_started) * 1000
+        elapsed_ms, recall = measure(matcher, text, planted)
+        row += [f"{compile_ms:.1f}", f"{elapsed_ms:.1f}", f"{recall:.0%}"]
+    table.add_row(*row)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    table = Table(title="Glossary matching: words vs character n-grams")
+    table.add_column("Lang")
+    table.add_column("Terms", justify="right")
+    table.add_column("Chars", justify="right")
+    for mode in ("Words", "Chars"):
+        table.add_column(f"{mode} compile (ms)", justify="right")
+        table.add_column(f"{mode} match (ms)", justify="right")
+        table.add_column(f"{mode} recall", justify="right")
+
+    if len(sys.argv) == 3:
+        text = Path(sys.argv[1]).read_text(encoding="utf-8")
+        language = sys.argv[2]
+        rng = random.Random(1)
+        # Terms are taken from the corpus itself so every one of them occurs
+        planted = []
+        for _ in range(PLANTED_TERMS):
+            start = rng.randrange(max(1, len(text) - 6))
+            planted.append(text[start : start + rng.randint(2, 6)].strip() or text[0])
+        glossary = {
+            term: {"id": index, "target": f"term {index}"}
+            for index, term in enumerate(dict.fromkeys(planted))
+        }
+        run(table, language, text, glossary, list(glossary))
+    else:
+        for language, (alphabet, separator) in ALPHABETS.items():
+            for size in GLOSSARY_SIZES:
+                glossary = build_glossary(alphabet, size, seed=size)
+                planted = random.Random(2).sample(list(glossary), PLANTED_TERMS)
+                for chars in DOCUMENT_CHARS:
+                    text = build_document(
+                        alphabet, separator, chars, planted, seed=chars
+                    )
+                    run(table, language, text, glossary, planted)
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measure the prompt tokens saved by masking the non-translatable spans of a text.
+
+Masks sample texts full of HTML tags, URLs, placeholders and code, and reports
+the estimated tokens of the text sent to the model with and without masking,
+along with the time taken to mask and to restore the spans. A real text can be
+measured instead by passing a UTF-8 file.
+
+Usage:
+    python benchmarks/masking_tokens.py
+    python benchmarks/masking_tokens.py page.html
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from translate_graph.masking import mask_text  # noqa: E402
+from utils.token_estimator import raw_token_estimate  # noqa: E402
+
+# Times each sample is repeated, so the text has the size of a real page
+REPETITIONS = 20
+
+SAMPLES = {
+    "HTML": (
+        '<p class="intro">Welcome to <a href="https://shop.example.com/en/home?ref=nav">'
+        '<strong>our store</strong></a>. Check the <span class="badge badge-new">new</span> '
+        'arrivals and <em>save up to 30%</em> this week.</p>\n<ul><li><a href="/account">'
+        'Your account</a></li><li><a href="/orders">Your orders</a></li></ul>\n'
+    ),
+    "URLs": (
+        "Read the guide at https://docs.example.com/guides/getting-started/install?os=linux#step-2 "
+        "before you start. Questions go to support@example.com, and the release notes are "
+        "published at https://github.com/example/project/releases/tag/v2.14.0.\n"
+    ),
+    "Placeholders": (
+        "Hello {{ user.first_name }}, you have {count} new messages from {sender}. "
+        "Your order %1$s was shipped on %2$s to ${address.city}. "
+        "Uploaded %(done)d of %(total)d files.\n"
+    ),
+    "Markdown": (
+        "Run `pip install -r requirements.txt` and then `uvicorn main:app --reload`.\n\n"
+        "```python\nfrom client import Client\n\nclient = Client(api_key=KEY)\n"
+        'print(client.translate("Hello", target="es"))\n```\n\n'
+        "The `translate` method returns the translated text.\n"
+    ),
+    "Prose": (
+        "The committee met on Tuesday to review the budget for the coming year. "
+        "Most members agreed that the library needs a new roof before the winter.\n"
+    ),
+}
+
+
+def run(table: Table, name: str, text: str):
+    """Add the token counts of a text, with and without masking, to the table."""
+    started = time.perf_counter()
+    masked = mask_text(text)
+    mask_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    restored = masked.restore(masked.text)
+    restore_ms = (time.perf_counter() - started) * 1000
+    assert restored == text, f"{name}: the masked spans weren't restored"
+
+    before = raw_token_estimate(text)
+    after = raw_token_estimate(masked.text)
+    table.add_row(
+        name,
+        f"{len(text):,}",
+        f"{len(masked.codes):,}",
+        f"{before:,}",
+        f"{after:,}",
+        f"{1 - after / before:.0%}" if before else "-",
+        f"{mask_ms:.2f}",
+        f"{restore_ms:.2f}",
+    )
+
+
+def main():
+    """Run the benchmark and print the results."""
+    table = Table(title="Prompt tokens with non-translatable spans masked")
+    table.add_column("Text")
+    table.add_column("Chars", justify="right")
+    table.add_column("Masked spans", justify="right")
+    table.add_column("Tokens before", justify="right")
+    table.add_column("Tokens after", justify="right")
+    table.add_column("Saved", justify="right")
+    table.add_column("Mask (ms)", justify="right")
+    table.add_column("Restore (ms)", justify="right")
+
+    if len(sys.argv) == 2:
+        path = Path(sys.argv[1])
+        run(table, path.name, path.read_text(encoding="utf-8"))
+    else:
+        for name, sample in SAMPLES.items():
+            run(table, name, sample * REPETITIONS)
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,35 @@ import os
 
 from dotenv import load_dotenv
 
+from constants import (
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ANONYMOUS_TOKEN_SHARE,
+    CHARACTER_MATCHING_LANGUAGES,
+    CHECKPOINT_TTL_SECONDS,
+    CHECKPOINT_VACUUM_INTERVAL_SECONDS,
+    DEDUPLICATION_MIN_RATIO,
+    DOCUMENT_CONCURRENCY,
+    DOCUMENT_SEGMENT_WINDOW,
+    FAST_MODEL_MAX_CHARS,
+    GLOSSARY_TOKEN_BUDGET,
+    IMPROVEMENT_CACHE_MAX_CONVERSATIONS,
+    IMPROVEMENT_CACHE_TTL_SECONDS,
+    IMPROVEMENT_GATE_THRESHOLD,
+    MATCH_SESSION_MAX,
+    MATCH_SESSION_TTL_SECONDS,
+    MAX_CHECKPOINTS_PER_THREAD,
+    MAX_DOCUMENT_BYTES,
+    MAX_IN_FLIGHT_LLM_CALLS,
+    MAX_INPUT_TOKENS,
+    MAX_TRANSLATION_TARGETS,
+    PAID_RESERVED_TOKEN_SHARE,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_PROBE_INTERVAL_SECONDS,
+    RULES_TOKEN_BUDGET,
+    SEGMENT_REFINEMENT_MAX_SHARE,
+)
+
 load_dotenv()
 
 
@@ -20,6 +49,74 @@ class Config:
         """Get database path."""
         return os.getenv("DATABASE_PATH")
 
+    @property
+    def STATE_DATABASE_PATH(self) -> str:
+        """Get the SQLite path used for shared runtime state (caches, rate limits)."""
+        return os.getenv("STATE_DATABASE_PATH") or self._data_file("runtime_state.db")
+
+    @property
+    def CHECKPOINT_DATABASE_PATH(self) -> str:
+        """Get the SQLite path used to persist conversation checkpoints."""
+        return os.getenv("CHECKPOINT_DATABASE_PATH") or self._data_file(
+            "checkpoints.db"
+        )
+
+    @property
+    def CHECKPOINT_TTL_SECONDS(self) -> int:
+        """Get the idle time after which a conversation is deleted."""
+        return int(os.getenv("CHECKPOINT_TTL_SECONDS", CHECKPOINT_TTL_SECONDS))
+
+    @property
+    def MAX_CHECKPOINTS_PER_THREAD(self) -> int:
+        """Get the number of checkpoints retained per conversation."""
+        return int(os.getenv("MAX_CHECKPOINTS_PER_THREAD", MAX_CHECKPOINTS_PER_THREAD))
+
+    @property
+    def CHECKPOINT_SERIALIZER(self) -> str:
+        """Get the checkpoint serializer ("compact" or "default")."""
+        return os.getenv("CHECKPOINT_SERIALIZER", "compact").lower()
+
+    @property
+    def CHECKPOINT_VACUUM_INTERVAL_SECONDS(self) -> int:
+        """Get the interval between checkpoint maintenance runs."""
+        return int(
+            os.getenv(
+                "CHECKPOINT_VACUUM_INTERVAL_SECONDS", CHECKPOINT_VACUUM_INTERVAL_SECONDS
+            )
+        )
+
+    @property
+    def STATE_BACKEND(self) -> str:
+        """Get where per-conversation runtime state lives ("memory" or "sqlite").
+
+        Defaults to "sqlite" when several workers are started, since every
+        worker must see the state written by the others.
+        """
+        default_backend = "sqlite" if self.API_WORKERS > 1 else "memory"
+        return os.getenv("STATE_BACKEND", default_backend).lower()
+
+    @property
+    def IMPROVEMENT_CACHE_BACKEND(self) -> str:
+        """Get improvement cache backend ("memory" or "sqlite")."""
+        return os.getenv("IMPROVEMENT_CACHE_BACKEND", self.STATE_BACKEND).lower()
+
+    @property
+    def IMPROVEMENT_CACHE_TTL_SECONDS(self) -> int:
+        """Get how long an improvement suggestion is kept."""
+        return int(
+            os.getenv("IMPROVEMENT_CACHE_TTL_SECONDS", IMPROVEMENT_CACHE_TTL_SECONDS)
+        )
+
+    @property
+    def IMPROVEMENT_CACHE_MAX_CONVERSATIONS(self) -> int:
+        """Get the maximum number of conversations kept in the improvement cache."""
+        return int(
+            os.getenv(
+                "IMPROVEMENT_CACHE_MAX_CONVERSATIONS",
+                IMPROVEMENT_CACHE_MAX_CONVERSATIONS,
+            )
+        )
+
     @property
     def API_HOST(self) -> str:
         """Get API host."""
@@ -35,6 +132,11 @@ class Config:
         """Get API reload setting."""
         return os.getenv("API_RELOAD", "true").lower() == "true"
 
+    @property
+    def API_WORKERS(self) -> int:
+        """Get the number of uvicorn worker processes."""
+        return int(os.getenv("API_WORKERS", "1"))
+
     @property
     def CORS_ORIGINS(self) -> list:
         """Get CORS origins."""
@@ -50,6 +152,182 @@ class Config:
         """Get LLM model."""
         return os.getenv("OPENAI_LLM_MODEL", "")
 
+    @property
+    def GOOGLE_API_KEYS(self) -> list:
+        """Get the pool of Google API keys. Empty uses GOOGLE_API_KEY."""
+        keys = os.getenv("GOOGLE_API_KEYS", "").split(",")
+        return [key.strip() for key in keys if key.strip()]
+
+    @property
+    def OPENAI_API_KEYS(self) -> list:
+        """Get the pool of OpenAI API keys. Empty uses OPENAI_API_KEY."""
+        keys = os.getenv("OPENAI_API_KEYS", "").split(",")
+        return [key.strip() for key in keys if key.strip()]
+
+    @property
+    def FAST_LLM_MODEL(self) -> str:
+        """Get the optional fast, cheap model used for short texts."""
+        return os.getenv("FAST_LLM_MODEL", "")
+
+    @property
+    def ROUTING_POLICY(self) -> str:
+        """Get the model routing policy ("static" or "adaptive")."""
+        return os.getenv("ROUTING_POLICY", "adaptive")
+
+    @property
+    def FAST_MODEL_MAX_CHARS(self) -> int:
+        """Get the maximum length of a text routed to the fast model."""
+        return int(os.getenv("FAST_MODEL_MAX_CHARS", FAST_MODEL_MAX_CHARS))
+
+    @property
+    def FAST_MODEL_LANGUAGE_PAIRS(self) -> list:
+        """Get the language pairs (e.g. "en-es") allowed on the fast model. Empty allows all."""
+        pairs = os.getenv("FAST_MODEL_LANGUAGE_PAIRS", "").split(",")
+        return [pair.strip() for pair in pairs if pair.strip()]
+
+    @property
+    def ROUTER_MAX_ERROR_RATE(self) -> float:
+        """Get the error rate above which the router avoids a model."""
+        return float(os.getenv("ROUTER_MAX_ERROR_RATE", ROUTER_MAX_ERROR_RATE))
+
+    @property
+    def ROUTER_LATENCY_SLO_SECONDS(self) -> float:
+        """Get the primary model latency above which faster models are preferred (0 disables it)."""
+        return float(os.getenv("ROUTER_LATENCY_SLO_SECONDS", "0"))
+
+    @property
+    def ROUTER_PROBE_INTERVAL_SECONDS(self) -> float:
+        """Get the seconds between the probe calls sent to a model the router avoids."""
+        return float(
+            os.getenv("ROUTER_PROBE_INTERVAL_SECONDS", ROUTER_PROBE_INTERVAL_SECONDS)
+        )
+
+    @property
+    def COMBINED_REFINEMENT(self) -> bool:
+        """Get whether refinements also extract improvements in the same LLM call."""
+        return os.getenv("COMBINED_REFINEMENT", "false").lower() == "true"
+
+    @property
+    def SEGMENT_REFINEMENT(self) -> bool:
+        """Get whether refinements only rewrite the sentences the feedback is about."""
+        return os.getenv("SEGMENT_REFINEMENT", "false").lower() == "true"
+
+    @property
+    def SEGMENT_REFINEMENT_MAX_SHARE(self) -> float:
+        """Get the share of sentences above which the whole translation is refined."""
+        return float(
+            os.getenv("SEGMENT_REFINEMENT_MAX_SHARE", SEGMENT_REFINEMENT_MAX_SHARE)
+        )
+
+    @property
+    def SEGMENT_DEDUPLICATION(self) -> bool:
+        """Get whether the repeated segments of a text are translated only once."""
+        return os.getenv("SEGMENT_DEDUPLICATION", "false").lower() == "true"
+
+    @property
+    def DEDUPLICATION_MIN_RATIO(self) -> float:
+        """Get the share of repeated segments from which distinct segments are translated once."""
+        return float(os.getenv("DEDUPLICATION_MIN_RATIO", DEDUPLICATION_MIN_RATIO))
+
+    @property
+    def MASK_NON_TRANSLATABLE(self) -> bool:
+        """Get whether tags, URLs, code and placeholders are masked in the translation prompt."""
+        return os.getenv("MASK_NON_TRANSLATABLE", "true").lower() == "true"
+
+    @property
+    def GLOSSARY_REPAIR(self) -> bool:
+        """Get whether translated sentences missing glossary targets are sent back to the model."""
+        return os.getenv("GLOSSARY_REPAIR", "false").lower() == "true"
+
+    @property
+    def IMPROVEMENT_GATE_THRESHOLD(self) -> float:
+        """Get the minimum gate score to run the improvement extraction call."""
+        return float(
+            os.getenv("IMPROVEMENT_GATE_THRESHOLD", IMPROVEMENT_GATE_THRESHOLD)
+        )
+
+    @property
+    def MAX_INPUT_TOKENS(self) -> int:
+        """Get the largest text accepted by the translation endpoints, in estimated tokens."""
+        return int(os.getenv("MAX_INPUT_TOKENS", MAX_INPUT_TOKENS))
+
+    @property
+    def MAX_DOCUMENT_BYTES(self) -> int:
+        """Get the largest document accepted for translation, in bytes."""
+        return int(os.getenv("MAX_DOCUMENT_BYTES", MAX_DOCUMENT_BYTES))
+
+    @property
+    def DOCUMENT_SEGMENT_WINDOW(self) -> int:
+        """Get the segments of a document in flight or waiting to be written."""
+        return int(os.getenv("DOCUMENT_SEGMENT_WINDOW", DOCUMENT_SEGMENT_WINDOW))
+
+    @property
+    def DOCUMENT_CONCURRENCY(self) -> int:
+        """Get the segments of a document translated at once."""
+        return int(os.getenv("DOCUMENT_CONCURRENCY", DOCUMENT_CONCURRENCY))
+
+    @property
+    def MAX_TRANSLATION_TARGETS(self) -> int:
+        """Get the maximum number of target languages of a multi-target translation."""
+        return int(os.getenv("MAX_TRANSLATION_TARGETS", MAX_TRANSLATION_TARGETS))
+
+    @property
+    def CHARACTER_MATCHING_LANGUAGES(self) -> list:
+        """Get the source languages whose glossary terms are matched by characters instead of words."""
+        languages = os.getenv(
+            "CHARACTER_MATCHING_LANGUAGES", ",".join(CHARACTER_MATCHING_LANGUAGES)
+        ).split(",")
+        return [language.strip().lower() for language in languages if language.strip()]
+
+    @property
+    def GLOSSARY_TOKEN_BUDGET(self) -> int:
+        """Get the tokens of glossary matches sent with a translation, in estimated tokens."""
+        return int(os.getenv("GLOSSARY_TOKEN_BUDGET", GLOSSARY_TOKEN_BUDGET))
+
+    @property
+    def MATCH_SESSION_TTL_SECONDS(self) -> int:
+        """Get the idle time before an incremental glossary matching session expires."""
+        return int(os.getenv("MATCH_SESSION_TTL_SECONDS", MATCH_SESSION_TTL_SECONDS))
+
+    @property
+    def MATCH_SESSION_MAX(self) -> int:
+        """Get the maximum incremental glossary matching sessions kept per worker."""
+        return int(os.getenv("MATCH_SESSION_MAX", MATCH_SESSION_MAX))
+
+    @property
+    def RULES_TOKEN_BUDGET(self) -> int:
+        """Get the tokens of language rules sent with a translation, in estimated tokens."""
+        return int(os.getenv("RULES_TOKEN_BUDGET", RULES_TOKEN_BUDGET))
+
+    @property
+    def MAX_IN_FLIGHT_LLM_CALLS(self) -> int:
+        """Get the maximum number of graph runs calling the LLM at once per worker."""
+        return int(os.getenv("MAX_IN_FLIGHT_LLM_CALLS", MAX_IN_FLIGHT_LLM_CALLS))
+
+    @property
+    def ADMISSION_QUEUE_SIZE(self) -> int:
+        """Get the maximum number of requests waiting for an LLM slot per worker."""
+        return int(os.getenv("ADMISSION_QUEUE_SIZE", ADMISSION_QUEUE_SIZE))
+
+    @property
+    def ADMISSION_QUEUE_TIMEOUT_SECONDS(self) -> float:
+        """Get how long a request may wait for an LLM slot before being rejected."""
+        return float(
+            os.getenv(
+                "ADMISSION_QUEUE_TIMEOUT_SECONDS", ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+        )
+
+    @property
+    def PAID_RESERVED_TOKEN_SHARE(self) -> float:
+        """Get the share of the primary model token budget reserved for subscribers."""
+        return float(os.getenv("PAID_RESERVED_TOKEN_SHARE", PAID_RESERVED_TOKEN_SHARE))
+
+    @property
+    def ANONYMOUS_TOKEN_SHARE(self) -> float:
+        """Get the share of the primary model token budget usable by anonymous users."""
+        return float(os.getenv("ANONYMOUS_TOKEN_SHARE", ANONYMOUS_TOKEN_SHARE))
+
     @property
     def SUPER_TOKENS_CONNECTION_URI(self) -> str:
         """Get SuperTokens connection URI."""
@@ -88,6 +366,11 @@ class Config:
         """Get Lemon Squeezy webhook signing secret."""
         return os.getenv("LEMONSQUEEZY_SIGNING_SECRET", "")
 
+    def _data_file(self, filename: str) -> str:
+        """Build a path next to the main database so it lands in the same data volume."""
+        database_dir = os.path.dirname(self.DATABASE_PATH or "")
+        return os.path.join(database_dir, filename)
+
     def is_production(self) -> bool:
         """Check if the application is running in production mode."""
         return self.PROD
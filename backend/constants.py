@@ -3,3 +3,70 @@
 # User quota constants
 DEFAULT_USER_QUOTA_LIMIT = 10000
 DEFAULT_IP_QUOTA_LIMIT = 4000
+
+# Improvement suggestions cache constants
+IMPROVEMENT_CACHE_TTL_SECONDS = 6 * 60 * 60
+IMPROVEMENT_CACHE_MAX_CONVERSATIONS = 1000
+
+# Minimum score of the local gate to run the improvement extraction call (0 = always)
+IMPROVEMENT_GATE_THRESHOLD = 0.3
+
+# Conversation checkpoint constants
+CHECKPOINT_TTL_SECONDS = 7 * 24 * 60 * 60
+MAX_CHECKPOINTS_PER_THREAD = 4
+CHECKPOINT_VACUUM_INTERVAL_SECONDS = 60 * 60
+
+# Admission control of the graph endpoints (per worker)
+MAX_IN_FLIGHT_LLM_CALLS = 16
+ADMISSION_QUEUE_SIZE = 32
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 10
+
+# Priority tiers of the LLM capacity
+PRIORITY_PAID = "paid"
+PRIORITY_FREE = "free"
+PRIORITY_ANONYMOUS = "anonymous"
+
+# Relative share of the admission queue served to each tier
+PRIORITY_WEIGHTS = {PRIORITY_PAID: 4, PRIORITY_FREE: 2, PRIORITY_ANONYMOUS: 1}
+
+# Share of the per-minute primary model budget reserved for paying subscribers,
+# and the share anonymous traffic may use before it's routed to the fallback
+PAID_RESERVED_TOKEN_SHARE = 0.2
+ANONYMOUS_TOKEN_SHARE = 0.5
+
+# Model routing
+FAST_MODEL_MAX_CHARS = 500
+ROUTER_MAX_ERROR_RATE = 0.5
+# A model avoided by the router gets one probe call per interval to measure its recovery
+ROUTER_PROBE_INTERVAL_SECONDS = 30
+
+# Largest text accepted by the translation endpoints, in estimated tokens
+MAX_INPUT_TOKENS = 8000
+
+# Target languages of one multi-target translation request
+MAX_TRANSLATION_TARGETS = 10
+
+# Document translation: largest upload, segments in flight or waiting to be
+# written, and segments translated at once per document
+MAX_DOCUMENT_BYTES = 5 * 1024 * 1024
+DOCUMENT_SEGMENT_WINDOW = 32
+DOCUMENT_CONCURRENCY = 4
+
+# Tokens of language rules sent with a translation before they are selected by relevance
+RULES_TOKEN_BUDGET = 1000
+
+# Tokens of glossary matches sent with a translation, exact and frequent matches first
+GLOSSARY_TOKEN_BUDGET = 1500
+
+# Source languages written without spaces between words, matched with a character n-gram index
+CHARACTER_MATCHING_LANGUAGES = ("zh", "ja", "th", "lo", "km", "my")
+
+# Incremental glossary matching sessions of the editor
+MATCH_SESSION_TTL_SECONDS = 30 * 60
+MATCH_SESSION_MAX = 1000
+
+# Share of repeated segments from which each distinct segment is translated once
+DEDUPLICATION_MIN_RATIO = 0.2
+
+# Above this share of sentences concerned by the feedback, the whole translation is refined
+SEGMENT_REFINEMENT_MAX_SHARE = 0.5
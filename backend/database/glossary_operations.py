@@ -9,6 +9,25 @@ from .connection import DatabaseConnection, get_database_connection
 from .models import GlossaryEntry
 
 
+def _entry_from_row(row) -> GlossaryEntry:
+    """Build a glossary entry from a row of glossary_entries."""
+    return GlossaryEntry(
+        id=row["id"],
+        source_language=row["source_language"],
+        target_language=row["target_language"],
+        source_text=row["source_text"],
+        target_text=row["target_text"],
+        user_id=row["user_id"],
+        note=row["note"],
+        created_at=datetime.fromisoformat(row["created_at"])
+        if row["created_at"]
+        else None,
+        updated_at=datetime.fromisoformat(row["updated_at"])
+        if row["updated_at"]
+        else None,
+    )
+
+
 class GlossaryOperations:
     """Handles all glossary database operations."""
 
@@ -139,25 +158,7 @@ class GlossaryOperations:
             params = (source_language, target_language)
 
             rows = self.db.execute_query(query, params)
-            entries = []
-            for row in rows:
-                entry = GlossaryEntry(
-                    id=row["id"],
-                    source_language=row["source_language"],
-                    target_language=row["target_language"],
-                    source_text=row["source_text"],
-                    target_text=row["target_text"],
-                    user_id=row["user_id"],
-                    note=row["note"],
-                    created_at=datetime.fromisoformat(row["created_at"])
-                    if row["created_at"]
-                    else None,
-                    updated_at=datetime.fromisoformat(row["updated_at"])
-                    if row["updated_at"]
-                    else None,
-                )
-                entries.append(entry)
-            return entries
+            return [_entry_from_row(row) for row in rows]
         except Exception as e:
             logger.error(f"Error getting all entries from glossary: {e}")
             return []
@@ -172,12 +173,13 @@ class GlossaryOperations:
             target_language: Target language code (default: "es").
 
         Returns:
-            Dictionary mapping source text to target and note data.
+            Dictionary mapping source text to id, target and note data.
         """
         entries = self.get_all_entries(source_language, target_language)
         result = {}
         for entry in entries:
             result[entry.source_text] = {
+                "id": entry.id,
                 "target": entry.target_text,
                 "note": entry.note,
             }
@@ -198,7 +200,115 @@ class GlossaryOperations:
         result = {}
         for entry in entries:
             result[entry.source_text] = {
+                "id": entry.id,
                 "target": entry.target_text,
                 "note": entry.note,
             }
         return result
+
+    def get_entries_dicts_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """Get the entries of a user for several target languages in one query.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to the dictionary of its
+            entries, in the format of get_entries_dict_for_user.
+        """
+        result = {target_language: {} for target_language in target_languages}
+        if not target_languages:
+            return result
+        try:
+            placeholders = ", ".join("?" for _ in target_languages)
+            query = f"""
+                SELECT * FROM glossary_entries
+                WHERE user_id = ? AND source_language = ? AND target_language IN ({placeholders})
+                ORDER BY source_text
+            """
+            params = (user_id, source_language, *target_languages)
+
+            for row in self.db.execute_query(query, params):
+                entry = _entry_from_row(row)
+                result[entry.target_language][entry.source_text] = {
+                    "id": entry.id,
+                    "target": entry.target_text,
+                    "note": entry.note,
+                }
+            return result
+        except Exception as e:
+            logger.error(f"Error getting glossary entries for several targets: {e}")
+            return result
+
+    def get_revisions_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, str]:
+        """Get the revisions of a user's entries for several target languages in one query.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to its revision string, in
+            the format of get_revision_for_user. Empty if it could not be computed.
+        """
+        # Pairs without entries have no row, their revision is the one of an empty glossary
+        result = dict.fromkeys(target_languages, "0:0:0:")
+        if not target_languages:
+            return result
+        try:
+            placeholders = ", ".join("?" for _ in target_languages)
+            query = f"""
+                SELECT target_language, COUNT(*) AS count, COALESCE(MAX(id), 0) AS max_id,
+                       COALESCE(SUM(id), 0) AS sum_id, COALESCE(MAX(updated_at), '') AS updated_at
+                FROM glossary_entries
+                WHERE user_id = ? AND source_language = ? AND target_language IN ({placeholders})
+                GROUP BY target_language
+            """
+            params = (user_id, source_language, *target_languages)
+
+            for row in self.db.execute_query(query, params):
+                result[row["target_language"]] = (
+                    f"{row['count']}:{row['max_id']}:{row['sum_id']}:{row['updated_at']}"
+                )
+            return result
+        except Exception as e:
+            logger.error(f"Error getting glossary revisions for several targets: {e}")
+            return dict.fromkeys(target_languages, "")
+
+    def get_revision_for_user(
+        self, user_id: str, source_language: str = "en", target_language: str = "es"
+    ) -> str:
+        """Get a revision string that changes whenever the user's entries change.
+
+        Every insert or replace gets a new autoincrement id and deletions lower
+        the count, so the aggregate changes on any edit without loading the rows.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code (default: "en").
+            target_language: Target language code (default: "es").
+
+        Returns:
+            Revision string, empty if it could not be computed.
+        """
+        try:
+            query = """
+                SELECT COUNT(*) AS count, COALESCE(MAX(id), 0) AS max_id,
+                       COALESCE(SUM(id), 0) AS sum_id, COALESCE(MAX(updated_at), '') AS updated_at
+                FROM glossary_entries
+                WHERE user_id = ? AND source_language = ? AND target_language = ?
+            """
+            params = (user_id, source_language, target_language)
+
+            row = self.db.execute_query(query, params)[0]
+            return f"{row['count']}:{row['max_id']}:{row['sum_id']}:{row['updated_at']}"
+        except Exception as e:
+            logger.error(f"Error getting glossary revision: {e}")
+            return ""
@@ -29,9 +29,14 @@ class MigrationManager:
                 description="Add user_id column to glossary_entries",
                 sql="ALTER TABLE glossary_entries ADD COLUMN user_id TEXT DEFAULT NULL;",
             ),
+            Migration(
+                version="002",
+                description="Add pinned column to lang_rule_entries",
+                sql="ALTER TABLE lang_rule_entries ADD COLUMN pinned INTEGER DEFAULT 0;",
+            ),
             # Add more migrations here as needed
             # Migration(
-            #     version="002",
+            #     version="003",
             #     description="Example future migration",
             #     sql="ALTER TABLE glossary_entries ADD COLUMN example_column TEXT;",
             # ),
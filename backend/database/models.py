@@ -63,6 +63,8 @@ class LangRuleEntry:
     id: int | None = None
     user_id: str | None = None
     text: str = ""
+    # Pinned rules are always included in the prompt
+    pinned: bool = False
     created_at: datetime | None = None
     updated_at: datetime | None = None
 
@@ -74,6 +76,7 @@ class LangRuleEntry:
             "source_language": self.source_language,
             "target_language": self.target_language,
             "text": self.text,
+            "pinned": self.pinned,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -87,6 +90,7 @@ class LangRuleEntry:
             id=data.get("id"),
             user_id=data.get("user_id"),
             text=data.get("text", ""),
+            pinned=bool(data.get("pinned", False)),
             created_at=datetime.fromisoformat(data["created_at"])
             if data.get("created_at")
             else None,
@@ -1,7 +1,7 @@
 """Language rules database operations."""
 
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 
 from utils.logger import logger
 
@@ -9,6 +9,24 @@ from .connection import DatabaseConnection, get_database_connection
 from .models import LangRuleEntry
 
 
+def _entry_from_row(row) -> LangRuleEntry:
+    """Build a language rule entry from a row of lang_rule_entries."""
+    return LangRuleEntry(
+        id=row["id"],
+        user_id=row["user_id"],
+        source_language=row["source_language"],
+        target_language=row["target_language"],
+        text=row["text"],
+        pinned=bool(row["pinned"]),
+        created_at=datetime.fromisoformat(row["created_at"])
+        if row["created_at"]
+        else None,
+        updated_at=datetime.fromisoformat(row["updated_at"])
+        if row["updated_at"]
+        else None,
+    )
+
+
 class RulesOperations:
     """Handles all language rules database operations."""
 
@@ -32,14 +50,15 @@ class RulesOperations:
         try:
             query = """
                 INSERT OR REPLACE INTO lang_rule_entries 
-                (text, user_id, source_language, target_language, updated_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                (text, user_id, source_language, target_language, pinned, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             """
             params = (
                 entry.text,
                 entry.user_id,
                 entry.source_language,
                 entry.target_language,
+                int(entry.pinned),
             )
 
             self.db.execute_update(query, params)
@@ -75,6 +94,40 @@ class RulesOperations:
             logger.error(f"Error removing entry from language rules: {e}")
             return False
 
+    def set_pinned(
+        self,
+        text: str,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        pinned: bool,
+    ) -> bool:
+        """Pin or unpin a language rule entry.
+
+        Args:
+            text: The rule text.
+            user_id: The user ID who owns the rule.
+            source_language: Source language code.
+            target_language: Target language code.
+            pinned: Whether the rule is always included in the prompt.
+
+        Returns:
+            True if updated successfully, False if entry not found or error occurred.
+        """
+        try:
+            query = """
+                UPDATE lang_rule_entries
+                SET pinned = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE text = ? AND user_id = ? AND source_language = ? AND target_language = ?
+            """
+            params = (int(pinned), text, user_id, source_language, target_language)
+
+            affected_rows = self.db.execute_update(query, params)
+            return affected_rows > 0
+        except Exception as e:
+            logger.error(f"Error pinning language rule: {e}")
+            return False
+
     def get_entry(
         self, text: str, user_id: str, source_language: str, target_language: str
     ) -> LangRuleEntry | None:
@@ -105,6 +158,7 @@ class RulesOperations:
                     source_language=row["source_language"],
                     target_language=row["target_language"],
                     text=row["text"],
+                    pinned=bool(row["pinned"]),
                     created_at=datetime.fromisoformat(row["created_at"])
                     if row["created_at"]
                     else None,
@@ -139,23 +193,7 @@ class RulesOperations:
             params = (user_id, source_language, target_language)
 
             rows = self.db.execute_query(query, params)
-            entries = []
-            for row in rows:
-                entry = LangRuleEntry(
-                    id=row["id"],
-                    user_id=row["user_id"],
-                    source_language=row["source_language"],
-                    target_language=row["target_language"],
-                    text=row["text"],
-                    created_at=datetime.fromisoformat(row["created_at"])
-                    if row["created_at"]
-                    else None,
-                    updated_at=datetime.fromisoformat(row["updated_at"])
-                    if row["updated_at"]
-                    else None,
-                )
-                entries.append(entry)
-            return entries
+            return [_entry_from_row(row) for row in rows]
         except Exception as e:
             logger.error(f"Error getting entries for user from language rules: {e}")
             return []
@@ -175,3 +213,104 @@ class RulesOperations:
         """
         entries = self.get_entries_for_user(user_id, source_language, target_language)
         return [entry.text for entry in entries]
+
+    def get_entries_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, List[LangRuleEntry]]:
+        """Get the rules of a user for several target languages in one query.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to its rules.
+        """
+        result = {target_language: [] for target_language in target_languages}
+        if not target_languages:
+            return result
+        try:
+            placeholders = ", ".join("?" for _ in target_languages)
+            query = f"""
+                SELECT * FROM lang_rule_entries
+                WHERE user_id = ? AND source_language = ? AND target_language IN ({placeholders})
+                ORDER BY text
+            """
+            params = (user_id, source_language, *target_languages)
+
+            for row in self.db.execute_query(query, params):
+                entry = _entry_from_row(row)
+                result[entry.target_language].append(entry)
+            return result
+        except Exception as e:
+            logger.error(f"Error getting language rules for several targets: {e}")
+            return result
+
+    def get_revisions_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, str]:
+        """Get the revisions of a user's rules for several target languages in one query.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to its revision string, in
+            the format of get_revision_for_user. Empty if it could not be computed.
+        """
+        # Pairs without rules have no row, their revision is the one of no rules
+        result = dict.fromkeys(target_languages, "0:0:0:")
+        if not target_languages:
+            return result
+        try:
+            placeholders = ", ".join("?" for _ in target_languages)
+            query = f"""
+                SELECT target_language, COUNT(*) AS count, COALESCE(MAX(id), 0) AS max_id,
+                       COALESCE(SUM(id), 0) AS sum_id, COALESCE(MAX(updated_at), '') AS updated_at
+                FROM lang_rule_entries
+                WHERE user_id = ? AND source_language = ? AND target_language IN ({placeholders})
+                GROUP BY target_language
+            """
+            params = (user_id, source_language, *target_languages)
+
+            for row in self.db.execute_query(query, params):
+                result[row["target_language"]] = (
+                    f"{row['count']}:{row['max_id']}:{row['sum_id']}:{row['updated_at']}"
+                )
+            return result
+        except Exception as e:
+            logger.error(
+                f"Error getting language rules revisions for several targets: {e}"
+            )
+            return dict.fromkeys(target_languages, "")
+
+    def get_revision_for_user(
+        self, user_id: str, source_language: str = "en", target_language: str = "es"
+    ) -> str:
+        """Get a revision string that changes whenever the user's rules change.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code (default: "en").
+            target_language: Target language code (default: "es").
+
+        Returns:
+            Revision string, empty if it could not be computed.
+        """
+        try:
+            query = """
+                SELECT COUNT(*) AS count, COALESCE(MAX(id), 0) AS max_id,
+                       COALESCE(SUM(id), 0) AS sum_id, COALESCE(MAX(updated_at), '') AS updated_at
+                FROM lang_rule_entries
+                WHERE user_id = ? AND source_language = ? AND target_language = ?
+            """
+            params = (user_id, source_language, target_language)
+
+            row = self.db.execute_query(query, params)[0]
+            return f"{row['count']}:{row['max_id']}:{row['sum_id']}:{row['updated_at']}"
+        except Exception as e:
+            logger.error(f"Error getting language rules revision: {e}")
+            return ""
@@ -25,6 +25,7 @@ CREATE TABLE IF NOT EXISTS lang_rule_entries (
     source_language TEXT NOT NULL,
     target_language TEXT NOT NULL,
     text TEXT NOT NULL,
+    pinned INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(user_id, source_language, target_language, text)
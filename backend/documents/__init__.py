@@ -0,0 +1,20 @@
+"""Document translation package: parses documents into segments and reassembles them."""
+
+from .base import DocumentParser, DocumentSegment
+from .pipeline import (
+    DOCUMENT_FORMATS,
+    MEDIA_TYPES,
+    DocumentStats,
+    document_segments,
+    translate_document,
+)
+
+__all__ = [
+    "DOCUMENT_FORMATS",
+    "MEDIA_TYPES",
+    "DocumentParser",
+    "DocumentSegment",
+    "DocumentStats",
+    "document_segments",
+    "translate_document",
+]
@@ -0,0 +1,130 @@
+"""Segments of a document and the base class of the document parsers.
+
+Parsers read a document in chunks and yield, in order, the raw text to copy
+as is to the translated document and the segments to translate. Inline codes
+of a segment (tags, format specifiers...) are replaced by placeholders, so the
+model only sees the text and can't break the markup.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Union
+
+from translate_graph.placeholders import placeholder, restore_placeholders
+
+
+def _unchanged(text: str) -> str:
+    return text
+
+
+@dataclass
+class DocumentSegment:
+    """Text of a document to translate, with its inline codes as placeholders."""
+
+    text: str
+    # Original code of each placeholder of the text, ⟦1⟧ being the first
+    codes: List[str] = field(default_factory=list)
+    # Raw markup around the text, kept in the translated document
+    prefix: str = ""
+    suffix: str = ""
+    # Escapes the translated text for the format of the document
+    escape: Callable[[str], str] = _unchanged
+    # Builds the output of the segment from its restored translation
+    render: Callable[[str], str] = _unchanged
+
+    def output(self, translation: str) -> str:
+        """Get the text of the translated document for the translation of the segment."""
+        restored = restore_placeholders(translation, self.codes, self.escape)
+        return self.render(self.prefix + restored + self.suffix)
+
+
+DocumentItem = Union[str, DocumentSegment]
+
+
+def build_segment(
+    pieces: List[tuple[bool, str]],
+    unescape: Callable[[str], str] = _unchanged,
+    escape: Callable[[str], str] = _unchanged,
+) -> DocumentSegment | None:
+    """Build a segment from the raw pieces of a block of a document.
+
+    Codes and whitespace at the edges of the block are kept out of the text to
+    translate, codes in between become placeholders.
+
+    Args:
+        pieces: (is_text, raw) pieces of the block, in order.
+        unescape: Converts the raw text of the document to plain text.
+        escape: Converts plain text back to the raw text of the document.
+
+    Returns:
+        The segment, or None if the block has nothing to translate.
+    """
+    merged: List[tuple[bool, str]] = []
+    for is_text, raw in pieces:
+        if raw and merged and merged[-1][0] == is_text:
+            merged[-1] = (is_text, merged[-1][1] + raw)
+        elif raw:
+            merged.append((is_text, raw))
+
+    texts = [index for index, (is_text, raw) in enumerate(merged) if is_text]
+    if not any(
+        char.isalpha() for index in texts for char in unescape(merged[index][1])
+    ):
+        return None
+    first, last = texts[0], texts[-1]
+
+    head = merged[first][1]
+    tail = merged[last][1]
+    leading = head[: len(head) - len(head.lstrip())]
+    trailing = tail[len(tail.rstrip()) :]
+    merged[first] = (True, head[len(leading) :])
+    merged[last] = (True, merged[last][1][: len(merged[last][1]) - len(trailing)])
+
+    text = []
+    codes = []
+    for is_text, raw in merged[first : last + 1]:
+        if is_text:
+            text.append(unescape(raw))
+        else:
+            codes.append(raw)
+            text.append(placeholder(len(codes)))
+    return DocumentSegment(
+        text="".join(text),
+        codes=codes,
+        prefix="".join(raw for _, raw in merged[:first]) + leading,
+        suffix=trailing + "".join(raw for _, raw in merged[last + 1 :]),
+        escape=escape,
+    )
+
+
+def block_items(
+    pieces: List[tuple[bool, str]],
+    unescape: Callable[[str], str] = _unchanged,
+    escape: Callable[[str], str] = _unchanged,
+) -> Iterator[DocumentItem]:
+    """Yield the segment of a block, or its raw text if it has nothing to translate."""
+    segment = build_segment(pieces, unescape, escape)
+    if segment:
+        yield segment
+    else:
+        raw = "".join(raw for _, raw in pieces)
+        if raw:
+            yield raw
+
+
+class DocumentParser(ABC):
+    """Parses a document fed in chunks of text into raw text and segments."""
+
+    @abstractmethod
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of the document, yielding the items it completes."""
+
+    @abstractmethod
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the items left once the whole document was fed."""
+
+    def parse(self, chunks: Iterable[str]) -> Iterator[DocumentItem]:
+        """Parse a document read in chunks."""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
@@ -0,0 +1,83 @@
+"""Word documents (DOCX): the text of each paragraph is a segment.
+
+A DOCX file is a zip archive. The XML parts with text (body, headers,
+footers, notes, comments) are translated while they are copied to the new
+archive, the other parts are copied as they are. In the XML, the runs of a
+paragraph are separated by formatting markup, which becomes placeholders, so
+bold or linked words keep their formatting in the translation.
+"""
+
+import re
+from typing import Iterator, List
+
+from documents.base import DocumentItem, DocumentParser, block_items
+from documents.markup import (
+    MarkupTokenizer,
+    escape_markup,
+    is_closing_tag,
+    is_self_closing_tag,
+    tag_name,
+    unescape_markup,
+)
+
+# Parts of the archive with translatable text
+TEXT_PART_PATTERN = re.compile(
+    r"^word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$"
+)
+
+# Text runs without xml:space="preserve" lose their leading and trailing spaces
+TEXT_TAG_PATTERN = re.compile(r"^<w:t(?=[\s>])(?![^>]*xml:space)")
+
+
+class DocxXmlParser(DocumentParser):
+    """Parses a WordprocessingML part into the text of its paragraphs."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.tokenizer = MarkupTokenizer()
+        self.pieces: List[tuple[bool, str]] = []
+        # Paragraphs open, text boxes nest paragraphs in paragraphs
+        self.paragraph_depth = 0
+        # Only the content of <w:t> elements is text of the document
+        self.in_text = False
+
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of XML."""
+        for is_text, raw in self.tokenizer.feed(text):
+            yield from self._token(is_text, raw)
+
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the end of the part."""
+        for is_text, raw in self.tokenizer.close():
+            yield from self._token(is_text, raw)
+        yield from self._flush()
+
+    def _token(self, is_text: bool, raw: str) -> Iterator[DocumentItem]:
+        if is_text:
+            if self.paragraph_depth:
+                self.pieces.append((self.in_text, raw))
+            else:
+                yield raw
+            return
+
+        name = tag_name(raw)
+        if name == "p" and raw.startswith(("<w:p>", "<w:p ", "</w:p>", "<w:p/")):
+            # Paragraphs delimit the segments
+            yield from self._flush()
+            yield raw
+            if is_closing_tag(raw):
+                self.paragraph_depth = max(0, self.paragraph_depth - 1)
+            elif not is_self_closing_tag(raw):
+                self.paragraph_depth += 1
+            return
+        if name == "t" and raw.startswith(("<w:t>", "<w:t ", "</w:t>")):
+            self.in_text = not is_closing_tag(raw) and not is_self_closing_tag(raw)
+            raw = TEXT_TAG_PATTERN.sub('<w:t xml:space="preserve"', raw)
+        if self.paragraph_depth:
+            self.pieces.append((False, raw))
+        else:
+            yield raw
+
+    def _flush(self) -> Iterator[DocumentItem]:
+        pieces, self.pieces = self.pieces, []
+        yield from block_items(pieces, unescape_markup, escape_markup)
@@ -0,0 +1,164 @@
+"""HTML documents: the text of each block element is a segment.
+
+Block tags (paragraphs, headings, list items, cells...) delimit the segments,
+inline tags (links, emphasis...) inside them become placeholders. Scripts,
+styles, code and elements marked translate="no" are copied as they are.
+"""
+
+import re
+from typing import Iterator, List
+
+from documents.base import DocumentItem, DocumentParser, block_items
+from documents.markup import (
+    MarkupTokenizer,
+    escape_markup,
+    is_closing_tag,
+    is_self_closing_tag,
+    tag_name,
+    unescape_markup,
+)
+
+BLOCK_TAGS = frozenset(
+    {
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "body",
+        "caption",
+        "dd",
+        "details",
+        "dialog",
+        "div",
+        "dl",
+        "dt",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "head",
+        "header",
+        "hr",
+        "html",
+        "legend",
+        "li",
+        "link",
+        "main",
+        "meta",
+        "nav",
+        "ol",
+        "option",
+        "p",
+        "section",
+        "summary",
+        "table",
+        "tbody",
+        "td",
+        "tfoot",
+        "th",
+        "thead",
+        "title",
+        "tr",
+        "ul",
+    }
+)
+
+# Elements whose content is never translated
+SKIPPED_TAGS = frozenset(
+    {"code", "kbd", "noscript", "pre", "samp", "script", "style", "svg", "math"}
+)
+NO_TRANSLATE_PATTERN = re.compile(
+    r"""\stranslate\s*=\s*["']?no\b|\sclass\s*=\s*["'][^"']*\bnotranslate\b""",
+    re.IGNORECASE,
+)
+
+# Elements without closing tag
+VOID_TAGS = frozenset(
+    {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "source",
+        "track",
+        "wbr",
+    }
+)
+
+
+class HtmlParser(DocumentParser):
+    """Parses HTML into the text of its block elements."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.tokenizer = MarkupTokenizer()
+        self.pieces: List[tuple[bool, str]] = []
+        # Element being skipped and how many of them are open inside it
+        self.skipped_tag = ""
+        self.skipped_depth = 0
+
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of HTML."""
+        for is_text, raw in self.tokenizer.feed(text):
+            yield from self._token(is_text, raw)
+
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the last block of the document."""
+        for is_text, raw in self.tokenizer.close():
+            yield from self._token(is_text, raw)
+        yield from self._flush()
+
+    def _token(self, is_text: bool, raw: str) -> Iterator[DocumentItem]:
+        if self.skipped_tag:
+            self.pieces.append((False, raw))
+            self._track_skipped(is_text, raw)
+            return
+        if is_text:
+            self.pieces.append((True, raw))
+            return
+
+        name = tag_name(raw)
+        skipped = (
+            name
+            and not is_closing_tag(raw)
+            and not is_self_closing_tag(raw)
+            and name not in VOID_TAGS
+            and (name in SKIPPED_TAGS or NO_TRANSLATE_PATTERN.search(raw))
+        )
+        if not name or name in BLOCK_TAGS:
+            # Comments, declarations and block tags end the current segment
+            yield from self._flush()
+            if not skipped:
+                yield raw
+                return
+        if skipped:
+            self.skipped_tag = name
+            self.skipped_depth = 1
+        self.pieces.append((False, raw))
+
+    def _track_skipped(self, is_text: bool, raw: str) -> None:
+        if is_text or tag_name(raw) != self.skipped_tag:
+            return
+        if is_closing_tag(raw):
+            self.skipped_depth -= 1
+        elif not is_self_closing_tag(raw):
+            self.skipped_depth += 1
+        if not self.skipped_depth:
+            self.skipped_tag = ""
+
+    def _flush(self) -> Iterator[DocumentItem]:
+        pieces, self.pieces = self.pieces, []
+        yield from block_items(pieces, unescape_markup, escape_markup)
@@ -0,0 +1,139 @@
+"""Markdown documents: headings, list items, table cells and paragraphs are segments.
+
+The document is read line by line. Block markers (#, -, 1., >, |) are kept out
+of the segments, code blocks and front matter are copied as they are, and code
+spans, link targets and inline HTML become placeholders. The lines of a
+paragraph are translated together and written back as one line, which renders
+the same.
+"""
+
+import re
+from typing import Iterator, List
+
+from documents.base import DocumentItem, DocumentParser, block_items
+
+FENCE_PATTERN = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+# Heading, list item (with task box) and quote markers
+BLOCK_MARKER_PATTERN = re.compile(
+    r"^(\s*(?:#{1,6}\s+|(?:[-*+]|\d{1,9}[.)])\s+(?:\[[ xX]\]\s+)?|>\s?)+)"
+)
+TABLE_SEPARATOR_PATTERN = re.compile(
+    r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$"
+)
+# Lines copied as they are: reference links, thematic breaks, html comments
+RAW_LINE_PATTERN = re.compile(r"^\s*(\[[^\]]+\]:\s|(?:[-*_]\s*){3,}$|<!--)")
+# Code spans, link targets, autolinks and inline HTML tags
+INLINE_CODE_PATTERN = re.compile(
+    r"(`+)[^`]*?\1|\]\([^)\s]*(?:\s+\"[^\"]*\")?\)|\]\[[^\]]*\]|<[a-zA-Z/!][^>]*>"
+)
+
+
+def line_pieces(text: str) -> List[tuple[bool, str]]:
+    """Split the text of a block into text and inline code pieces."""
+    pieces = []
+    position = 0
+    for match in INLINE_CODE_PATTERN.finditer(text):
+        code = match.group()
+        if code.startswith("]"):
+            # The "]" closes the link text, which is translated
+            pieces.append((True, text[position : match.start() + 1]))
+            code = code[1:]
+        else:
+            pieces.append((True, text[position : match.start()]))
+        pieces.append((False, code))
+        position = match.end()
+    pieces.append((True, text[position:]))
+    return pieces
+
+
+class MarkdownParser(DocumentParser):
+    """Parses Markdown into the text of its blocks."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.buffer = ""
+        self.first_line = True
+        # Fence closing the code block or front matter being copied
+        self.fence = ""
+        # Lines of the paragraph being read, and the line ending of its last line
+        self.paragraph: List[str] = []
+        self.paragraph_indent = ""
+        self.paragraph_end = "\n"
+
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of Markdown."""
+        self.buffer += text
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            yield from self._line(line + "\n")
+
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the last block of the document."""
+        if self.buffer:
+            yield from self._line(self.buffer)
+        self.buffer = ""
+        yield from self._flush()
+
+    def _line(self, line: str) -> Iterator[DocumentItem]:
+        first_line, self.first_line = self.first_line, False
+        content = line.rstrip("\r\n")
+        ending = line[len(content) :]
+
+        if self.fence:
+            if content.strip().startswith(self.fence):
+                self.fence = ""
+            yield line
+            return
+        fence = FENCE_PATTERN.match(content)
+        if fence or (first_line and content.strip() == "---"):
+            yield from self._flush()
+            self.fence = fence.group(1)[:3] if fence else "---"
+            yield line
+            return
+
+        if (
+            not content.strip()
+            or RAW_LINE_PATTERN.match(content)
+            or TABLE_SEPARATOR_PATTERN.match(content)
+            or (content.startswith(("    ", "\t")) and not self.paragraph)
+        ):
+            # Blank lines, raw lines and indented code
+            yield from self._flush()
+            yield line
+            return
+
+        if content.lstrip().startswith("|"):
+            yield from self._flush()
+            yield from self._table_row(content)
+            yield ending
+            return
+
+        marker = BLOCK_MARKER_PATTERN.match(content)
+        if marker:
+            yield from self._flush()
+            yield marker.group()
+            yield from block_items(line_pieces(content[marker.end() :]))
+            yield ending
+            return
+
+        if not self.paragraph:
+            self.paragraph_indent = content[: len(content) - len(content.lstrip())]
+        self.paragraph.append(content.strip())
+        self.paragraph_end = ending
+
+    def _table_row(self, row: str) -> Iterator[DocumentItem]:
+        cells = re.split(r"(?<!\\)(\|)", row)
+        for cell in cells:
+            if cell == "|":
+                yield cell
+            else:
+                yield from block_items(line_pieces(cell))
+
+    def _flush(self) -> Iterator[DocumentItem]:
+        if not self.paragraph:
+            return
+        lines, self.paragraph = self.paragraph, []
+        yield self.paragraph_indent
+        yield from block_items(line_pieces(" ".join(lines)))
+        yield self.paragraph_end
@@ -0,0 +1,110 @@
+"""Incremental tokenizer of HTML and XML documents.
+
+The document is split in tags (comments, declarations and processing
+instructions included) and text, keeping every character so the tokens joined
+give back the document. It is fed chunks of any size and only keeps the tag
+being read, so memory doesn't depend on the size of the document.
+"""
+
+import html
+import re
+from typing import Iterator
+
+# A tag up to its closing ">", quoted attribute values may contain ">"
+TAG_PATTERN = re.compile(r"<[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>")
+TAG_NAME_PATTERN = re.compile(r"</?([\w:.-]+)")
+
+# Longest tag read, beyond it the "<" is taken for text so a stray one can't buffer the document
+MAX_TAG_CHARS = 64 * 1024
+
+# Constructs with their own terminator, which may contain ">"
+SPECIAL_TAGS = (("<!--", "-->"), ("<![CDATA[", "]]>"), ("<?", "?>"))
+
+
+def tag_name(tag: str) -> str:
+    """Get the lowercase name of a tag, without namespace prefix ("" for comments...)."""
+    match = TAG_NAME_PATTERN.match(tag)
+    if not match:
+        return ""
+    return match.group(1).rsplit(":", 1)[-1].lower()
+
+
+def is_closing_tag(tag: str) -> bool:
+    """Whether the tag closes an element."""
+    return tag.startswith("</")
+
+
+def is_self_closing_tag(tag: str) -> bool:
+    """Whether the tag is an empty element (<br/>)."""
+    return tag.endswith("/>")
+
+
+def unescape_markup(text: str) -> str:
+    """Convert the raw text of a markup document to plain text."""
+    return html.unescape(text)
+
+
+def escape_markup(text: str) -> str:
+    """Convert plain text to raw text of a markup document."""
+    return html.escape(text, quote=False)
+
+
+class MarkupTokenizer:
+    """Splits HTML or XML fed in chunks into (is_text, raw) tokens."""
+
+    def __init__(self):
+        """Initialize the tokenizer."""
+        self.buffer = ""
+
+    def feed(self, text: str) -> Iterator[tuple[bool, str]]:
+        """Tokenize the next chunk, yielding the complete tokens."""
+        self.buffer += text
+        position = 0
+        buffer = self.buffer
+        while position < len(buffer):
+            start = buffer.find("<", position)
+            if start == -1:
+                yield True, buffer[position:]
+                position = len(buffer)
+                break
+            if start > position:
+                yield True, buffer[position:start]
+                position = start
+
+            end = self._tag_end(buffer, start)
+            if end is None:
+                break
+            if end == start:
+                # A "<" that doesn't start a tag ("a < b" in HTML text)
+                yield True, "<"
+                position = start + 1
+                continue
+            yield False, buffer[start:end]
+            position = end
+        self.buffer = buffer[position:]
+
+    def close(self) -> Iterator[tuple[bool, str]]:
+        """Yield what is left of the document, an unterminated tag as text."""
+        if self.buffer:
+            yield True, self.buffer
+        self.buffer = ""
+
+    @staticmethod
+    def _tag_end(buffer: str, start: int) -> int | None:
+        """Get the end of the tag starting at start, start if it isn't a tag, None if incomplete."""
+        if start + 1 >= len(buffer):
+            return None
+        for opening, closing in SPECIAL_TAGS:
+            if buffer.startswith(opening, start):
+                end = buffer.find(closing, start + len(opening))
+                return None if end == -1 else end + len(closing)
+            if opening.startswith(buffer[start:]):
+                return None
+
+        following = buffer[start + 1]
+        if not (following.isalpha() or following in "/!_:"):
+            return start
+        match = TAG_PATTERN.match(buffer, start)
+        if match:
+            return match.end()
+        return start if len(buffer) - start > MAX_TAG_CHARS else None
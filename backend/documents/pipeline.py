@@ -0,0 +1,258 @@
+"""Translate documents segment by segment while they are read.
+
+The parser yields the raw text and the segments of the document in order.
+Segments are translated concurrently, and the output is written in order as
+soon as the segments at its head are translated. At most ``window`` segments
+are in flight or waiting to be written, so memory depends on the window and
+not on the size of the document. Repeated segments in the recent window reuse
+the translation of the first one.
+"""
+
+import asyncio
+import codecs
+import shutil
+import zipfile
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, Iterable, Iterator
+
+from documents.base import DocumentItem, DocumentParser, DocumentSegment
+from documents.docx_parser import TEXT_PART_PATTERN, DocxXmlParser
+from documents.html_parser import HtmlParser
+from documents.markdown_parser import MarkdownParser
+from documents.po_parser import PoParser
+from documents.xliff_parser import XliffParser
+
+DOCX_FORMAT = "docx"
+TEXT_FORMATS: dict[str, Callable[[], DocumentParser]] = {
+    "markdown": MarkdownParser,
+    "html": HtmlParser,
+    "po": PoParser,
+    "xliff": XliffParser,
+}
+DOCUMENT_FORMATS = (*TEXT_FORMATS, DOCX_FORMAT)
+MEDIA_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "po": "text/x-gettext-translation; charset=utf-8",
+    "xliff": "application/xliff+xml; charset=utf-8",
+    DOCX_FORMAT: "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Translations kept for reuse, in multiples of the window
+REUSE_WINDOWS = 4
+
+
+@dataclass
+class DocumentStats:
+    """Counts of the segments of a translated document."""
+
+    segments: int = 0
+    # Segments sent to the model
+    translated: int = 0
+    # Copies of a recent segment, translated once
+    reused: int = 0
+
+
+def read_text(source: BinaryIO) -> Iterator[str]:
+    """Read a UTF-8 document in chunks of text."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while chunk := source.read(READ_CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+async def translate_items(
+    items: Iterable[DocumentItem],
+    translate: Callable[[str], Awaitable[str]],
+    write: Callable[[str], object],
+    window: int,
+    concurrency: int,
+    stats: DocumentStats,
+) -> None:
+    """Translate the segments of a document and write it in order.
+
+    Args:
+        items: Raw text and segments of the document, in order.
+        translate: Translates the text of a segment.
+        write: Writes the next piece of the translated document.
+        window: Segments in flight or waiting to be written.
+        concurrency: Segments translated at once.
+        stats: Counts updated with the segments of the document.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    recent: OrderedDict[str, asyncio.Task] = OrderedDict()
+    pending: deque[tuple[DocumentSegment | None, str | asyncio.Task]] = deque()
+    waiting = 0
+
+    async def run(text: str) -> str:
+        async with semaphore:
+            return await translate(text)
+
+    def write_ready() -> None:
+        nonlocal waiting
+        while pending and (pending[0][0] is None or pending[0][1].done()):
+            segment, value = pending.popleft()
+            if segment is None:
+                write(value)
+            else:
+                waiting -= 1
+                write(segment.output(value.result()))
+
+    try:
+        for item in items:
+            if isinstance(item, str):
+                pending.append((None, item))
+            else:
+                stats.segments += 1
+                task = recent.get(item.text)
+                if task is None:
+                    stats.translated += 1
+                    task = asyncio.create_task(run(item.text))
+                    recent[item.text] = task
+                    if len(recent) > window * REUSE_WINDOWS:
+                        recent.popitem(last=False)
+                else:
+                    stats.reused += 1
+                    recent.move_to_end(item.text)
+                pending.append((item, task))
+                waiting += 1
+            write_ready()
+            while waiting >= window:
+                await asyncio.wait({pending[0][1]})
+                write_ready()
+
+        while pending:
+            if pending[0][0] is not None:
+                await asyncio.wait({pending[0][1]})
+            write_ready()
+    finally:
+        # A failed segment (or a cancelled request) stops the rest of the document
+        tasks = {task for _, task in pending if isinstance(task, asyncio.Task)}
+        tasks.update(recent.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def document_segments(document_format: str, source: BinaryIO) -> Iterator[str]:
+    """Read the text of the segments of a document, without translating them.
+
+    Used to estimate the cost of a document before translating it. The source
+    is read to the end, it must be rewound before translating it.
+
+    Raises:
+        ValueError: If the document isn't valid UTF-8 or a DOCX archive.
+    """
+    if document_format != DOCX_FORMAT:
+        yield from _segment_texts(
+            TEXT_FORMATS[document_format](), source, "The document isn't UTF-8 text"
+        )
+        return
+
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError("The document isn't a DOCX file") from e
+    with archive:
+        for info in archive.infolist():
+            if TEXT_PART_PATTERN.match(info.filename):
+                with archive.open(info) as part:
+                    yield from _segment_texts(
+                        DocxXmlParser(), part, "The document isn't a valid DOCX file"
+                    )
+
+
+def _segment_texts(
+    parser: DocumentParser, source: BinaryIO, error: str
+) -> Iterator[str]:
+    """Yield the text of the segments the parser reads from the source."""
+    try:
+        for item in parser.parse(read_text(source)):
+            if not isinstance(item, str):
+                yield item.text
+    except UnicodeDecodeError as e:
+        raise ValueError(error) from e
+
+
+async def translate_document(
+    document_format: str,
+    source: BinaryIO,
+    output: BinaryIO,
+    translate: Callable[[str], Awaitable[str]],
+    window: int,
+    concurrency: int,
+) -> DocumentStats:
+    """Translate a document, keeping its structure.
+
+    Args:
+        document_format: One of DOCUMENT_FORMATS.
+        source: The document, read in chunks.
+        output: Where the translated document is written.
+        translate: Translates the text of a segment.
+        window: Segments in flight or waiting to be written.
+        concurrency: Segments translated at once.
+
+    Returns:
+        Counts of the segments of the document.
+
+    Raises:
+        ValueError: If the document isn't valid UTF-8 or a DOCX archive.
+    """
+    stats = DocumentStats()
+    if document_format == DOCX_FORMAT:
+        await _translate_docx(source, output, translate, window, concurrency, stats)
+        return stats
+
+    encoder = codecs.getincrementalencoder("utf-8")()
+    try:
+        await translate_items(
+            TEXT_FORMATS[document_format]().parse(read_text(source)),
+            translate,
+            lambda text: output.write(encoder.encode(text)),
+            window,
+            concurrency,
+            stats,
+        )
+    except UnicodeDecodeError as e:
+        raise ValueError("The document isn't UTF-8 text") from e
+    return stats
+
+
+async def _translate_docx(
+    source: BinaryIO,
+    output: BinaryIO,
+    translate: Callable[[str], Awaitable[str]],
+    window: int,
+    concurrency: int,
+    stats: DocumentStats,
+) -> None:
+    """Copy a DOCX archive, translating the parts with text."""
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError("The document isn't a DOCX file") from e
+
+    with archive, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as translated:
+        for info in archive.infolist():
+            copy_info = zipfile.ZipInfo(info.filename, info.date_time)
+            copy_info.compress_type = info.compress_type
+            copy_info.external_attr = info.external_attr
+            with archive.open(info) as part, translated.open(copy_info, "w") as copy:
+                if not TEXT_PART_PATTERN.match(info.filename):
+                    shutil.copyfileobj(part, copy, READ_CHUNK_SIZE)
+                    continue
+                encoder = codecs.getincrementalencoder("utf-8")()
+                try:
+                    await translate_items(
+                        DocxXmlParser().parse(read_text(part)),
+                        translate,
+                        lambda text: copy.write(encoder.encode(text)),
+                        window,
+                        concurrency,
+                        stats,
+                    )
+                except UnicodeDecodeError as e:
+                    raise ValueError("The document isn't a valid DOCX file") from e
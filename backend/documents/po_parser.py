@@ -0,0 +1,152 @@
+"""Gettext PO files: the msgid of each untranslated entry is a segment.
+
+Entries are read one at a time (they end at a blank line). Entries with a
+translation, the header and obsolete entries are copied as they are. The
+printf and brace format specifiers of the messages become placeholders, so the
+translation keeps the ones the program fills.
+"""
+
+import re
+from typing import Iterator, List
+
+from documents.base import DocumentItem, DocumentParser, DocumentSegment
+from translate_graph.placeholders import placeholder
+
+# %s, %d, %(name)s, %1$s, {0}, {name}... ("%%" is a literal percent sign)
+FORMAT_PATTERN = re.compile(
+    r"%(?:\(\w+\)|\d+\$)?[-+#0]*\d*(?:\.\d+)?[hlLqjzt]*[diouxXeEfFgGcrsa%]|\{\w*\}"
+)
+KEYWORD_PATTERN = re.compile(r"^(msgctxt|msgid_plural|msgid|msgstr(?:\[(\d+)\])?)\s")
+PO_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\t": "\\t"}
+PO_UNESCAPES = {value: key for key, value in PO_ESCAPES.items()}
+
+
+def unescape_po(text: str) -> str:
+    """Convert the content of a PO string to plain text."""
+    return re.sub(
+        r"\\.", lambda match: PO_UNESCAPES.get(match.group(), match.group()), text
+    )
+
+
+def escape_po(text: str) -> str:
+    """Convert plain text to the content of a PO string."""
+    return "".join(PO_ESCAPES.get(char, char) for char in text)
+
+
+def format_po_string(keyword: str, text: str) -> str:
+    """Format a PO keyword and its string, split at line breaks like msgmerge does."""
+    if "\n" not in text[:-1]:
+        return f'{keyword} "{escape_po(text)}"\n'
+    lines = [f'"{escape_po(line)}"' for line in text.splitlines(keepends=True)]
+    return f'{keyword} ""\n' + "\n".join(lines) + "\n"
+
+
+def message_segment(text: str) -> DocumentSegment:
+    """Build the segment of a message, with its format specifiers as placeholders."""
+    codes = []
+
+    def protect(match: re.Match) -> str:
+        codes.append(match.group())
+        return placeholder(len(codes))
+
+    # Line breaks around the message must be kept for msgfmt to accept the translation
+    stripped = text.strip()
+    start = text.index(stripped) if stripped else 0
+    return DocumentSegment(
+        text=FORMAT_PATTERN.sub(protect, stripped),
+        codes=codes,
+        prefix=text[:start],
+        suffix=text[start + len(stripped) :],
+    )
+
+
+class PoParser(DocumentParser):
+    """Parses a PO file into the messages of its untranslated entries."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.buffer = ""
+        self.entry: List[str] = []
+
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of the PO file."""
+        self.buffer += text
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            yield from self._line(line + "\n")
+
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the last entry of the file."""
+        if self.buffer:
+            yield from self._line(self.buffer)
+        self.buffer = ""
+        yield from self._entry()
+
+    def _line(self, line: str) -> Iterator[DocumentItem]:
+        if line.strip():
+            self.entry.append(line)
+        else:
+            yield from self._entry()
+            yield line
+
+    def _entry(self) -> Iterator[DocumentItem]:
+        lines, self.entry = self.entry, []
+        if not lines:
+            return
+
+        # Strings of each keyword, and the line where the translations start
+        strings: dict[str, str] = {}
+        translations_start = None
+        keyword = None
+        for index, line in enumerate(lines):
+            stripped = line.strip()
+            match = KEYWORD_PATTERN.match(stripped)
+            if match:
+                keyword = match.group(1)
+                if keyword.startswith("msgstr") and translations_start is None:
+                    translations_start = index
+                stripped = stripped[match.end() :].strip()
+            elif not stripped.startswith('"'):
+                # Comments, and obsolete entries (#~) that are never translated
+                keyword = None
+                continue
+            if keyword and len(stripped) >= 2:
+                strings[keyword] = strings.get(keyword, "") + unescape_po(
+                    stripped[1:-1]
+                )
+
+        translated = any(
+            text for key, text in strings.items() if key.startswith("msgstr")
+        )
+        message = FORMAT_PATTERN.sub("", strings.get("msgid", ""))
+        if (
+            translations_start is None
+            or translated
+            or not any(char.isalpha() for char in message)
+        ):
+            yield "".join(lines)
+            return
+
+        yield "".join(lines[:translations_start])
+        plural_keywords = sorted(
+            (key for key in strings if key.startswith("msgstr[")),
+            key=lambda key: int(key[7:-1]),
+        )
+        if not plural_keywords:
+            yield self._segment(strings["msgid"], "msgstr")
+            return
+        # The first form translates the singular, the others the plural
+        yield self._segment(strings["msgid"], plural_keywords[0])
+        if len(plural_keywords) > 1:
+            yield self._segment(
+                strings.get("msgid_plural", strings["msgid"]), *plural_keywords[1:]
+            )
+
+    @staticmethod
+    def _segment(message: str, *keywords: str) -> DocumentSegment:
+        segment = message_segment(message)
+        segment.render = lambda translation: "".join(
+            format_po_string(keyword, translation) for keyword in keywords
+        )
+        return segment
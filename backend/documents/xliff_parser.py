@@ -0,0 +1,131 @@
+"""XLIFF documents (1.2 and 2.x): the source of each unit is a segment.
+
+The translation is written in the <target> following the <source>, which is
+added when missing. Units that already have a translated target are kept.
+Inline elements of the source (<g>, <x/>, <ph>, <pc>...) become placeholders.
+"""
+
+from typing import Iterator, List
+
+from documents.base import DocumentItem, DocumentParser, build_segment
+from documents.markup import (
+    MarkupTokenizer,
+    escape_markup,
+    is_closing_tag,
+    is_self_closing_tag,
+    tag_name,
+    unescape_markup,
+)
+
+# Reading states
+OUTSIDE = "outside"
+IN_SOURCE = "source"
+AFTER_SOURCE = "after_source"
+IN_TARGET = "target"
+
+
+def _namespace_prefix(tag: str) -> str:
+    """Get the namespace prefix of a tag ("xliff:" for <xliff:source>)."""
+    name = tag.lstrip("</").split(None, 1)[0].rstrip("/>")
+    return name[: name.index(":") + 1] if ":" in name else ""
+
+
+class XliffParser(DocumentParser):
+    """Parses XLIFF into the sources of its untranslated units."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.tokenizer = MarkupTokenizer()
+        self.state = OUTSIDE
+        self.source: List[tuple[bool, str]] = []
+        self.source_tag = ""
+        # Raw tokens read after the source, until its target or the next element
+        self.pending: List[str] = []
+        self.in_seg_source = False
+        self.target_tag = ""
+        self.target: List[tuple[bool, str]] = []
+
+    def feed(self, text: str) -> Iterator[DocumentItem]:
+        """Parse the next chunk of XLIFF."""
+        for is_text, raw in self.tokenizer.feed(text):
+            yield from self._token(is_text, raw)
+
+    def close(self) -> Iterator[DocumentItem]:
+        """Yield the end of the document."""
+        for is_text, raw in self.tokenizer.close():
+            yield from self._token(is_text, raw)
+        yield from self.pending
+        if self.state == IN_TARGET:
+            yield self.target_tag
+        yield from (raw for _, raw in self.target)
+
+    def _token(self, is_text: bool, raw: str) -> Iterator[DocumentItem]:
+        name = "" if is_text else tag_name(raw)
+        opening = not is_text and not is_closing_tag(raw)
+
+        if self.state == OUTSIDE:
+            yield raw
+            if name == "source" and opening and not is_self_closing_tag(raw):
+                self.source_tag = raw
+                self.source = []
+                self.state = IN_SOURCE
+        elif self.state == IN_SOURCE:
+            yield raw
+            if name == "source" and not opening:
+                self.pending = []
+                self.state = AFTER_SOURCE
+            else:
+                self.source.append((is_text, raw))
+        elif self.state == AFTER_SOURCE:
+            if self.in_seg_source or name == "seg-source":
+                # Segmented copy of the source (1.2), the target comes after it
+                self.pending.append(raw)
+                if name == "seg-source":
+                    self.in_seg_source = opening and not is_self_closing_tag(raw)
+            elif name == "target" and opening:
+                self.target_tag = raw
+                self.target = []
+                if is_self_closing_tag(raw):
+                    yield from self.pending
+                    yield from self._target(raw[:-2].rstrip() + ">")
+                else:
+                    self.state = IN_TARGET
+            elif is_text:
+                self.pending.append(raw)
+            else:
+                # No target: it's added before the next element
+                read = "".join(self.pending)
+                indentation = read[len(read.rstrip()) :]
+                yield from self.pending
+                yield from self._target(f"<{_namespace_prefix(self.source_tag)}target>")
+                yield indentation
+                yield from self._token(is_text, raw)
+        elif self.state == IN_TARGET:
+            if name == "target" and not opening:
+                yield from self.pending
+                if any(is_text and text.strip() for is_text, text in self.target):
+                    # Already translated
+                    yield self.target_tag
+                    yield from (text for _, text in self.target)
+                    yield raw
+                    self._reset()
+                else:
+                    yield from self._target(self.target_tag)
+            else:
+                self.target.append((is_text, raw))
+
+    def _target(self, opening_tag: str) -> Iterator[DocumentItem]:
+        """Yield the target of the unit, with the translation of its source."""
+        closing_tag = f"</{_namespace_prefix(opening_tag)}target>"
+        segment = build_segment(self.source, unescape_markup, escape_markup)
+        if segment:
+            segment.render = lambda output: opening_tag + output + closing_tag
+            yield segment
+        else:
+            yield opening_tag + "".join(raw for _, raw in self.source) + closing_tag
+        self._reset()
+
+    def _reset(self) -> None:
+        self.state = OUTSIDE
+        self.source, self.pending, self.target = [], [], []
+        self.in_seg_source = False
@@ -1,6 +1,6 @@
 """Main glossary manager providing high-level interface for glossary operations."""
 
-from typing import Dict
+from typing import Dict, List
 
 from database.connection import get_database_connection
 from database.glossary_operations import GlossaryOperations
@@ -109,6 +109,56 @@ class GlossaryManager:
             user_id, source_language, target_language
         )
 
+    def get_all_sources_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """Get all sources of a user's glossaries for several target languages at once.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to its sources, in the
+            format of get_all_sources_for_user.
+        """
+        return self.db.get_entries_dicts_for_user_targets(
+            user_id, source_language, target_languages
+        )
+
+    def get_revisions_for_user_targets(
+        self, user_id: str, source_language: str, target_languages: List[str]
+    ) -> Dict[str, str]:
+        """Get the revisions of a user's glossaries for several target languages at once.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code.
+            target_languages: Target language codes.
+
+        Returns:
+            Dictionary mapping each target language to its revision string.
+        """
+        return self.db.get_revisions_for_user_targets(
+            user_id, source_language, target_languages
+        )
+
+    def get_revision_for_user(
+        self, user_id: str, source_language: str = "en", target_language: str = "es"
+    ) -> str:
+        """Get the revision of a user's glossary for a language pair.
+
+        Args:
+            user_id: The user ID.
+            source_language: Source language code (default: "en").
+            target_language: Target language code (default: "es").
+
+        Returns:
+            Revision string that changes whenever an entry is added, edited or removed.
+        """
+        return self.db.get_revision_for_user(user_id, source_language, target_language)
+
     def get_all_entries(self, source_language: str = "en", target_language: str = "es"):
         """Get all glossary entries as GlossaryEntry objects.
 
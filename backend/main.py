@@ -19,6 +19,11 @@ from routes import (
     user_endpoints,
     waitlist_endpoints,
 )
+from translate_graph.index import checkpointer, llm, translation_flight
+from translate_graph.matching_session import matching_sessions
+from utils.admission import admission_controller
+from utils.improvement_cache import improvement_cache
+from utils.improvement_gate import improvement_gate
 from utils.logger import logger
 
 
@@ -27,9 +32,11 @@ async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
     # Startup
     initialize_database()
+    checkpointer.start_janitor(config.CHECKPOINT_VACUUM_INTERVAL_SECONDS)
     logger.info("Server initialised")
     yield
-    # Shutdown (if any cleanup is needed in the future)
+    # Shutdown
+    checkpointer.stop_janitor()
 
 
 app = FastAPI(
@@ -57,6 +64,19 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Load and cache counters of this worker, used for autoscaling decisions."""
+    return {
+        "admission": admission_controller.stats(),
+        "translation_flight": translation_flight.stats(),
+        "llm": llm.stats(),
+        "improvement_gate": improvement_gate.stats(),
+        "improvement_cache": improvement_cache.stats(),
+        "matching_sessions": matching_sessions.stats(),
+    }
+
+
 # Include routers
 app.include_router(graph_endpoints.router)
 app.include_router(glossary_endpoints.router)
@@ -66,6 +86,18 @@ app.include_router(rules_endpoints.router)
 app.include_router(pricing_endpoints.router)
 app.include_router(user_endpoints.router)
 if __name__ == "__main__":
+    workers = config.API_WORKERS
+    if workers > 1 and config.STATE_BACKEND != "sqlite":
+        logger.warning(
+            "Running several workers with in-memory state: the improvement suggestions, "
+            "LLM token history, rate limit penalties and matching sessions of each worker "
+            "are not seen by the others."
+        )
     uvicorn.run(
-        "main:app", host=config.API_HOST, port=config.API_PORT, reload=config.API_RELOAD
+        "main:app",
+        host=config.API_HOST,
+        port=config.API_PORT,
+        # Reload only supports a single worker
+        reload=config.API_RELOAD and workers == 1,
+        workers=workers,
     )
@@ -12,6 +12,14 @@ class TranslateRequest(BaseModel):
     target_language: str
 
 
+class TranslateManyRequest(BaseModel):
+    """Request model to translate a text to several target languages."""
+
+    message: str
+    source_language: str
+    target_languages: list[str]
+
+
 class GlossaryEntry(BaseModel):
     """Model for a glossary entry."""
 
@@ -66,6 +74,53 @@ class GlossaryResponse(BaseModel):
     target_language: str
 
 
+class GlossaryOccurrence(BaseModel):
+    """Model for an occurrence of a glossary term in a text."""
+
+    start: int
+    end: int
+    text: str
+    term: str
+    target: str
+    score: float
+    entry_id: int | None = None
+
+
+class StartMatchSessionRequest(BaseModel):
+    """Request model for starting an incremental glossary matching session."""
+
+    text: str
+    source_language: str
+    target_language: str
+
+
+class MatchSessionResponse(BaseModel):
+    """Response model for a new matching session with all the matches of its text."""
+
+    session_id: str
+    version: int
+    matches: list[GlossaryOccurrence] = []
+
+
+class MatchEditRequest(BaseModel):
+    """Request model for an edit of the text of a matching session."""
+
+    offset: int
+    deleted: int = 0
+    inserted: str = ""
+    # Version the edit applies to, rejected with a 409 if the session moved on
+    version: int | None = None
+
+
+class MatchDeltaResponse(BaseModel):
+    """Response model for the matches added and removed by an edit."""
+
+    session_id: str
+    version: int
+    added: list[GlossaryOccurrence] = []
+    removed: list[GlossaryOccurrence] = []
+
+
 class RulesEntry(BaseModel):
     """Model for a language rule entry."""
 
@@ -73,6 +128,7 @@ class RulesEntry(BaseModel):
     source_language: str
     target_language: str
     user_id: str | None = None
+    pinned: bool = False
 
 
 class ApplyRulesRequest(BaseModel):
@@ -90,6 +146,15 @@ class EditRulesRequest(BaseModel):
     target_language: str
 
 
+class PinRulesRequest(BaseModel):
+    """Request model for pinning a language rule."""
+
+    text: str
+    source_language: str
+    target_language: str
+    pinned: bool = True
+
+
 class DeleteRulesRequest(BaseModel):
     """Request model for deleting a language rule."""
 
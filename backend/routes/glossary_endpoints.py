@@ -1,5 +1,7 @@
 """Glossary-related endpoints for the translation API."""
 
+from dataclasses import asdict
+
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from supertokens_python.recipe.session import SessionContainer
 from supertokens_python.recipe.session.framework.fastapi import verify_session
@@ -12,12 +14,20 @@ from models import (
     DeleteGlossaryRequest,
     EditGlossaryRequest,
     GlossaryEntry,
+    GlossaryOccurrence,
     GlossaryResponse,
+    MatchDeltaResponse,
+    MatchEditRequest,
+    MatchSessionResponse,
+    StartMatchSessionRequest,
 )
+from translate_graph.match_words import GlossarySpan
+from translate_graph.matching_session import VersionConflictError, matching_sessions
 from translate_graph.prompts import lead_update_glossary_prompt
 from translate_graph.state import GlossaryUpdate, NoUpdate, RulesUpdate
 from utils.graph_utils import get_graph_state
 from utils.improvement_cache import improvement_cache
+from utils.improvement_gate import improvement_gate
 from utils.llm_service import LLM_Service
 from utils.logger import logger
 from utils.user_tracking_service import UserTrackingService
@@ -80,7 +90,17 @@ def check_glossary_updates(conversation_id: str):
         return []
 
     # unpack the last 3 messages (translation, feedback, translation_with_feedback)
-    translation_without_feedback, feedback, _ = state["messages"][-3:]
+    translation_without_feedback, feedback, translation_with_feedback = state[
+        "messages"
+    ][-3:]
+
+    # Skip the LLM round trip for feedback that can't yield glossary or rule updates
+    if not improvement_gate.should_extract(
+        feedback.content,
+        translation_without_feedback.content,
+        translation_with_feedback.content,
+    ):
+        return []
 
     prompt = lead_update_glossary_prompt.format(
         translation_with_errors=translation_without_feedback.content,
@@ -235,3 +255,107 @@ def apply_improvement(
 
     else:
         raise HTTPException(status_code=400, detail="Invalid improvement type")
+
+
+def to_occurrences(spans: list[GlossarySpan]) -> list[GlossaryOccurrence]:
+    """Convert matcher spans to response models."""
+    return [GlossaryOccurrence(**asdict(span)) for span in spans]
+
+
+@router.post("/match-session")
+def start_match_session(
+    request: StartMatchSessionRequest,
+    session: SessionContainer = Depends(verify_session()),
+) -> MatchSessionResponse:
+    """Match a text against the user's glossary and keep it for incremental edits."""
+    user_id = session.get_user_id()
+    glossary_manager = GlossaryManager()
+    revision = glossary_manager.get_revision_for_user(
+        user_id, request.source_language, request.target_language
+    )
+    matcher = matching_sessions.matcher(
+        user_id,
+        request.source_language,
+        request.target_language,
+        revision,
+        lambda: glossary_manager.get_all_sources_for_user(
+            user_id, request.source_language, request.target_language
+        ),
+    )
+    match_session = matching_sessions.start(
+        user_id,
+        request.source_language,
+        request.target_language,
+        request.text,
+        matcher,
+        revision,
+    )
+    return MatchSessionResponse(
+        session_id=match_session.session_id,
+        version=match_session.version,
+        matches=to_occurrences(match_session.spans),
+    )
+
+
+@router.post("/match-session/{session_id}/edit")
+def edit_match_session(
+    session_id: str,
+    request: MatchEditRequest,
+    session: SessionContainer = Depends(verify_session()),
+) -> MatchDeltaResponse:
+    """Apply an edit to the text of a matching session and get the matches it changed."""
+    user_id = session.get_user_id()
+    match_session = matching_sessions.get(session_id, user_id)
+    if match_session is None:
+        raise HTTPException(status_code=404, detail="Matching session not found")
+
+    # The whole text is matched again if the glossary changed since the last edit
+    glossary_manager = GlossaryManager()
+    revision = glossary_manager.get_revision_for_user(
+        user_id, match_session.source_language, match_session.target_language
+    )
+    matcher = matching_sessions.matcher(
+        user_id,
+        match_session.source_language,
+        match_session.target_language,
+        revision,
+        lambda: glossary_manager.get_all_sources_for_user(
+            user_id, match_session.source_language, match_session.target_language
+        ),
+    )
+
+    try:
+        delta = matching_sessions.edit(
+            session_id,
+            user_id,
+            request.offset,
+            request.deleted,
+            request.inserted,
+            matcher,
+            revision,
+            request.version,
+        )
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if delta is None:
+        raise HTTPException(status_code=404, detail="Matching session not found")
+
+    return MatchDeltaResponse(
+        session_id=session_id,
+        version=delta.version,
+        added=to_occurrences(delta.added),
+        removed=to_occurrences(delta.removed),
+    )
+
+
+@router.delete("/match-session/{session_id}")
+def close_match_session(
+    session_id: str, session: SessionContainer = Depends(verify_session())
+):
+    """Close a matching session."""
+    if matching_sessions.close(session_id, session.get_user_id()):
+        return {"message": "success"}
+
+    raise HTTPException(status_code=404, detail="Matching session not found")
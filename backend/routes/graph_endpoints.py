@@ -1,46 +1,188 @@
 """Graph-related endpoints for the translation API."""
 
+import asyncio
+import tempfile
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from langgraph.types import Command
+from starlette.background import BackgroundTask
 from supertokens_python.recipe.session import SessionContainer
 from supertokens_python.recipe.session.framework.fastapi import verify_session
 
+from config import config
 from database.models import GlossaryEntry, LangRuleEntry
 from database.rules_operations import RulesOperations
+from documents import (
+    DOCUMENT_FORMATS,
+    MEDIA_TYPES,
+    document_segments,
+    translate_document,
+)
 from glossary.manager import GlossaryManager
 from models import (
     ApplyImprovementRequest,
     ImprovementEntry,
     ImprovementsResponse,
+    TranslateManyRequest,
     TranslateRequest,
 )
 from routes.glossary_endpoints import check_glossary_updates
-from translate_graph.index import graph
+from translate_graph.index import (
+    DocumentSnapshots,
+    checkpointer,
+    graph,
+    load_snapshots,
+)
 from translate_graph.state import TranslateState
-from utils.graph_utils import create_graph_config, get_graph_state
+from utils.admission import admission_controller
+from utils.graph_utils import (
+    create_graph_config,
+    get_graph_state,
+    latest_checkpoint,
+    rollback_conversation,
+    run_until_disconnected,
+)
 from utils.improvement_cache import improvement_cache
 from utils.logger import logger
+from utils.token_estimator import token_estimator
 from utils.user_tracking_service import UserTrackingService
 
 router = APIRouter(prefix="/graphs", tags=["graph"])
 
+# Documents are kept in memory up to this size, then spooled to disk
+DOCUMENT_SPOOL_BYTES = 1024 * 1024
+
+
+def check_text_length(text: str) -> None:
+    """Reject texts longer than MAX_INPUT_TOKENS.
+
+    Raises:
+        HTTPException: 413 if the text is too long.
+    """
+    text_tokens = token_estimator.estimate(text, config.GOOGLE_LLM_MODEL)
+    if text_tokens > config.MAX_INPUT_TOKENS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text too long (~{text_tokens} tokens, the limit is {config.MAX_INPUT_TOKENS})",
+        )
+
+
+def check_input_size(text: str, translations: int = 1) -> None:
+    """Reject oversized texts and requests that would exceed the user quota before calling the LLM.
+
+    Args:
+        text: Text sent to the LLM.
+        translations: Number of translations of the text the request makes.
+
+    Raises:
+        HTTPException: 413 if the text is too long, 429 if the quota can't cover it.
+    """
+    check_text_length(text)
+    UserTrackingService().check_quota_for(
+        token_estimator.estimate_translation(text, config.GOOGLE_LLM_MODEL)
+        * translations
+    )
+
+
+def check_document_size(document_format: str, source) -> None:
+    """Reject documents the user quota can't cover before translating any segment.
+
+    Each distinct segment is a translation of its own, so its cost is estimated
+    as one. Checking the whole document up front avoids failing halfway, once
+    the first segments were already translated and charged.
+
+    Args:
+        document_format: One of DOCUMENT_FORMATS.
+        source: The document, read to the end.
+
+    Raises:
+        HTTPException: 413 if a segment is too long, 429 if the quota can't cover the document.
+        ValueError: If the document isn't valid UTF-8 or a DOCX archive.
+    """
+    seen = set()
+    estimated_tokens = 0
+    for text in document_segments(document_format, source):
+        if text in seen:
+            continue
+        seen.add(text)
+        check_text_length(text)
+        estimated_tokens += token_estimator.estimate_translation(
+            text, config.GOOGLE_LLM_MODEL
+        )
+    UserTrackingService().check_quota_for(estimated_tokens)
+
+
+def check_refinement_size(conversation_id: str, feedback: str) -> None:
+    """Reject oversized feedback and refinements that would exceed the user quota.
+
+    The refinement prompt also carries the original text and the current
+    translation, which are read from the conversation state.
+
+    Args:
+        conversation_id: Conversation being refined.
+        feedback: Feedback of the user.
+
+    Raises:
+        HTTPException: 404 if the conversation doesn't exist, 413 if the feedback
+            is too long, 429 if the quota can't cover the refinement.
+    """
+    check_text_length(feedback)
+    state = get_graph_state(conversation_id)
+    messages = state.get("messages") or []
+    UserTrackingService().check_quota_for(
+        token_estimator.estimate_refinement(
+            state.get("original_text", ""),
+            messages[-1].content if messages else "",
+            feedback,
+            config.GOOGLE_LLM_MODEL,
+        )
+    )
+
 
 def extractInterruption(state: TranslateState):
     """Extract interruption value from LangGraph state."""
     return state["__interrupt__"][0].value
 
 
-def run_graph(input_data, thread_id: str):
-    """Run the translation graph with the given input data and thread ID."""
-    config = create_graph_config(thread_id)
-    result: TranslateState = graph.invoke(input_data, config)
+def translation_metadata(state: TranslateState) -> dict:
+    """Extract the metadata of the initial translation from LangGraph state."""
+    return {"deduplication": state.get("deduplication")}
+
+
+async def invoke_graph(input_data, thread_id: str, tier: str) -> TranslateState:
+    """Run the translation graph once an admission slot of the tier is free.
+
+    A run that fails or is cancelled (e.g. the client disconnected) rolls the
+    conversation back to where it was, so the next request starts from there.
+    """
+    async with admission_controller.slot(tier):
+        saved = await run_in_threadpool(latest_checkpoint, thread_id)
+        try:
+            return await graph.ainvoke(input_data, create_graph_config(thread_id))
+        except BaseException:
+            # Shielded so a second cancellation doesn't leave the rollback half done
+            await asyncio.shield(
+                run_in_threadpool(rollback_conversation, thread_id, saved)
+            )
+            raise
+
+
+async def run_graph(input_data, thread_id: str, request: Request):
+    """Run the translation graph under admission control, cancelling it if the client disconnects."""
+    tier = UserTrackingService().get_priority_tier()
+
+    # Waiting for a slot is also cancelled if the client disconnects
+    result: TranslateState = await run_until_disconnected(
+        request, invoke_graph(input_data, thread_id, tier)
+    )
     return result
 
 
 @router.post("/translate")
-def translate(
+async def translate(
     translate_request: TranslateRequest,
     request: Request,
     session: SessionContainer | None = Depends(verify_session(session_required=False)),
@@ -52,6 +194,11 @@ def translate(
     # Set IP context for rate limiting - extract real user IP
     user_tracking.set_request_ip_from_request(request)
     user_tracking.set_user_id(session.get_user_id() if session else None)
+    user_tracking.set_priority_tier(
+        await run_in_threadpool(user_tracking.resolve_priority_tier)
+    )
+
+    await run_in_threadpool(check_input_size, translate_request.message)
 
     thread_id = translate_request.conversation_id
     if not thread_id:
@@ -64,13 +211,231 @@ def translate(
         "user_id": session.get_user_id() if session else None,
     }
 
-    result = run_graph(input_data, thread_id)
+    result = await run_graph(input_data, thread_id, request)
 
-    return {"response": extractInterruption(result), "conversation_id": thread_id}
+    return {
+        "response": extractInterruption(result),
+        "conversation_id": thread_id,
+        "metadata": translation_metadata(result),
+    }
+
+
+@router.post("/translate-many")
+async def translate_many(
+    translate_request: TranslateManyRequest,
+    request: Request,
+    session: SessionContainer | None = Depends(verify_session(session_required=False)),
+):
+    """Translate a text to several target languages at once.
+
+    The glossaries and rules of all the targets are loaded together and the text
+    is matched once against them. Each target is then translated concurrently in
+    its own conversation, which can be refined with /refine-translation.
+    """
+    # Create user tracking service when needed
+    user_tracking = UserTrackingService()
+
+    # Set IP context for rate limiting - extract real user IP
+    user_tracking.set_request_ip_from_request(request)
+    user_id = session.get_user_id() if session else None
+    user_tracking.set_user_id(user_id)
+    user_tracking.set_priority_tier(
+        await run_in_threadpool(user_tracking.resolve_priority_tier)
+    )
+
+    target_languages = list(dict.fromkeys(translate_request.target_languages))
+    if not target_languages:
+        raise HTTPException(status_code=400, detail="No target language given")
+    if len(target_languages) > config.MAX_TRANSLATION_TARGETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many target languages ({len(target_languages)}, the limit is {config.MAX_TRANSLATION_TARGETS})",
+        )
+    await run_in_threadpool(
+        check_input_size,
+        translate_request.message,
+        translations=len(target_languages),
+    )
+
+    snapshots = await run_in_threadpool(
+        load_snapshots,
+        user_id,
+        translate_request.source_language,
+        target_languages,
+        translate_request.message,
+    )
+    thread_ids = {
+        target_language: str(uuid.uuid4()) for target_language in target_languages
+    }
+    tier = user_tracking.get_priority_tier()
+
+    async def _translate_all() -> list:
+        return await asyncio.gather(
+            *(
+                invoke_graph(
+                    {
+                        "messages": translate_request.message,
+                        "source_language": translate_request.source_language,
+                        "target_language": target_language,
+                        "user_id": user_id,
+                        "preloaded_snapshot": snapshots[target_language],
+                    },
+                    thread_ids[target_language],
+                    tier,
+                )
+                for target_language in target_languages
+            ),
+            return_exceptions=True,
+        )
+
+    results = await run_until_disconnected(request, _translate_all())
+
+    # A target failing (e.g. no admission slot) doesn't discard the others
+    translations = []
+    for target_language, result in zip(target_languages, results):
+        if isinstance(result, HTTPException):
+            translations.append(
+                {
+                    "target_language": target_language,
+                    "error": result.detail,
+                    "status_code": result.status_code,
+                }
+            )
+        elif isinstance(result, BaseException):
+            logger.error(f"Error translating to {target_language}: {result}")
+            translations.append(
+                {
+                    "target_language": target_language,
+                    "error": "Translation failed",
+                    "status_code": 500,
+                }
+            )
+        else:
+            translations.append(
+                {
+                    "target_language": target_language,
+                    "response": extractInterruption(result),
+                    "conversation_id": thread_ids[target_language],
+                    "metadata": translation_metadata(result),
+                }
+            )
+    return {"translations": translations}
+
+
+@router.post("/translate-document")
+async def translate_document_endpoint(
+    request: Request,
+    source_language: str,
+    target_language: str,
+    document_format: str = Query(alias="format"),
+    session: SessionContainer | None = Depends(verify_session(session_required=False)),
+):
+    """Translate a document sent as the request body, returning it in the same format.
+
+    The document is parsed while it's read, each segment goes through the
+    translation graph with the glossary and rules of the user, and the
+    translated document is reassembled with its original structure.
+    """
+    # Create user tracking service when needed
+    user_tracking = UserTrackingService()
+
+    # Set IP context for rate limiting - extract real user IP
+    user_tracking.set_request_ip_from_request(request)
+    user_id = session.get_user_id() if session else None
+    user_tracking.set_user_id(user_id)
+    user_tracking.set_priority_tier(
+        await run_in_threadpool(user_tracking.resolve_priority_tier)
+    )
+
+    if document_format not in DOCUMENT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format, use one of: {', '.join(DOCUMENT_FORMATS)}",
+        )
+
+    source = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_BYTES)
+    output = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_BYTES)
+    try:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > config.MAX_DOCUMENT_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Document too large, the limit is {config.MAX_DOCUMENT_BYTES} bytes",
+                )
+            source.write(chunk)
+        source.seek(0)
+        try:
+            await run_in_threadpool(check_document_size, document_format, source)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        source.seek(0)
+
+        snapshots = await run_in_threadpool(
+            DocumentSnapshots, user_id, source_language, target_language
+        )
+        tier = user_tracking.get_priority_tier()
+        document_id = str(uuid.uuid4())
+
+        async def translate_segment(text: str) -> str:
+            thread_id = f"{document_id}-{uuid.uuid4()}"
+            result = await invoke_graph(
+                {
+                    "messages": text,
+                    "source_language": source_language,
+                    "target_language": target_language,
+                    "user_id": user_id,
+                    "preloaded_snapshot": await run_in_threadpool(
+                        snapshots.snapshot, text
+                    ),
+                },
+                thread_id,
+                tier,
+            )
+            # Segments aren't refined, their conversation isn't kept
+            await run_in_threadpool(checkpointer.delete_thread, thread_id)
+            return extractInterruption(result)
+
+        try:
+            stats = await run_until_disconnected(
+                request,
+                translate_document(
+                    document_format,
+                    source,
+                    output,
+                    translate_segment,
+                    config.DOCUMENT_SEGMENT_WINDOW,
+                    config.DOCUMENT_CONCURRENCY,
+                ),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        output.close()
+        raise
+    finally:
+        source.close()
+
+    logger.info(
+        f"Translated {document_format} document. User Id: {user_id}. Lang: {source_language} --> {target_language}. "
+        f"Segments: {stats.segments}, translated: {stats.translated}, reused: {stats.reused}"
+    )
+    output.seek(0)
+    return StreamingResponse(
+        iter(lambda: output.read(DOCUMENT_SPOOL_BYTES), b""),
+        media_type=MEDIA_TYPES[document_format],
+        headers={
+            "X-Document-Segments": str(stats.segments),
+            "X-Document-Translated-Segments": str(stats.translated),
+            "X-Document-Reused-Segments": str(stats.reused),
+        },
+        background=BackgroundTask(output.close),
+    )
 
 
 @router.post("/refine-translation")
-def refine_translation(
+async def refine_translation(
     translate_request: TranslateRequest,
     request: Request,
     session: SessionContainer | None = Depends(verify_session(session_required=False)),
@@ -82,6 +447,9 @@ def refine_translation(
     # Set IP context for rate limiting - extract real user IP
     user_tracking.set_request_ip_from_request(request)
     user_tracking.set_user_id(session.get_user_id() if session else None)
+    user_tracking.set_priority_tier(
+        await run_in_threadpool(user_tracking.resolve_priority_tier)
+    )
 
     thread_id = translate_request.conversation_id
     if not thread_id:
@@ -90,11 +458,15 @@ def refine_translation(
         )
 
     user_refinement_message = translate_request.message
-    result = run_graph(Command(resume=user_refinement_message), thread_id)
+    await run_in_threadpool(check_refinement_size, thread_id, user_refinement_message)
+    result = await run_graph(
+        Command(resume=user_refinement_message), thread_id, request
+    )
 
-    check_glossary_updates(
-        thread_id
-    )  # Triggers the search for glossary improvements on the background
+    # In combined mode the refinement call already extracted the improvements
+    if not config.COMBINED_REFINEMENT:
+        # Triggers the search for glossary improvements on the background
+        await run_in_threadpool(check_glossary_updates, thread_id)
 
     return {"response": extractInterruption(result), "conversation_id": thread_id}
 
@@ -9,6 +9,7 @@ from models import (
     ApplyRulesRequest,
     DeleteRulesRequest,
     EditRulesRequest,
+    PinRulesRequest,
     RulesEntry,
     RulesResponse,
 )
@@ -42,6 +43,7 @@ async def get_rules_entries(
             source_language=entry.source_language,
             target_language=entry.target_language,
             user_id=entry.user_id,
+            pinned=entry.pinned,
         )
         for entry in entries
     ]
@@ -68,6 +70,7 @@ def add_rule(
         source_language=rules_entry.source_language,
         target_language=rules_entry.target_language,
         user_id=user_id,
+        pinned=rules_entry.pinned,
     )
 
     if rules_operations.add_entry(entry):
@@ -84,6 +87,10 @@ def edit_rule(
     user_id = session.get_user_id()
     rules_operations = RulesOperations()
 
+    old_entry = rules_operations.get_entry(
+        request.old_text, user_id, request.source_language, request.target_language
+    )
+
     # First remove the old rule
     if not rules_operations.remove_entry(
         request.old_text, user_id, request.source_language, request.target_language
@@ -98,6 +105,7 @@ def edit_rule(
         source_language=request.source_language,
         target_language=request.target_language,
         user_id=user_id,
+        pinned=old_entry.pinned if old_entry else False,
     )
 
     if rules_operations.add_entry(entry):
@@ -106,6 +114,26 @@ def edit_rule(
     raise HTTPException(status_code=500, detail="Failed to update rule")
 
 
+@router.put("/pin-rule")
+def pin_rule(
+    request: PinRulesRequest, session: SessionContainer = Depends(verify_session())
+):
+    """Pin a language rule so it is always included in the prompt, or unpin it."""
+    user_id = session.get_user_id()
+    rules_operations = RulesOperations()
+
+    if rules_operations.set_pinned(
+        request.text,
+        user_id,
+        request.source_language,
+        request.target_language,
+        request.pinned,
+    ):
+        return {"message": "success"}
+
+    raise HTTPException(status_code=404, detail="Rule not found")
+
+
 @router.delete("/delete-rule")
 def delete_rule(
     request: DeleteRulesRequest,
@@ -0,0 +1,136 @@
+"""Compact serializer for conversation checkpoints.
+
+A checkpoint repeats the same long strings many times: the original text is in
+``original_text`` and in the first ``HumanMessage``, and each translation is
+kept in the message history and in the interrupt value. Before serializing,
+every long string is replaced by a reference into a per-checkpoint string
+table, then the whole envelope is compressed with zstd.
+
+Checkpoints written by the default serializer are still readable.
+"""
+
+import threading
+from typing import Any, Dict, List
+
+import ormsgpack
+import zstandard
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+COMPACT_TYPE = "compact"
+COMPACT_FORMAT_VERSION = 1
+
+# Strings at least this long are stored once per checkpoint in the string table
+INTERN_MIN_LENGTH = 128
+
+# Prefix of a string table reference, a string starting with it is always
+# interned so it can never be confused with a reference
+_REF_PREFIX = "\x00tp-ref:"
+
+
+class _StringTable:
+    """Collect long strings of an object and replace them with references."""
+
+    def __init__(self, min_length: int):
+        self.min_length = min_length
+        self.strings: List[str] = []
+        self._indexes: Dict[str, int] = {}
+
+    def compact(self, obj: Any) -> Any:
+        """Return a copy of obj where long strings are table references."""
+        if isinstance(obj, str):
+            if len(obj) < self.min_length and not obj.startswith(_REF_PREFIX):
+                return obj
+            index = self._indexes.get(obj)
+            if index is None:
+                index = self._indexes[obj] = len(self.strings)
+                self.strings.append(obj)
+            return f"{_REF_PREFIX}{index}"
+        if isinstance(obj, BaseMessage):
+            return obj.model_copy(update={"content": self.compact(obj.content)})
+        if isinstance(obj, dict):
+            return {key: self.compact(value) for key, value in obj.items()}
+        if type(obj) is list:
+            return [self.compact(value) for value in obj]
+        if type(obj) is tuple:
+            return tuple(self.compact(value) for value in obj)
+        return obj
+
+
+def _expand(obj: Any, strings: List[str]) -> Any:
+    """Replace string table references with the original strings."""
+    if isinstance(obj, str):
+        if obj.startswith(_REF_PREFIX):
+            return strings[int(obj[len(_REF_PREFIX) :])]
+        return obj
+    if isinstance(obj, BaseMessage):
+        obj.content = _expand(obj.content, strings)
+        return obj
+    if isinstance(obj, dict):
+        return {key: _expand(value, strings) for key, value in obj.items()}
+    if type(obj) is list:
+        return [_expand(value, strings) for value in obj]
+    if type(obj) is tuple:
+        return tuple(_expand(value, strings) for value in obj)
+    return obj
+
+
+class CompactSerializer(SerializerProtocol):
+    """Checkpoint serializer with long-string deduplication and zstd compression."""
+
+    def __init__(
+        self,
+        inner: SerializerProtocol | None = None,
+        level: int = 3,
+        intern_min_length: int = INTERN_MIN_LENGTH,
+    ):
+        """Initialize the serializer.
+
+        Args:
+            inner: Serializer used for the deduplicated object. Defaults to JsonPlusSerializer.
+            level: zstd compression level.
+            intern_min_length: Minimum length of the strings moved to the string table.
+        """
+        self.inner = inner or JsonPlusSerializer()
+        self.level = level
+        self.intern_min_length = intern_min_length
+        # zstd contexts are not thread safe, keep one per thread
+        self._local = threading.local()
+
+    @property
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return self._local.compressor
+
+    @property
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.decompressor
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        """Serialize an object to a compact, compressed payload."""
+        if obj is None or isinstance(obj, (bytes, bytearray)):
+            return self.inner.dumps_typed(obj)
+
+        table = _StringTable(self.intern_min_length)
+        inner_type, inner_data = self.inner.dumps_typed(table.compact(obj))
+        envelope = ormsgpack.packb(
+            [COMPACT_FORMAT_VERSION, table.strings, inner_type, inner_data]
+        )
+        return COMPACT_TYPE, self._compressor.compress(envelope)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        """Deserialize a compact payload, or delegate other types to the inner serializer."""
+        type_, payload = data
+        if type_ != COMPACT_TYPE:
+            return self.inner.loads_typed(data)
+
+        version, strings, inner_type, inner_data = ormsgpack.unpackb(
+            self._decompressor.decompress(payload)
+        )
+        if version != COMPACT_FORMAT_VERSION:
+            raise NotImplementedError(f"Unknown compact checkpoint version: {version}")
+        return _expand(self.inner.loads_typed((inner_type, inner_data)), strings)
@@ -0,0 +1,282 @@
+"""Persistent, size-bounded checkpointer for the translation graph."""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from langgraph.checkpoint.base import CheckpointTuple, create_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from config import config
+from translate_graph.checkpoint_serializer import CompactSerializer
+from utils.logger import logger
+
+THREAD_ACTIVITY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_activity (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_thread_activity_updated_at
+ON thread_activity(updated_at);
+CREATE TABLE IF NOT EXISTS janitor_lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Only rebuild the file when at least this fraction of its pages are free
+VACUUM_FREE_PAGES_RATIO = 0.25
+
+# The janitor lease lasts this many maintenance intervals, so another worker
+# takes over if the one holding it stops renewing it
+JANITOR_LEASE_INTERVALS = 2
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SqliteSaver that expires idle conversations and caps checkpoints per thread.
+
+    Conversations that were not updated for ``ttl_seconds`` are deleted by a
+    background janitor, which also vacuums the file once enough pages are free.
+    Every worker starts a janitor, but only the one holding the lease stored in
+    the database runs the maintenance.
+    Every write keeps only the latest ``max_checkpoints_per_thread`` checkpoints
+    of the thread, so disk usage stays proportional to the active conversations.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        ttl_seconds: int,
+        max_checkpoints_per_thread: int,
+        serde=None,
+    ):
+        """Initialize the checkpointer.
+
+        Args:
+            conn: SQLite connection opened with check_same_thread=False.
+            ttl_seconds: Idle time after which a conversation is deleted.
+            max_checkpoints_per_thread: Number of checkpoints retained per thread.
+            serde: Optional serializer for checkpoints.
+        """
+        super().__init__(conn, serde=serde)
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints_per_thread = max(1, max_checkpoints_per_thread)
+        self._janitor: threading.Thread | None = None
+        self._janitor_stop = threading.Event()
+        self._janitor_id = f"{os.getpid()}-{uuid.uuid4()}"
+
+    def setup(self) -> None:
+        """Create the checkpoint tables and the thread activity table."""
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(THREAD_ACTIVITY_SCHEMA)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        """Save a checkpoint, record thread activity and prune older checkpoints."""
+        saved_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            self._prune_thread(cur, thread_id, checkpoint_ns)
+        return saved_config
+
+    def restore(self, saved: CheckpointTuple) -> None:
+        """Save a copy of a checkpoint as the latest of its thread.
+
+        Used to discard what an interrupted run wrote after the checkpoint. The
+        copy is made from the tuple itself, so it works even if the original
+        checkpoint was pruned in the meantime.
+        """
+        configurable = saved.config["configurable"]
+        parent_config = saved.parent_config or {
+            "configurable": {**configurable, "checkpoint_id": None}
+        }
+        step = saved.metadata.get("step", -1)
+        self.put(
+            parent_config,
+            create_checkpoint(saved.checkpoint, None, step),
+            {**saved.metadata, "source": "fork", "step": step + 1},
+            {},
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete all checkpoints, writes and activity of a thread."""
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),)
+            )
+
+    # SqliteSaver has no async API, run the sync methods in a worker thread so
+    # the event loop isn't blocked on disk I/O. The connection is shared under
+    # the saver's lock, which makes this safe.
+
+    async def aget_tuple(self, config):
+        """Get a checkpoint tuple asynchronously."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        """List checkpoints asynchronously."""
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        """Save a checkpoint asynchronously."""
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        """Save intermediate writes asynchronously."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Delete a thread asynchronously."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _prune_thread(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str):
+        """Keep only the latest checkpoints (and their writes) of a thread."""
+        # Checkpoint IDs are time-ordered UUIDs, so the highest IDs are the latest
+        cur.execute(
+            """
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?
+            """,
+            (thread_id, checkpoint_ns, self.max_checkpoints_per_thread),
+        )
+        stale_ids = [(thread_id, checkpoint_ns, row[0]) for row in cur.fetchall()]
+        if not stale_ids:
+            return
+
+        cur.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            stale_ids,
+        )
+        cur.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            stale_ids,
+        )
+
+    def delete_expired_threads(self) -> int:
+        """Delete conversations idle for longer than the TTL.
+
+        Returns:
+            Number of deleted threads.
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self.cursor() as cur:
+            cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,)
+            )
+            expired = [(row[0],) for row in cur.fetchall()]
+            cur.executemany("DELETE FROM checkpoints WHERE thread_id = ?", expired)
+            cur.executemany("DELETE FROM writes WHERE thread_id = ?", expired)
+            cur.executemany("DELETE FROM thread_activity WHERE thread_id = ?", expired)
+        return len(expired)
+
+    def vacuum(self) -> bool:
+        """Rebuild the database file when enough of it is free pages.
+
+        Returns:
+            True if the file was vacuumed.
+        """
+        with self.cursor() as cur:
+            page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+            if not page_count or free_pages / page_count < VACUUM_FREE_PAGES_RATIO:
+                return False
+            self.conn.commit()
+            cur.execute("VACUUM")
+        return True
+
+    def run_maintenance(self) -> None:
+        """Expire idle conversations and vacuum the file if needed."""
+        try:
+            deleted = self.delete_expired_threads()
+            vacuumed = self.vacuum()
+            logger.info(
+                f"Checkpoint maintenance: deleted {deleted} expired conversations. Vacuumed: {vacuumed}"
+            )
+        except Exception as e:
+            logger.error(f"Error running checkpoint maintenance: {e}")
+
+    def acquire_janitor_lease(self, interval_seconds: int) -> bool:
+        """Take or renew the lease of the janitor, so one worker runs the maintenance.
+
+        Returns:
+            True if this process holds the lease until the next interval.
+        """
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO janitor_lease (name, owner, expires_at) VALUES ('checkpoints', ?, ?)
+                ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE janitor_lease.owner = excluded.owner OR janitor_lease.expires_at < ?
+                """,
+                (
+                    self._janitor_id,
+                    now + interval_seconds * JANITOR_LEASE_INTERVALS,
+                    now,
+                ),
+            )
+            return cur.rowcount > 0
+
+    def start_janitor(self, interval_seconds: int) -> None:
+        """Run maintenance periodically in a daemon thread, while holding the lease."""
+        if self._janitor is not None:
+            return
+
+        def _loop():
+            while not self._janitor_stop.wait(interval_seconds):
+                try:
+                    if not self.acquire_janitor_lease(interval_seconds):
+                        continue
+                except Exception as e:
+                    logger.error(f"Error acquiring the checkpoint janitor lease: {e}")
+                    continue
+                self.run_maintenance()
+
+        self._janitor_stop.clear()
+        self._janitor = threading.Thread(
+            target=_loop, name="checkpoint-janitor", daemon=True
+        )
+        self._janitor.start()
+
+    def stop_janitor(self) -> None:
+        """Stop the maintenance thread."""
+        if self._janitor is None:
+            return
+        self._janitor_stop.set()
+        self._janitor.join()
+        self._janitor = None
+
+
+def create_checkpointer() -> BoundedSqliteSaver:
+    """Create the checkpointer configured for the translation graph."""
+    # Other workers may hold the write lock, wait for it instead of failing
+    conn = sqlite3.connect(
+        config.CHECKPOINT_DATABASE_PATH, check_same_thread=False, timeout=30
+    )
+    serde = CompactSerializer() if config.CHECKPOINT_SERIALIZER == "compact" else None
+    return BoundedSqliteSaver(
+        conn,
+        ttl_seconds=config.CHECKPOINT_TTL_SECONDS,
+        max_checkpoints_per_thread=config.MAX_CHECKPOINTS_PER_THREAD,
+        serde=serde,
+    )
@@ -0,0 +1,109 @@
+"""Check that a translation uses the glossary targets of the terms in its source.
+
+The source and the translation are split in sentences. When both have the same
+number of sentences they are aligned one to one, and every translated sentence
+must contain the target of each glossary term found in its source sentence.
+Sentences missing a target are reported so only they are repaired, instead of
+retranslating the whole text. Only exact source matches are checked, fuzzy
+ones are too likely to be a different word.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from translate_graph.match_words import GlossaryMatcher, matching_mode
+from translate_graph.segments import Segment, split_segments
+
+
+@dataclass
+class ComplianceViolation:
+    """A translated sentence missing the targets of some glossary terms."""
+
+    # Index of the sentence in the source and in the translation
+    segment: int
+    source_text: str
+    translation: str
+    # Glossary entries not applied: [{"term": ..., "target": ..., "note": ...}]
+    missing: List[Dict[str, str]]
+
+
+@dataclass
+class ComplianceReport:
+    """Result of the compliance check of a translation."""
+
+    # Whether the sentences of the source and the translation could be aligned
+    aligned: bool
+    # Glossary terms found in the source (exact matches)
+    expected: int
+    violations: List[ComplianceViolation] = field(default_factory=list)
+    translation_segments: List[Segment] = field(default_factory=list)
+
+    @property
+    def compliant(self) -> bool:
+        """Whether every expected glossary target was found."""
+        return self.aligned and not self.violations
+
+
+def check_compliance(
+    glossary: Dict[str, Dict[str, str]],
+    source_text: str,
+    translation: str,
+    source_language: str,
+    target_language: str,
+) -> ComplianceReport:
+    """Check the glossary targets of the terms of the source in the translation.
+
+    Args:
+        glossary: Glossary snapshot of the translation: {"term": {"target": ..., "note": ...}}
+        source_text: Text that was translated.
+        translation: Translation to check.
+        source_language: Language of the source, selects the matching mode.
+        target_language: Language of the translation, selects the matching mode.
+
+    Returns:
+        Report with the sentences of the translation missing glossary targets.
+    """
+    source_segments = split_segments(source_text)
+    translation_segments = split_segments(translation)
+    aligned = len(source_segments) == len(translation_segments)
+
+    source_matcher = GlossaryMatcher(glossary, mode=matching_mode(source_language))
+    expected: Dict[int, Dict[str, Dict[str, str]]] = {}
+    for index, segment in enumerate(source_segments):
+        for span in source_matcher.find_spans(segment.text):
+            if span.score >= 100:
+                expected.setdefault(index, {})[span.term] = glossary[span.term]
+    report = ComplianceReport(
+        aligned=aligned,
+        expected=sum(len(terms) for terms in expected.values()),
+        translation_segments=translation_segments,
+    )
+    if not aligned or not expected:
+        return report
+
+    targets = {
+        entry["target"]: entry
+        for terms in expected.values()
+        for entry in terms.values()
+    }
+    target_matcher = GlossaryMatcher(targets, mode=matching_mode(target_language))
+    for index, terms in expected.items():
+        found = {
+            span.term
+            for span in target_matcher.find_spans(translation_segments[index].text)
+        }
+        missing = [
+            {"term": term, "target": entry["target"], "note": entry.get("note", "")}
+            for term, entry in terms.items()
+            if entry["target"] not in found
+        ]
+        if missing:
+            report.violations.append(
+                ComplianceViolation(
+                    segment=index,
+                    source_text=source_segments[index].text,
+                    translation=translation_segments[index].text,
+                    missing=missing,
+                )
+            )
+    return report
@@ -0,0 +1,75 @@
+"""Translate the repeated sentences of a text only once.
+
+Documents such as manuals and release notes repeat the same sentences and
+headings many times. The text is split in segments, which are normalized
+(unicode form and whitespace) so copies that only differ in spacing are found,
+and each distinct segment is translated once. Its translation is then put back
+at every position where the segment appears, keeping the text between the
+segments (newlines, list markers...) as it is.
+"""
+
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from translate_graph.segments import Segment, replace_segments, split_segments
+
+
+def normalize_segment(text: str) -> str:
+    """Normalize a segment so copies differing only in unicode form or spacing are equal."""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+@dataclass
+class DeduplicationPlan:
+    """Segments of a text, the distinct ones and where each of them appears."""
+
+    segments: List[Segment]
+    # Distinct normalized segments, in the order they first appear
+    unique: List[str] = field(default_factory=list)
+    # Index in unique of each segment
+    positions: List[int] = field(default_factory=list)
+
+    @property
+    def ratio(self) -> float:
+        """Share of the segments that are copies of a previous one (0-1)."""
+        if not self.segments:
+            return 0.0
+        return 1 - len(self.unique) / len(self.segments)
+
+    def metadata(self) -> Dict[str, float]:
+        """Get the counts reported with the translation."""
+        return {
+            "segments": len(self.segments),
+            "unique_segments": len(self.unique),
+            "dedup_ratio": round(self.ratio, 3),
+        }
+
+    def fan_out(self, text: str, translations: List[str]) -> str:
+        """Put the translation of each distinct segment at every position it appears.
+
+        Args:
+            text: Text the segments were split from.
+            translations: Translation of each distinct segment, in the order of unique.
+        """
+        return replace_segments(
+            text,
+            self.segments,
+            {
+                index: translations[unique]
+                for index, unique in enumerate(self.positions)
+            },
+        )
+
+
+def plan_deduplication(text: str) -> DeduplicationPlan:
+    """Split a text in segments and find the distinct ones."""
+    plan = DeduplicationPlan(segments=split_segments(text))
+    indexes: Dict[str, int] = {}
+    for segment in plan.segments:
+        key = normalize_segment(segment.text)
+        if key not in indexes:
+            indexes[key] = len(plan.unique)
+            plan.unique.append(key)
+        plan.positions.append(indexes[key])
+    return plan
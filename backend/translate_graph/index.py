@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 from typing import Literal
 
 from langchain_core.messages import (
@@ -5,27 +7,66 @@ from langchain_core.messages import (
     HumanMessage,
     get_buffer_string,
 )
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.config import get_config
 from langgraph.graph import START, StateGraph
 from langgraph.types import Command, interrupt
 
+from config import config
 from database.rules_operations import RulesOperations
 from glossary import GlossaryManager
-from translate_graph.match_words import match_words_from_glossary
+from translate_graph.checkpointer import create_checkpointer
+from translate_graph.compliance import check_compliance
+from translate_graph.deduplication import DeduplicationPlan, plan_deduplication
+from translate_graph.masking import MaskedText, mask_text
+from translate_graph.match_words import (
+    GlossaryMatcher,
+    group_spans,
+    matching_mode,
+    score_glossary_matches,
+)
+from translate_graph.placeholders import has_placeholders
 from translate_graph.prompts import (
+    combined_refinement_instructions,
+    deduplicated_translation_instructions,
     first_translation_instructions,
+    placeholder_instructions,
+    repair_translation_instructions,
+    segment_refinement_improvements_task,
+    segment_refinement_instructions,
     translation_instructions,
     update_translation_instructions,
 )
+from translate_graph.rule_selector import rule_selector
+from translate_graph.segment_refinement import (
+    SegmentRefinementPlan,
+    plan_segment_refinement,
+)
+from translate_graph.segments import replace_segments
 from translate_graph.state import (
+    RefinementResult,
+    RepairResult,
+    SegmentRefinementResult,
+    SegmentTranslationResult,
     TranslateInputState,
     TranslateState,
 )
-from translate_graph.utils import format_glossary, format_rules
+from translate_graph.utils import (
+    format_glossary,
+    format_numbered_segments,
+    format_refinement_sentences,
+    format_repair_sentences,
+    format_rules,
+    refinement_tool_calls,
+    select_glossary_matches,
+)
+from utils.improvement_cache import improvement_cache
 from utils.llm_service import LLM_Service
 from utils.logger import logger
+from utils.singleflight import SingleFlight
+from utils.user_tracking_service import UserTrackingService
 
 llm = LLM_Service()
+translation_flight = SingleFlight()
 
 
 # UNCOMMENT WHEN RUNNING LANGGRAPH STUDIO LOCALLY
@@ -34,52 +75,420 @@ llm = LLM_Service()
 # initialize_database()
 
 
-def initial_translation(state: TranslateState) -> Command[Literal["wait_for_feedback"]]:
-    """Perform the initial translation using the glossary and rules to translate the text sent by the user."""
-    text_to_translate = state["messages"][-1].content
-    source_language = state["source_language"]
-    target_language = state["target_language"]
-    logger.info(
-        f"Translation Graph started. User Id: {state['user_id']}. Lang: {source_language} --> {target_language}. Text to translate: {text_to_translate}"
+def get_revisions(
+    user_id: str | None, source_language: str, target_language: str
+) -> tuple[str, str]:
+    """Get the current glossary and rules revisions of the user for the language pair."""
+    if not user_id:
+        return "", ""
+    return (
+        GlossaryManager().get_revision_for_user(
+            user_id, source_language, target_language
+        ),
+        RulesOperations().get_revision_for_user(
+            user_id, source_language, target_language
+        ),
     )
-    user_id = state["user_id"]
 
-    glossary_manager = GlossaryManager()
-    rules_manager = RulesOperations()
 
+def mask_non_translatable(text: str) -> MaskedText:
+    """Mask the tags, URLs, code and placeholders of a text, unless MASK_NON_TRANSLATABLE is off."""
+    if config.MASK_NON_TRANSLATABLE:
+        return mask_text(text)
+    return MaskedText(text)
+
+
+def load_snapshot(
+    user_id: str | None,
+    source_language: str,
+    target_language: str,
+    text: str,
+) -> dict:
+    """Load the most relevant glossary entries matched in the text and rules of the user.
+
+    The text is matched as given, callers pass it masked so terms inside URLs
+    or code are not picked up.
+    """
     glossary_data = {}
-    rules_data = {}
+    rules_data = []
 
     # Load current glossary for the specified language pair
     if user_id:
-        glossary_data = glossary_manager.get_all_sources_for_user(
+        glossary_data = GlossaryManager().get_all_sources_for_user(
             user_id, source_language, target_language
         )
-        rules_data = rules_manager.get_entries_for_user(
+        rules_data = rule_selector.select(
+            RulesOperations().get_entries_for_user(
+                user_id, source_language, target_language
+            ),
+            text,
+        )
+
+    return {
+        "glossary_snapshot": select_glossary_matches(
+            score_glossary_matches(
+                glossary_data, text, source_language=source_language
+            ),
+            config.GLOSSARY_TOKEN_BUDGET,
+        ),
+        "rules_snapshot": rules_data,
+    }
+
+
+def load_snapshots(
+    user_id: str | None,
+    source_language: str,
+    target_languages: list[str],
+    text: str,
+) -> dict[str, dict]:
+    """Load the snapshots and revisions of several target languages for the same text.
+
+    The glossaries, rules and revisions of all the targets are read with one
+    query each, and the text is scanned once with a matcher over the terms of
+    every glossary, instead of once per target.
+
+    Returns:
+        Dictionary mapping each target language to its snapshot and revisions,
+        ready to be passed as preloaded_snapshot in the input of the graph.
+    """
+    text = mask_non_translatable(text).text
+    if not user_id:
+        snapshot = load_snapshot(None, source_language, target_languages[0], text)
+        return {
+            target_language: {
+                **snapshot,
+                "glossary_revision": "",
+                "rules_revision": "",
+            }
+            for target_language in target_languages
+        }
+
+    # Revisions are read before loading so a concurrent edit triggers a reload on refine
+    glossary_manager = GlossaryManager()
+    rules_operations = RulesOperations()
+    glossary_revisions = glossary_manager.get_revisions_for_user_targets(
+        user_id, source_language, target_languages
+    )
+    rules_revisions = rules_operations.get_revisions_for_user_targets(
+        user_id, source_language, target_languages
+    )
+    glossaries = glossary_manager.get_all_sources_for_user_targets(
+        user_id, source_language, target_languages
+    )
+    rules = rules_operations.get_entries_for_user_targets(
+        user_id, source_language, target_languages
+    )
+
+    terms = {
+        term: entry
+        for glossary in glossaries.values()
+        for term, entry in glossary.items()
+    }
+    spans = GlossaryMatcher(terms, mode=matching_mode(source_language)).find_spans(text)
+
+    return {
+        target_language: {
+            "glossary_snapshot": select_glossary_matches(
+                group_spans(glossaries[target_language], spans),
+                config.GLOSSARY_TOKEN_BUDGET,
+            ),
+            "rules_snapshot": rule_selector.select(rules[target_language], text),
+            "glossary_revision": glossary_revisions[target_language],
+            "rules_revision": rules_revisions[target_language],
+        }
+        for target_language in target_languages
+    }
+
+
+class DocumentSnapshots:
+    """Snapshots of the segments of a document, from the glossary and rules loaded once."""
+
+    def __init__(self, user_id: str | None, source_language: str, target_language: str):
+        """Load the glossary, rules and revisions of the user for the language pair."""
+        self.glossary = {}
+        self.rules = []
+        # Revisions are read before loading so a concurrent edit triggers a reload on refine
+        self.glossary_revision, self.rules_revision = get_revisions(
             user_id, source_language, target_language
         )
+        if user_id:
+            self.glossary = GlossaryManager().get_all_sources_for_user(
+                user_id, source_language, target_language
+            )
+            self.rules = RulesOperations().get_entries_for_user(
+                user_id, source_language, target_language
+            )
+        self.matcher = GlossaryMatcher(
+            self.glossary, mode=matching_mode(source_language)
+        )
+
+    def snapshot(self, text: str) -> dict:
+        """Get the snapshot of a segment, to be passed as preloaded_snapshot."""
+        text = mask_non_translatable(text).text
+        return {
+            "glossary_snapshot": select_glossary_matches(
+                self.matcher.match(text),
+                config.GLOSSARY_TOKEN_BUDGET,
+            ),
+            "rules_snapshot": rule_selector.select(self.rules, text),
+            "glossary_revision": self.glossary_revision,
+            "rules_revision": self.rules_revision,
+        }
+
+
+def refresh_snapshot(state: TranslateState) -> dict:
+    """Reuse the conversation snapshot, reloading it only if the glossary or rules changed."""
+    glossary_revision, rules_revision = get_revisions(
+        state["user_id"], state["source_language"], state["target_language"]
+    )
+    if (
+        "glossary_snapshot" in state
+        and state.get("glossary_revision") == glossary_revision
+        and state.get("rules_revision") == rules_revision
+    ):
+        return {
+            "glossary_snapshot": state["glossary_snapshot"],
+            "rules_snapshot": state["rules_snapshot"],
+            "glossary_revision": glossary_revision,
+            "rules_revision": rules_revision,
+        }
+
+    logger.info(f"Reloading glossary and rules snapshot. User Id: {state['user_id']}")
+    snapshot = load_snapshot(
+        state["user_id"],
+        state["source_language"],
+        state["target_language"],
+        mask_non_translatable(state["original_text"]).text,
+    )
+    return {
+        **snapshot,
+        "glossary_revision": glossary_revision,
+        "rules_revision": rules_revision,
+    }
+
+
+async def enforce_glossary(
+    snapshot: dict,
+    source_text: str,
+    translation: str,
+    source_language: str,
+    target_language: str,
+) -> str:
+    """Check that the translation uses the glossary and repair the sentences that don't.
+
+    Only the sentences missing glossary targets are sent back to the model, the
+    rest of the translation is kept as is. Repairs only run with GLOSSARY_REPAIR.
+    """
+    report = await asyncio.to_thread(
+        check_compliance,
+        snapshot["glossary_snapshot"],
+        source_text,
+        translation,
+        source_language,
+        target_language,
+    )
+    if not report.expected:
+        return translation
+    if not report.aligned:
+        logger.info(
+            "Glossary compliance not checked, source and translation sentences don't align"
+        )
+        return translation
+    logger.info(
+        f"Glossary compliance: {len(report.violations)}/{len(report.translation_segments)} "
+        f"sentences missing glossary terms ({report.expected} terms expected)"
+    )
+    if report.compliant or not config.GLOSSARY_REPAIR:
+        return translation
+
+    prompt = repair_translation_instructions.format(
+        source_language=source_language,
+        target_language=target_language,
+        sentences=format_repair_sentences(report.violations),
+        rules=format_rules(snapshot["rules_snapshot"]),
+    )
+    result = await llm.ainvoke_structured(
+        prompt,
+        RepairResult,
+        source_text="\n".join(violation.source_text for violation in report.violations),
+        language_pair=f"{source_language}-{target_language}",
+    )
+    replacements = {
+        report.violations[sentence.number - 1].segment: sentence.translation.strip()
+        for sentence in result.sentences
+        if 0 < sentence.number <= len(report.violations)
+        and sentence.translation.strip()
+    }
+    logger.info(f"Repaired {len(replacements)} sentences to apply the glossary")
+    return replace_segments(translation, report.translation_segments, replacements)
 
-    found_glossary_words = match_words_from_glossary(glossary_data, text_to_translate)
 
-    prompt = first_translation_instructions.format(
-        text_to_translate=text_to_translate,
+async def translate_unique_segments(
+    plan: DeduplicationPlan,
+    text: str,
+    instructions: str,
+    source_language: str,
+    target_language: str,
+) -> str | None:
+    """Translate each distinct segment of the text once and put them back at every position.
+
+    Returns:
+        The translation, or None if the model didn't return every segment.
+    """
+    logger.info(
+        f"Translating {len(plan.unique)}/{len(plan.segments)} distinct segments"
+    )
+    prompt = deduplicated_translation_instructions.format(
         source_language=source_language,
         target_language=target_language,
-        translation_instructions=translation_instructions.format(
+        segments=format_numbered_segments(plan.unique),
+        translation_instructions=instructions,
+    )
+    result = await llm.ainvoke_structured(
+        prompt,
+        SegmentTranslationResult,
+        source_text=text,
+        language_pair=f"{source_language}-{target_language}",
+    )
+    translations = {
+        sentence.number: sentence.translation.strip()
+        for sentence in result.sentences
+        if sentence.translation.strip()
+    }
+    missing = len(plan.unique) - sum(
+        number in translations for number in range(1, len(plan.unique) + 1)
+    )
+    if missing:
+        logger.info(
+            f"Translating the whole text, {missing} segments missing from the response"
+        )
+        return None
+    return plan.fan_out(
+        text, [translations[number] for number in range(1, len(plan.unique) + 1)]
+    )
+
+
+async def initial_translation(
+    state: TranslateState,
+) -> Command[Literal["wait_for_feedback"]]:
+    """Perform the initial translation using the glossary and rules to translate the text sent by the user."""
+    text_to_translate = state["messages"][-1].content
+    source_language = state["source_language"]
+    target_language = state["target_language"]
+    logger.info(
+        f"Translation Graph started. User Id: {state['user_id']}. Lang: {source_language} --> {target_language}. Text to translate: {text_to_translate}"
+    )
+    user_id = state["user_id"]
+
+    preloaded = state.get("preloaded_snapshot")
+    if preloaded:
+        glossary_revision = preloaded["glossary_revision"]
+        rules_revision = preloaded["rules_revision"]
+    else:
+        # Revisions are read before loading so a concurrent edit triggers a reload on refine
+        glossary_revision, rules_revision = await asyncio.to_thread(
+            get_revisions, user_id, source_language, target_language
+        )
+
+    # Tags, URLs, code and placeholders are sent as ⟦n⟧ and put back after
+    masked = await asyncio.to_thread(mask_non_translatable, text_to_translate)
+    source_text = masked.text
+    if masked.codes:
+        logger.info(
+            f"Masked {len(masked.codes)} non-translatable spans ({len(text_to_translate)} -> {len(source_text)} chars)"
+        )
+
+    # Repeated sentences are translated once when enough of the text repeats
+    plan = await asyncio.to_thread(plan_deduplication, source_text)
+    deduplicate = (
+        config.SEGMENT_DEDUPLICATION and plan.ratio >= config.DEDUPLICATION_MIN_RATIO
+    )
+
+    async def translate() -> tuple[dict, str, bool]:
+        if preloaded:
+            snapshot = {
+                "glossary_snapshot": preloaded["glossary_snapshot"],
+                "rules_snapshot": preloaded["rules_snapshot"],
+            }
+        else:
+            snapshot = await asyncio.to_thread(
+                load_snapshot,
+                user_id,
+                source_language,
+                target_language,
+                source_text,
+            )
+        instructions = translation_instructions.format(
             source_language=source_language,
             target_language=target_language,
-            glossary=format_glossary(found_glossary_words),
-            rules=format_rules(rules_data),
-        ),
+            glossary=format_glossary(snapshot["glossary_snapshot"]),
+            rules=format_rules(snapshot["rules_snapshot"]),
+        )
+        if has_placeholders(source_text):
+            instructions += placeholder_instructions
+        translation = None
+        if deduplicate:
+            translation = await translate_unique_segments(
+                plan, source_text, instructions, source_language, target_language
+            )
+        deduplicated = translation is not None
+        if not deduplicated:
+            prompt = first_translation_instructions.format(
+                text_to_translate=source_text,
+                source_language=source_language,
+                target_language=target_language,
+                translation_instructions=instructions,
+            )
+            response = await llm.ainvoke(
+                prompt,
+                source_text=source_text,
+                language_pair=f"{source_language}-{target_language}",
+            )
+            translation = response.content
+        translation = await enforce_glossary(
+            snapshot,
+            source_text,
+            translation,
+            source_language,
+            target_language,
+        )
+        return snapshot, masked.restore(translation), deduplicated
+
+    # Identical requests in flight (same account, text, pair and revisions) share one
+    # LLM call. The call is charged to the first caller only, so anonymous requests
+    # are only shared within the same IP address.
+    flight_key = hashlib.sha256(
+        "\x00".join(
+            [
+                UserTrackingService().get_usage_owner(),
+                source_language,
+                target_language,
+                glossary_revision,
+                rules_revision,
+                text_to_translate,
+            ]
+        ).encode()
+    ).hexdigest()
+    (snapshot, translation, deduplicated), shared = await translation_flight.do(
+        flight_key, translate
     )
-    response = llm.invoke(prompt)
+    if shared:
+        logger.info(
+            f"Reused in-flight translation. User Id: {user_id}. Lang: {source_language} --> {target_language}"
+        )
 
     return Command(
         goto="wait_for_feedback",
         update={
-            "messages": [AIMessage(content=response.content)],
+            "messages": [AIMessage(content=translation)],
             "original_text": text_to_translate,
             "test": "initial trans",
+            **snapshot,
+            "glossary_revision": glossary_revision,
+            "rules_revision": rules_revision,
+            "deduplication": {**plan.metadata(), "deduplicated": deduplicated},
+            # Consumed, a later translation in the conversation loads its own
+            "preloaded_snapshot": None,
         },
     )
 
@@ -98,7 +507,52 @@ def wait_for_feedback(
     )
 
 
-def refine_translation(
+async def refine_segments(
+    plan: SegmentRefinementPlan,
+    translation: str,
+    feedback: str,
+    instructions: str,
+    source_language: str,
+    target_language: str,
+) -> str:
+    """Rewrite only the sentences of the translation the feedback is about."""
+    prompt = segment_refinement_instructions.format(
+        feedback=feedback,
+        source_language=source_language,
+        target_language=target_language,
+        sentences=format_refinement_sentences(
+            plan.source_segments, plan.translation_segments, plan.affected
+        ),
+        translation_instructions=instructions,
+        improvements_task=segment_refinement_improvements_task
+        if config.COMBINED_REFINEMENT
+        else "",
+    )
+    result = await llm.ainvoke_structured(
+        prompt,
+        SegmentRefinementResult,
+        source_text="\n".join(plan.source_segments[i].text for i in plan.affected),
+        language_pair=f"{source_language}-{target_language}",
+    )
+    if config.COMBINED_REFINEMENT:
+        tool_calls = refinement_tool_calls(result)
+        logger.info(f"Glossary updates: {tool_calls}")
+        if tool_calls:
+            thread_id = get_config()["configurable"]["thread_id"]
+            await asyncio.to_thread(improvement_cache.add_calls, thread_id, tool_calls)
+
+    replacements = {
+        plan.affected[sentence.number - 1]: sentence.translation.strip()
+        for sentence in result.sentences
+        if 0 < sentence.number <= len(plan.affected) and sentence.translation.strip()
+    }
+    logger.info(
+        f"Refined {len(replacements)}/{len(plan.translation_segments)} sentences"
+    )
+    return replace_segments(translation, plan.translation_segments, replacements)
+
+
+async def refine_translation(
     state: TranslateState,
 ) -> Command[Literal["wait_for_feedback"]]:
     """Refine the translation using the user feedback."""
@@ -110,23 +564,74 @@ def refine_translation(
         f"Refine Translation Graph started. User Id: {state['user_id']}. Lang: {source_language} --> {target_language}. Text to refine: {[message.content for message in last_two_messages]}"
     )
 
-    prompt = update_translation_instructions.format(
-        messages=get_buffer_string(last_two_messages),
+    snapshot = await asyncio.to_thread(refresh_snapshot, state)
+    instructions = translation_instructions.format(
         source_language=source_language,
         target_language=target_language,
-        translation_instructions=translation_instructions.format(
+        glossary=format_glossary(snapshot["glossary_snapshot"]),
+        rules=format_rules(snapshot["rules_snapshot"]),
+    )
+
+    plan = None
+    if config.SEGMENT_REFINEMENT:
+        plan = await asyncio.to_thread(
+            plan_segment_refinement,
+            state["original_text"],
+            last_two_messages[0].content,
+            last_two_messages[1].content,
+            source_language,
+            target_language,
+        )
+
+    if plan:
+        translation = await refine_segments(
+            plan,
+            last_two_messages[0].content,
+            last_two_messages[1].content,
+            instructions,
+            source_language,
+            target_language,
+        )
+    elif config.COMBINED_REFINEMENT:
+        # One structured call returns the translation and the improvement suggestions
+        prompt = combined_refinement_instructions.format(
+            messages=get_buffer_string(last_two_messages),
+            original_text=state["original_text"],
             source_language=source_language,
             target_language=target_language,
-            glossary={},
-            rules={},
-        ),
-    )
-    response = llm.invoke(prompt)
+            translation_instructions=instructions,
+        )
+        result = await llm.ainvoke_structured(
+            prompt,
+            RefinementResult,
+            source_text=state["original_text"],
+            language_pair=f"{source_language}-{target_language}",
+        )
+        tool_calls = refinement_tool_calls(result)
+        logger.info(f"Glossary updates: {tool_calls}")
+        if tool_calls:
+            thread_id = get_config()["configurable"]["thread_id"]
+            await asyncio.to_thread(improvement_cache.add_calls, thread_id, tool_calls)
+        translation = result.translation
+    else:
+        prompt = update_translation_instructions.format(
+            messages=get_buffer_string(last_two_messages),
+            source_language=source_language,
+            target_language=target_language,
+            translation_instructions=instructions,
+        )
+        response = await llm.ainvoke(
+            prompt,
+            source_text=state["original_text"],
+            language_pair=f"{source_language}-{target_language}",
+        )
+        translation = response.content
 
     return Command(
         goto="wait_for_feedback",
         update={
-            "messages": [AIMessage(content=response.content)],
+            "messages": [AIMessage(content=translation)],
+            **snapshot,
         },
     )
 
@@ -139,6 +644,6 @@ graph.add_node("refine_translation", refine_translation)
 
 graph.add_edge(START, "initial_translation")
 
-checkpointer = MemorySaver()
+checkpointer = create_checkpointer()
 graph = graph.compile(checkpointer=checkpointer)  ## use without langgraph stdio
 # graph = graph.compile()  ##  use with langgraph studio
@@ -0,0 +1,78 @@
+"""Mask the parts of a text that must not be translated before it's sent to the model.
+
+HTML tags, URLs, email addresses, code, and ICU, printf or template
+placeholders are replaced by numbered placeholders (⟦1⟧), adjacent ones by a
+single placeholder. The model can't mangle what it doesn't see, and long URLs
+or tags cost a few tokens instead of dozens. The masked text is also the one
+the glossary is matched on, so terms inside URLs or code are not picked up.
+The original spans are put back in the translation, which is checked to have
+every placeholder exactly once.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from translate_graph.placeholders import (
+    PLACEHOLDER_PATTERN,
+    placeholder,
+    restore_placeholders,
+)
+
+MASK_PATTERN = re.compile(
+    "|".join(
+        [
+            # Placeholders already in the text (e.g. from a document)
+            PLACEHOLDER_PATTERN.pattern,
+            # Code blocks and code spans
+            r"(?s:```.*?```)",
+            r"`[^`\n]+`",
+            # HTML comments and tags
+            r"(?s:<!--.*?-->)",
+            r"</?[a-zA-Z][\w:-]*(?:\s[^<>]*)?/?>",
+            # URLs and email addresses, without the punctuation ending the sentence
+            r"\b(?:https?://|www\.)[^\s<>\"']*[^\s<>\"'.,;:!?)\]]",
+            r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b",
+            # Template ({{ name }}, ${name}), ICU ({count, number}) and brace ({0}) placeholders
+            r"\{\{[^{}]*\}\}",
+            r"\$\{[^{}]*\}",
+            r"\{\s*\w+\s*(?:,\s*\w+\s*(?:,[^{}]*)?)?\}",
+            # printf specifiers (%s, %1$d, %(name)s)
+            r"%(?:\(\w+\)|\d+\$)?[-+#0]*\d*(?:\.\d+)?[sdifgxXeEc]\b",
+        ]
+    )
+)
+
+
+@dataclass
+class MaskedText:
+    """A text with its non-translatable spans replaced by placeholders."""
+
+    text: str
+    # Original span of each placeholder, ⟦1⟧ being the first
+    codes: List[str] = field(default_factory=list)
+
+    def restore(self, translation: str) -> str:
+        """Put the masked spans back in the translation of the masked text."""
+        if not self.codes:
+            return translation
+        return restore_placeholders(translation, self.codes)
+
+
+def mask_text(text: str) -> MaskedText:
+    """Replace the non-translatable spans of a text by placeholders."""
+    pieces = []
+    codes = []
+    position = 0
+    for match in MASK_PATTERN.finditer(text):
+        if codes and match.start() == position:
+            # Adjacent spans share one placeholder
+            codes[-1] += match.group()
+        else:
+            pieces.append(text[position : match.start()])
+            codes.append(match.group())
+            pieces.append(placeholder(len(codes)))
+        position = match.end()
+    pieces.append(text[position:])
+
+    return MaskedText(text="".join(pieces), codes=codes)
@@ -1,6 +1,328 @@
 import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+from config import config
+
+WORD_PATTERN = re.compile(r"\b[\w-]+\b")
+
+WORDS_MODE = "words"
+CHARACTERS_MODE = "characters"
+
+# Length of the character n-grams indexed in characters mode
+NGRAM_SIZE = 2
+
+
+def matching_mode(source_language: str | None) -> str:
+    """Get the matching mode of a source language.
+
+    Scripts written without spaces between words (Chinese, Japanese, Thai...)
+    can't be split in words, their terms are located with a character n-gram
+    index instead.
+    """
+    language = (source_language or "").lower().split("-")[0]
+    if language in config.CHARACTER_MATCHING_LANGUAGES:
+        return CHARACTERS_MODE
+    return WORDS_MODE
+
+
+def _lower_chars(text: str) -> str:
+    """Lowercase a text keeping its length, so offsets stay valid."""
+    return "".join(
+        lowered if len(lowered := char.lower()) == 1 else char for char in text
+    )
+
+
+def _is_latin_alnum(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in "_-"
+
+
+@dataclass
+class GlossarySpan:
+    """An occurrence of a glossary term in a text."""
+
+    # Character offsets of the occurrence in the text, end excluded
+    start: int
+    end: int
+    text: str
+    term: str
+    target: str
+    # Similarity between the occurrence and the term (0-100)
+    score: float
+    entry_id: int | None = None
+
+
+@dataclass
+class GlossaryMatch:
+    """A glossary term found in a text."""
+
+    term: str
+    # Term for single words, text of the first matching window for phrases
+    found_text: str
+    # Glossary data of the term: {"id": ..., "target": ..., "note": ...}
+    entry: Dict[str, str]
+    # Best similarity of the occurrences (0-100)
+    score: float
+    # Occurrences in the text above the threshold
+    count: int
+
+    @property
+    def exact(self) -> bool:
+        """Whether at least one occurrence matches the term exactly."""
+        return self.score >= 100
+
+
+class GlossaryMatcher:
+    """Glossary compiled for matching, reusable across texts."""
+
+    def __init__(self, glossary, threshold=80, mode=WORDS_MODE):
+        """Compile the glossary.
+
+        Args:
+            glossary: dict like {"registrar": {"id": 1, "target": "secretario/a", "note": ""}}
+            threshold: similarity threshold (0-100)
+            mode: "words" to compare terms with windows of words, "characters" to
+                locate them with a character n-gram index. See matching_mode().
+        """
+        self.glossary = glossary
+        self.threshold = threshold
+        self.mode = mode
+        if mode == CHARACTERS_MODE:
+            self._compile_ngrams()
+            return
+
+        # Terms grouped by number of words, normalised like the text windows
+        self._terms_by_length: Dict[int, List[str]] = defaultdict(list)
+        self._normalised: Dict[int, List[str]] = defaultdict(list)
+        for term in glossary:
+            words = term.lower().split()
+            if words:
+                self._terms_by_length[len(words)].append(term)
+                self._normalised[len(words)].append(" ".join(words))
+
+    def _compile_ngrams(self) -> None:
+        """Index the terms by their character n-grams."""
+        self._terms = [term for term in self.glossary if term.strip()]
+        self._keys = [_lower_chars(term.strip()) for term in self._terms]
+        # n-gram -> (term index, offset of the n-gram in the term)
+        self._ngrams: Dict[str, List[tuple[int, int]]] = defaultdict(list)
+        for index, key in enumerate(self._keys):
+            size = min(NGRAM_SIZE, len(key))
+            for offset in range(len(key) - size + 1):
+                self._ngrams[key[offset : offset + size]].append((index, offset))
+        self._ngram_sizes = {min(NGRAM_SIZE, len(key)) for key in self._keys}
+
+    def context_window(self, text: str, start: int, end: int) -> tuple[int, int]:
+        """Get the range of the text covering every occurrence that may overlap [start, end).
+
+        Rescanning this range is enough to update the matches after [start, end)
+        changed: by words, it extends as many words as the longest term on each
+        side; by characters, as many characters as the longest fuzzy occurrence.
+        """
+        if self.mode == CHARACTERS_MODE:
+            longest = max((len(key) for key in self._keys), default=0)
+            reach = longest + int(longest * (100 - self.threshold) / 100)
+            return max(0, start - reach), min(len(text), end + reach)
+
+        words = max(self._terms_by_length, default=0)
+        # Start and end inside a word: extend to the whole word first
+        while start > 0 and _is_word_char(text[start - 1]):
+            start -= 1
+        while end < len(text) and _is_word_char(text[end]):
+            end += 1
+        for _ in range(words):
+            while start > 0 and not _is_word_char(text[start - 1]):
+                start -= 1
+            while start > 0 and _is_word_char(text[start - 1]):
+                start -= 1
+            while end < len(text) and not _is_word_char(text[end]):
+                end += 1
+            while end < len(text) and _is_word_char(text[end]):
+                end += 1
+        return start, end
+
+    def find_spans(self, text: str) -> List[GlossarySpan]:
+        """Find every occurrence of the glossary terms in one pass over the text.
+
+        Returns:
+            Occurrences sorted by offset, then by term.
+        """
+        if self.mode == CHARACTERS_MODE:
+            spans = self._find_character_spans(text)
+        else:
+            spans = self._find_word_spans(text)
+        spans.sort(key=lambda span: (span.start, span.end, span.term))
+        return spans
+
+    def _span(
+        self, text: str, start: int, end: int, term: str, score: float
+    ) -> GlossarySpan:
+        entry = self.glossary[term]
+        # Plain {"term": "target"} glossaries are accepted too
+        if not isinstance(entry, dict):
+            entry = {"target": entry}
+        return GlossarySpan(
+            start=start,
+            end=end,
+            text=text[start:end],
+            term=term,
+            target=entry["target"],
+            score=score,
+            entry_id=entry.get("id"),
+        )
+
+    def _find_word_spans(self, text: str) -> List[GlossarySpan]:
+        """Compare the terms of each length with every window of as many words."""
+        words = list(WORD_PATTERN.finditer(text))
+        lowered = [word.group().lower() for word in words]
+        spans = []
+
+        for i in range(len(words)):
+            for length, terms in self._terms_by_length.items():
+                if i + length > len(words):
+                    continue
+                window = " ".join(lowered[i : i + length])
+                hits = process.extract(
+                    window,
+                    self._normalised[length],
+                    scorer=fuzz.ratio,
+                    score_cutoff=self.threshold,
+                    limit=None,
+                )
+                start, end = words[i].start(), words[i + length - 1].end()
+                spans.extend(
+                    self._span(text, start, end, terms[index], score)
+                    for _, score, index in hits
+                )
+        return spans
+
+    def _find_character_spans(self, text: str) -> List[GlossarySpan]:
+        """Locate candidate occurrences with the n-gram index, then verify them.
+
+        Every n-gram of the text votes for the start offsets where the terms
+        containing it would begin. Only the offsets with enough votes to reach
+        the threshold are compared with the term, so the cost depends on the
+        text length and the n-grams shared with it, not the glossary size.
+        """
+        lowered = _lower_chars(text)
+        votes: Counter[tuple[int, int]] = Counter()
+        for size in self._ngram_sizes:
+            for i in range(len(lowered) - size + 1):
+                for index, offset in self._ngrams.get(lowered[i : i + size], ()):
+                    votes[(index, i - offset)] += 1
+
+        candidates: Dict[int, List[tuple[float, int, int]]] = defaultdict(list)
+        for (index, start), count in votes.items():
+            key = self._keys[index]
+            size = min(NGRAM_SIZE, len(key))
+            # Each edit removes at most `size` of the n-grams of the term
+            edits = int(len(key) * (100 - self.threshold) / 100)
+            if count < max(1, len(key) - size + 1 - size * edits):
+                continue
+
+            best = None
+            for length in range(max(1, len(key) - edits), len(key) + edits + 1):
+                begin, end = max(0, start), max(0, start) + length
+                if end > len(lowered):
+                    break
+                # Latin terms inside CJK text must not match part of a word
+                if (
+                    _is_latin_alnum(key[0])
+                    and begin
+                    and _is_latin_alnum(lowered[begin - 1])
+                ):
+                    continue
+                if (
+                    _is_latin_alnum(key[-1])
+                    and end < len(lowered)
+                    and _is_latin_alnum(lowered[end])
+                ):
+                    continue
+                score = fuzz.ratio(key, lowered[begin:end])
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, begin, end)
+            if best:
+                candidates[index].append(best)
+
+        spans = []
+        for index, found in candidates.items():
+            # Neighbouring offsets verify the same occurrence, keep the best one
+            taken: List[tuple[int, int]] = []
+            for score, begin, end in sorted(found, key=lambda c: (-c[0], c[1])):
+                if all(end <= other[0] or begin >= other[1] for other in taken):
+                    taken.append((begin, end))
+                    spans.append(
+                        self._span(text, begin, end, self._terms[index], score)
+                    )
+        return spans
+
+    def match(self, text: str) -> List[GlossaryMatch]:
+        """Group the occurrences of each term, in the order of the glossary."""
+        return group_spans(self.glossary, self.find_spans(text))
+
+
+def group_spans(glossary, spans: List[GlossarySpan]) -> List[GlossaryMatch]:
+    """Group the occurrences of the terms of a glossary, in the order of the glossary.
+
+    Spans of terms not in the glossary are ignored, so the spans found by a
+    matcher compiled over several glossaries can be split between them.
+    """
+    spans_by_term: Dict[str, List[GlossarySpan]] = defaultdict(list)
+    for span in spans:
+        spans_by_term[span.term].append(span)
+
+    matches = []
+    for term, entry in glossary.items():
+        term_spans = spans_by_term.get(term)
+        if not term_spans:
+            continue
+        matches.append(
+            GlossaryMatch(
+                term=term,
+                found_text=term
+                if len(term.split()) == 1
+                else term_spans[0].text.lower(),
+                entry=entry,
+                score=max(span.score for span in term_spans),
+                count=len(term_spans),
+            )
+        )
+    return matches
+
+
+def find_glossary_spans(
+    glossary, text, threshold=80, source_language=None
+) -> List[GlossarySpan]:
+    """Find every occurrence of the glossary terms in the text, with offsets and scores."""
+    return GlossaryMatcher(
+        glossary, threshold, matching_mode(source_language)
+    ).find_spans(text)
+
+
+def score_glossary_matches(
+    glossary, text, threshold=80, source_language=None
+) -> List[GlossaryMatch]:
+    """Fuzzy matching for single words AND multi-word phrases, with scores and occurrence counts.
+
+    Args:
+        glossary: dict like {"registrar": {"id": 1, "target": "secretario/a", "note": ""}}
+        text: text to search in
+        threshold: similarity threshold (0-100)
+        source_language: language of the text, selects the matching mode
+
+    Returns:
+        Matches in the order of the glossary.
+    """
+    return GlossaryMatcher(glossary, threshold, matching_mode(source_language)).match(
+        text
+    )
 
 
 def match_words_from_glossary(glossary, text, threshold=80):
@@ -14,32 +336,7 @@ def match_words_from_glossary(glossary, text, threshold=80):
     Returns:
         dict of matches: {"found_text": "correct_form"}
     """
-    matches = {}
-    text_lower = text.lower()
-
-    # Check each glossary term
-    for term, correct_form in glossary.items():
-        term_words = term.split()
-
-        if len(term_words) == 1:
-            # Single word matching
-            words = re.findall(r"\b[\w-]+\b", text_lower)
-            for word in words:
-                similarity = fuzz.ratio(term.lower(), word)
-                if similarity >= threshold:
-                    matches[term] = correct_form
-                    break  # Only match once per term
-        else:
-            # Multi-word phrase matching using sliding window
-            text_words = text_lower.split()
-            window_size = len(term_words)
-
-            for i in range(len(text_words) - window_size + 1):
-                window = " ".join(text_words[i : i + window_size])
-                similarity = fuzz.ratio(term.lower(), window)
-
-                if similarity >= threshold:
-                    matches[window] = correct_form
-                    break  # Only match once per term
-
-    return matches
+    return {
+        match.found_text: match.entry
+        for match in score_glossary_matches(glossary, text, threshold)
+    }
@@ -0,0 +1,599 @@
+"""Incremental glossary matching of a text being edited.
+
+A session keeps the text, its glossary occurrences and the glossary revision.
+Each edit (offset, characters deleted, text inserted) only rescans the range
+of the text the edit can affect and returns the occurrences added and removed,
+so live typing doesn't rematch the whole document on every keystroke.
+
+Compiled matchers are shared between the sessions of a user and language pair
+while the glossary revision doesn't change. They are compiled by each worker
+from the glossary revision, while the sessions themselves (text, occurrences
+and version) are kept in memory, or in the shared runtime-state database when
+several workers serve the edits. Sessions expire after a TTL and the least
+recently used ones are evicted above a maximum count.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import config
+from translate_graph.match_words import GlossaryMatcher, GlossarySpan, matching_mode
+from utils.logger import logger
+from utils.state_store import StateStore
+
+# Compiled matchers kept for reuse (one per user, language pair and glossary revision)
+MAX_CACHED_MATCHERS = 64
+
+
+def _key(span: GlossarySpan) -> tuple:
+    return (span.start, span.end, span.term, span.score)
+
+
+class VersionConflictError(Exception):
+    """An edit was made on a version of the text the session has moved past."""
+
+    def __init__(self, version: int):
+        """Initialize the error with the current version of the session."""
+        super().__init__(f"Matching session is at version {version}")
+        self.version = version
+
+
+@dataclass
+class MatchDelta:
+    """Occurrences changed by an edit.
+
+    Removed occurrences are given in the offsets of the text before the edit,
+    added ones in the offsets of the text after it. Occurrences after the edit
+    that didn't change are not reported, they move by the length difference.
+    """
+
+    version: int
+    added: List[GlossarySpan] = field(default_factory=list)
+    removed: List[GlossarySpan] = field(default_factory=list)
+
+
+@dataclass
+class MatchingSession:
+    """Text being edited and its glossary occurrences."""
+
+    session_id: str
+    user_id: str
+    source_language: str
+    target_language: str
+    text: str
+    revision: str
+    spans: List[GlossarySpan] = field(default_factory=list)
+    version: int = 0
+    expires_at: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def apply_edit(
+        self,
+        offset: int,
+        deleted: int,
+        inserted: str,
+        matcher: GlossaryMatcher,
+        revision: str,
+        version: int | None = None,
+    ) -> MatchDelta:
+        """Apply an edit to the text and rescan the range it affects.
+
+        Args:
+            offset: Position of the edit in the current text.
+            deleted: Characters removed from the offset.
+            inserted: Text inserted at the offset.
+            matcher: Matcher of the current glossary revision.
+            revision: Current glossary revision. If it's not the revision of the
+                session, the whole text is matched again.
+            version: Version of the text the edit was made on, if known.
+
+        Raises:
+            VersionConflictError: If the session is not at the given version.
+            ValueError: If the edit is outside the text.
+        """
+        if version is not None and version != self.version:
+            raise VersionConflictError(self.version)
+        if offset < 0 or deleted < 0 or offset + deleted > len(self.text):
+            raise ValueError(
+                f"Edit ({offset}, {deleted}) is outside the text of length {len(self.text)}"
+            )
+
+        text = self.text[:offset] + inserted + self.text[offset + deleted :]
+        self.version += 1
+        if revision != self.revision:
+            removed = self.spans
+            self.text, self.revision = text, revision
+            self.spans = matcher.find_spans(text)
+            return MatchDelta(version=self.version, added=self.spans, removed=removed)
+
+        shift = len(inserted) - deleted
+        start, end = matcher.context_window(text, offset, offset + len(inserted))
+        # Same range in the offsets of the previous text
+        old_end = end - shift
+
+        # Occurrences crossing the range are rescanned whole
+        while True:
+            affected = [
+                span
+                for span in self.spans
+                if span.start <= old_end and span.end >= start
+            ]
+            grown_start = min([start] + [span.start for span in affected])
+            grown_end = max([old_end] + [span.end for span in affected])
+            if (grown_start, grown_end) == (start, old_end):
+                break
+            start, old_end = grown_start, grown_end
+        end = old_end + shift
+
+        rescanned = [
+            GlossarySpan(
+                start=span.start + start,
+                end=span.end + start,
+                text=span.text,
+                term=span.term,
+                target=span.target,
+                score=span.score,
+                entry_id=span.entry_id,
+            )
+            for span in matcher.find_spans(text[start:end])
+        ]
+        kept = []
+        for span in self.spans:
+            if span.end < start:
+                kept.append(span)
+            elif span.start > old_end:
+                span.start += shift
+                span.end += shift
+                kept.append(span)
+
+        # Occurrences outside the edit are found again, they are not a change
+        moved = {}
+        for span in affected:
+            if span.end <= offset:
+                moved[_key(span)] = span
+            elif span.start >= offset + deleted:
+                shifted = (span.start + shift, span.end + shift, span.term, span.score)
+                moved[shifted] = span
+        found = {_key(span) for span in rescanned}
+        unchanged = {id(span) for key, span in moved.items() if key in found}
+
+        self.text = text
+        self.spans = sorted(
+            kept + rescanned, key=lambda span: (span.start, span.end, span.term)
+        )
+        return MatchDelta(
+            version=self.version,
+            added=[span for span in rescanned if _key(span) not in moved],
+            removed=[span for span in affected if id(span) not in unchanged],
+        )
+
+
+class MatcherCache:
+    """Compiled matchers of the glossary revisions, local to the worker process."""
+
+    def __init__(self):
+        """Initialize the empty cache."""
+        self._matchers: OrderedDict[tuple, GlossaryMatcher] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        revision: str,
+        load_glossary: Callable[[], Dict[str, Dict[str, Any]]],
+    ) -> GlossaryMatcher:
+        """Get the compiled matcher of a glossary revision, compiling it if needed."""
+        key = (user_id, source_language, target_language, revision)
+        with self._lock:
+            matcher = self._matchers.get(key)
+            if matcher is not None and revision:
+                self._matchers.move_to_end(key)
+                return matcher
+
+        matcher = GlossaryMatcher(load_glossary(), mode=matching_mode(source_language))
+        # An empty revision means it couldn't be read, don't reuse the matcher
+        if revision:
+            with self._lock:
+                self._matchers[key] = matcher
+                while len(self._matchers) > MAX_CACHED_MATCHERS:
+                    self._matchers.popitem(last=False)
+        return matcher
+
+    def __len__(self) -> int:
+        """Get the number of cached matchers."""
+        with self._lock:
+            return len(self._matchers)
+
+
+def _log_rematch(session_id: str, user_id: str) -> None:
+    logger.info(f"Glossary changed, rematched session {session_id}. User Id: {user_id}")
+
+
+class MatchingSessionStore:
+    """Thread-safe in-memory store of the matching sessions, local to the worker process."""
+
+    def __init__(self, ttl_seconds: int = None, max_sessions: int = None):
+        """Initialize the store.
+
+        Args:
+            ttl_seconds: Idle time before a session expires. Defaults to MATCH_SESSION_TTL_SECONDS.
+            max_sessions: Maximum sessions kept before LRU eviction. Defaults to MATCH_SESSION_MAX.
+        """
+        self.ttl_seconds = ttl_seconds or config.MATCH_SESSION_TTL_SECONDS
+        self.max_sessions = max_sessions or config.MATCH_SESSION_MAX
+        self.matchers = MatcherCache()
+        self._sessions: OrderedDict[str, MatchingSession] = OrderedDict()
+        self._lock = threading.Lock()
+        self._edits = 0
+        self._rematches = 0
+
+    def matcher(
+        self,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        revision: str,
+        load_glossary: Callable[[], Dict[str, Dict[str, Any]]],
+    ) -> GlossaryMatcher:
+        """Get the compiled matcher of a glossary revision, compiling it if needed."""
+        return self.matchers.get(
+            user_id, source_language, target_language, revision, load_glossary
+        )
+
+    def start(
+        self,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        text: str,
+        matcher: GlossaryMatcher,
+        revision: str,
+    ) -> MatchingSession:
+        """Match a text and keep it in a new session."""
+        session = MatchingSession(
+            session_id=str(uuid.uuid4()),
+            user_id=user_id,
+            source_language=source_language,
+            target_language=target_language,
+            text=text,
+            revision=revision,
+            spans=matcher.find_spans(text),
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._purge(time.monotonic())
+        return session
+
+    def get(self, session_id: str, user_id: str) -> MatchingSession | None:
+        """Get a live session of the user, extending its lifetime."""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return None
+            session.expires_at = now + self.ttl_seconds
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def edit(
+        self,
+        session_id: str,
+        user_id: str,
+        offset: int,
+        deleted: int,
+        inserted: str,
+        matcher: GlossaryMatcher,
+        revision: str,
+        version: int | None = None,
+    ) -> MatchDelta | None:
+        """Apply an edit to a session of the user.
+
+        The version is checked under the lock of the session, so of two edits
+        made on the same version only the first one is applied.
+
+        Returns:
+            The occurrences changed by the edit, None if the session doesn't exist.
+
+        Raises:
+            VersionConflictError: If the session is not at the given version.
+            ValueError: If the edit is outside the text.
+        """
+        session = self.get(session_id, user_id)
+        if session is None:
+            return None
+        with session.lock:
+            rematched = revision != session.revision
+            delta = session.apply_edit(
+                offset, deleted, inserted, matcher, revision, version
+            )
+        self._count(rematched)
+        if rematched:
+            _log_rematch(session_id, user_id)
+        return delta
+
+    def close(self, session_id: str, user_id: str) -> bool:
+        """Remove a session of the user. Returns whether it existed."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def _count(self, rematched: bool) -> None:
+        with self._lock:
+            if rematched:
+                self._rematches += 1
+            else:
+                self._edits += 1
+
+    def _purge(self, now: float) -> None:
+        """Drop expired sessions and the least recently used ones above the maximum."""
+        for session_id in [
+            session_id
+            for session_id, session in self._sessions.items()
+            if session.expires_at <= now
+        ]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of sessions and compiled matchers, and the edits applied."""
+        with self._lock:
+            sessions = len(self._sessions)
+            edits, rematches = self._edits, self._rematches
+        return {
+            "backend": "memory",
+            "sessions": sessions,
+            "matchers": len(self.matchers),
+            "edits": edits,
+            "rematches": rematches,
+        }
+
+
+MATCHING_SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matching_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    source_language TEXT NOT NULL,
+    target_language TEXT NOT NULL,
+    text TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    spans TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_matching_sessions_expires_at
+ON matching_sessions(expires_at);
+"""
+
+
+def _session_from_row(row) -> MatchingSession:
+    return MatchingSession(
+        session_id=row["session_id"],
+        user_id=row["user_id"],
+        source_language=row["source_language"],
+        target_language=row["target_language"],
+        text=row["text"],
+        revision=row["revision"],
+        spans=[GlossarySpan(**span) for span in json.loads(row["spans"])],
+        version=row["version"],
+        expires_at=row["expires_at"],
+    )
+
+
+def _session_values(session: MatchingSession) -> Tuple:
+    return (
+        session.text,
+        session.revision,
+        json.dumps([asdict(span) for span in session.spans]),
+        session.version,
+        session.expires_at,
+    )
+
+
+class SQLiteMatchingSessionStore:
+    """Matching sessions shared between workers through SQLite.
+
+    Any worker can apply the next edit of a session. Each worker compiles its
+    own matchers from the glossary revision stored with the session.
+    """
+
+    def __init__(
+        self, db_path: str = None, ttl_seconds: int = None, max_sessions: int = None
+    ):
+        """Initialize the session table.
+
+        Args:
+            db_path: Path to the SQLite database. Defaults to STATE_DATABASE_PATH.
+            ttl_seconds: Idle time before a session expires. Defaults to MATCH_SESSION_TTL_SECONDS.
+            max_sessions: Maximum sessions kept before LRU eviction. Defaults to MATCH_SESSION_MAX.
+        """
+        self.ttl_seconds = ttl_seconds or config.MATCH_SESSION_TTL_SECONDS
+        self.max_sessions = max_sessions or config.MATCH_SESSION_MAX
+        self.store = StateStore(db_path=db_path, schema=MATCHING_SESSION_SCHEMA)
+        self.matchers = MatcherCache()
+        # Counters are per process, the stored sessions are shared
+        self._lock = threading.Lock()
+        self._edits = 0
+        self._rematches = 0
+
+    def matcher(
+        self,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        revision: str,
+        load_glossary: Callable[[], Dict[str, Dict[str, Any]]],
+    ) -> GlossaryMatcher:
+        """Get the compiled matcher of a glossary revision, compiling it if needed."""
+        return self.matchers.get(
+            user_id, source_language, target_language, revision, load_glossary
+        )
+
+    def start(
+        self,
+        user_id: str,
+        source_language: str,
+        target_language: str,
+        text: str,
+        matcher: GlossaryMatcher,
+        revision: str,
+    ) -> MatchingSession:
+        """Match a text and keep it in a new session."""
+        now = time.time()
+        session = MatchingSession(
+            session_id=str(uuid.uuid4()),
+            user_id=user_id,
+            source_language=source_language,
+            target_language=target_language,
+            text=text,
+            revision=revision,
+            spans=matcher.find_spans(text),
+            expires_at=now + self.ttl_seconds,
+        )
+        with self.store.connection() as conn:
+            conn.execute(
+                "INSERT INTO matching_sessions (session_id, user_id, source_language, target_language, "
+                "text, revision, spans, version, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session.session_id,
+                    user_id,
+                    source_language,
+                    target_language,
+                    *_session_values(session),
+                ),
+            )
+            self._purge(conn, now)
+        return session
+
+    def get(self, session_id: str, user_id: str) -> MatchingSession | None:
+        """Get a live session of the user, extending its lifetime."""
+        now = time.time()
+        with self.store.connection() as conn:
+            row = self._select(conn, session_id, user_id, now)
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE matching_sessions SET expires_at = ? WHERE session_id = ?",
+                (now + self.ttl_seconds, session_id),
+            )
+        session = _session_from_row(row)
+        session.expires_at = now + self.ttl_seconds
+        return session
+
+    def edit(
+        self,
+        session_id: str,
+        user_id: str,
+        offset: int,
+        deleted: int,
+        inserted: str,
+        matcher: GlossaryMatcher,
+        revision: str,
+        version: int | None = None,
+    ) -> MatchDelta | None:
+        """Apply an edit to a session of the user.
+
+        The session is read and written back in one write transaction, so the
+        edits of every worker are applied one at a time and of two edits made
+        on the same version only the first one is applied.
+
+        Returns:
+            The occurrences changed by the edit, None if the session doesn't exist.
+
+        Raises:
+            VersionConflictError: If the session is not at the given version.
+            ValueError: If the edit is outside the text.
+        """
+        now = time.time()
+        with self.store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = self._select(conn, session_id, user_id, now)
+            if row is None:
+                return None
+            session = _session_from_row(row)
+            rematched = revision != session.revision
+            delta = session.apply_edit(
+                offset, deleted, inserted, matcher, revision, version
+            )
+            session.expires_at = now + self.ttl_seconds
+            conn.execute(
+                "UPDATE matching_sessions SET text = ?, revision = ?, spans = ?, version = ?, "
+                "expires_at = ? WHERE session_id = ?",
+                (*_session_values(session), session_id),
+            )
+        self._count(rematched)
+        if rematched:
+            _log_rematch(session_id, user_id)
+        return delta
+
+    def close(self, session_id: str, user_id: str) -> bool:
+        """Remove a session of the user. Returns whether it existed."""
+        with self.store.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM matching_sessions WHERE session_id = ? AND user_id = ?",
+                (session_id, user_id),
+            )
+        return cursor.rowcount > 0
+
+    def _count(self, rematched: bool) -> None:
+        with self._lock:
+            if rematched:
+                self._rematches += 1
+            else:
+                self._edits += 1
+
+    def _select(self, conn, session_id: str, user_id: str, now: float):
+        return conn.execute(
+            "SELECT * FROM matching_sessions WHERE session_id = ? AND user_id = ? AND expires_at > ?",
+            (session_id, user_id, now),
+        ).fetchone()
+
+    def _purge(self, conn, now: float) -> None:
+        """Delete expired sessions and the least recently used ones above the maximum."""
+        conn.execute("DELETE FROM matching_sessions WHERE expires_at <= ?", (now,))
+        # Sessions share the TTL, so the ones expiring first are the least recently used
+        conn.execute(
+            "DELETE FROM matching_sessions WHERE session_id IN (SELECT session_id FROM matching_sessions "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of sessions and compiled matchers, and the edits applied."""
+        with self.store.connection() as conn:
+            sessions = conn.execute(
+                "SELECT COUNT(*) FROM matching_sessions WHERE expires_at > ?",
+                (time.time(),),
+            ).fetchone()[0]
+        with self._lock:
+            edits, rematches = self._edits, self._rematches
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "matchers": len(self.matchers),
+            "edits": edits,
+            "rematches": rematches,
+        }
+
+
+def create_matching_session_store():
+    """Create the matching session store for the configured state backend."""
+    if config.STATE_BACKEND == "sqlite":
+        return SQLiteMatchingSessionStore()
+    return MatchingSessionStore()
+
+
+# Global matching session store
+matching_sessions = create_matching_session_store()
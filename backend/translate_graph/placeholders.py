@@ -0,0 +1,64 @@
+"""Placeholders standing for the parts of a text the model must not translate.
+
+Inline markup (tags, format specifiers...) is replaced by numbered markers like
+⟦1⟧ before the text is sent to the model, and put back in the translation. The
+markers use brackets that don't appear in regular texts, so they can't be
+confused with the text itself, and cost a few tokens whatever they stand for.
+"""
+
+import re
+from typing import Callable, List
+
+from utils.logger import logger
+
+PLACEHOLDER_PATTERN = re.compile(r"⟦(\d+)⟧")
+
+
+def placeholder(number: int) -> str:
+    """Get the marker of the placeholder with the given number (1-based)."""
+    return f"⟦{number}⟧"
+
+
+def has_placeholders(text: str) -> bool:
+    """Whether the text contains placeholder markers."""
+    return PLACEHOLDER_PATTERN.search(text) is not None
+
+
+def restore_placeholders(
+    translation: str,
+    codes: List[str],
+    escape: Callable[[str], str] = lambda text: text,
+) -> str:
+    """Put the original code of each placeholder back in the translation.
+
+    Every placeholder must appear exactly once. Markers the model invented or
+    repeated are dropped, and the ones it left out are appended at the end, so
+    no markup is lost or duplicated.
+
+    Args:
+        translation: Translation with placeholder markers.
+        codes: Original code of each placeholder, ⟦1⟧ being the first.
+        escape: Applied to the translated text between the placeholders.
+
+    Returns:
+        The translation with the codes in place of the markers.
+    """
+    pieces = []
+    restored = set()
+    position = 0
+    for marker in PLACEHOLDER_PATTERN.finditer(translation):
+        pieces.append(escape(translation[position : marker.start()]))
+        position = marker.end()
+        number = int(marker.group(1))
+        if 0 < number <= len(codes) and number not in restored:
+            pieces.append(codes[number - 1])
+            restored.add(number)
+    pieces.append(escape(translation[position:]))
+
+    missing = [number for number in range(1, len(codes) + 1) if number not in restored]
+    if missing or len(restored) != len(PLACEHOLDER_PATTERN.findall(translation)):
+        logger.warning(
+            f"Translation changed its placeholders, {len(missing)}/{len(codes)} missing"
+        )
+    pieces.extend(codes[number - 1] for number in missing)
+    return "".join(pieces)
@@ -18,6 +18,10 @@ Rules when translating from {source_language} to {target_language}:
 
 """
 
+placeholder_instructions = """
+The text contains placeholders like ⟦1⟧ that stand for formatting or code. Keep each of them exactly once in the translation, next to the words they surround.
+"""
+
 first_translation_instructions = """
 Translate the following text from {source_language} to {target_language}:
 {text_to_translate}
@@ -26,6 +30,21 @@ Follow the instructions:
 {translation_instructions}
 """
 
+deduplicated_translation_instructions = """
+Translate the numbered segments below from {source_language} to {target_language}.
+They are the distinct sentences and headings of one text, in the order they first appear. Use the segments around each one as context.
+Keep the markup, punctuation and formatting of each segment.
+
+<Segments>
+{segments}
+</Segments>
+
+Follow the instructions:
+{translation_instructions}
+
+Return one entry per segment with its number and its translation, without any prefix.
+"""
+
 update_translation_instructions = """
 These are the last two messages that have been exchanged so far from the user asking for the translation from {source_language} to {target_language}:
 <Messages>
@@ -41,6 +60,90 @@ Return just the translation. Never preface the translation with anything like "A
 """
 
 
+combined_refinement_instructions = """
+These are the last two messages that have been exchanged so far from the user asking for the translation from {source_language} to {target_language}:
+<Messages>
+{messages}
+</Messages>
+
+The original {source_language} text:
+<OriginalText>
+{original_text}
+</OriginalText>
+
+<Task>
+1. Take a look at the feedback made by the user and update the translation. Following the instructions 
+{translation_instructions}
+Put only the updated translation in "translation". Never preface it with anything like "AI:" or any prefix.
+
+2. Detect if the feedback contains improvements that should be applied to future translations:
+  glossary_updates:
+  source: <word from the original text>, 
+  target: <word from the user feedback>, 
+  note: <note from the user feedback>.
+  
+  rules_updates:
+  text: <rule from the user feedback>.
+
+If the feedback only concerns this translation (style, length, tone...), leave both lists empty.
+</Task>
+"""
+
+
+repair_translation_instructions = """
+Some sentences of a translation from {source_language} to {target_language} don't use the glossary terms they should.
+
+For each sentence below you have the original sentence, its current translation and the glossary terms to apply.
+Rewrite only the translation of these sentences, applying the glossary terms and changing as little as possible.
+Keep the translation unchanged if the note of a term says it doesn't apply in this context.
+Respect the case of the original word, even if the case in the glossary is different.
+
+<Sentences>
+{sentences}
+</Sentences>
+
+Rules when translating from {source_language} to {target_language}:
+{rules}
+
+Return one entry per sentence with its number and the repaired translation, without any prefix.
+"""
+
+
+segment_refinement_instructions = """
+The user asked for a translation from {source_language} to {target_language} and gave this feedback about it:
+<Feedback>
+{feedback}
+</Feedback>
+
+The feedback concerns the sentences below. For each one you have the original sentence, its current translation,
+and the sentences around it for context (don't rewrite those).
+<Sentences>
+{sentences}
+</Sentences>
+
+<Task>
+1. Rewrite the translation of the numbered sentences applying the feedback, changing as little as possible.
+Following the instructions 
+{translation_instructions}
+Return one entry per sentence with its number and the new translation, without any prefix.
+{improvements_task}
+</Task>
+"""
+
+segment_refinement_improvements_task = """
+2. Detect if the feedback contains improvements that should be applied to future translations:
+  glossary_updates:
+  source: <word from the original text>, 
+  target: <word from the user feedback>, 
+  note: <note from the user feedback>.
+  
+  rules_updates:
+  text: <rule from the user feedback>.
+
+If the feedback only concerns this translation (style, length, tone...), leave both lists empty.
+"""
+
+
 lead_update_glossary_prompt = """
 You are a wait_for_feedback that detects improvements for tranlsations between two languages, these improvements can be new glossary entries and rules. Your job is to improve the translation between two languages by calling the "GlossaryUpdate" or "RulesUpdate" tools. 
  
@@ -0,0 +1,166 @@
+"""Select the language rules sent with a translation under a token budget.
+
+Rules are ranked by the cosine similarity between their TF-IDF vector and the
+vector of the text to translate. Pinned rules are always included, then the
+best ranked rules are added while they fit in the budget. Rules that share no
+word with the text (usually general style rules) come last, in their original
+order. When every rule fits in the budget they are all kept.
+
+The TF-IDF matrix of a user's rules is cached by the content of the rules, so
+it is only rebuilt when the rules change.
+"""
+
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+from config import config
+from database.models import LangRuleEntry
+from utils.logger import logger
+from utils.token_estimator import token_estimator
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Rule indexes kept in memory (one per user, language pair and set of rules)
+MAX_CACHED_INDEXES = 256
+
+
+def _tokens(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+@dataclass
+class _RuleIndex:
+    """TF-IDF vectors of a set of rules."""
+
+    vocabulary: Dict[str, int]
+    idf: np.ndarray
+    # One L2-normalised row per rule
+    matrix: np.ndarray
+    token_counts: List[int]
+
+
+def build_index(rules: List[str]) -> _RuleIndex:
+    """Compute the TF-IDF vectors of the rules."""
+    documents = [Counter(_tokens(rule)) for rule in rules]
+    vocabulary: Dict[str, int] = {}
+    for document in documents:
+        for word in document:
+            vocabulary.setdefault(word, len(vocabulary))
+
+    counts = np.zeros((len(rules), len(vocabulary)), dtype=np.float32)
+    for row, document in enumerate(documents):
+        for word, count in document.items():
+            counts[row, vocabulary[word]] = count
+
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(rules)) / (1 + document_frequency)) + 1
+    matrix = counts * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    return _RuleIndex(
+        vocabulary=vocabulary,
+        idf=idf.astype(np.float32),
+        matrix=matrix,
+        token_counts=[token_estimator.estimate(rule) for rule in rules],
+    )
+
+
+class RuleSelector:
+    """Rank rules by relevance to a text and keep the best ones within a token budget."""
+
+    def __init__(self, token_budget: int = None):
+        """Initialize the selector.
+
+        Args:
+            token_budget: Tokens available for the rules. Defaults to RULES_TOKEN_BUDGET.
+        """
+        self.token_budget = (
+            config.RULES_TOKEN_BUDGET if token_budget is None else token_budget
+        )
+        self._indexes: OrderedDict[Hashable, _RuleIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, cache_key: Hashable, rules: List[str]) -> _RuleIndex:
+        with self._lock:
+            index = self._indexes.get(cache_key)
+            if index is not None:
+                self._indexes.move_to_end(cache_key)
+                return index
+
+        index = build_index(rules)
+        with self._lock:
+            self._indexes[cache_key] = index
+            while len(self._indexes) > MAX_CACHED_INDEXES:
+                self._indexes.popitem(last=False)
+        return index
+
+    def scores(self, index: _RuleIndex, text: str) -> np.ndarray:
+        """Get the cosine similarity between each rule and the text."""
+        query = np.zeros(len(index.vocabulary), dtype=np.float32)
+        for word, count in Counter(_tokens(text)).items():
+            column = index.vocabulary.get(word)
+            if column is not None:
+                query[column] = count
+        query *= index.idf
+        norm = np.linalg.norm(query)
+        if not norm:
+            return np.zeros(len(index.token_counts), dtype=np.float32)
+        return index.matrix @ (query / norm)
+
+    def select(self, entries: List[LangRuleEntry], text: str) -> List[str]:
+        """Get the texts of the pinned and most relevant rules that fit in the budget.
+
+        Args:
+            entries: All the rules of the user for the language pair.
+            text: Text to translate.
+
+        Returns:
+            Selected rule texts, in their original order.
+        """
+        if not entries:
+            return []
+
+        rules = [entry.text for entry in entries]
+        first = entries[0]
+        # Keyed by the rules themselves, not the revision: a revision read before
+        # the rules may not match them if they were edited in between
+        cache_key = (
+            first.user_id,
+            first.source_language,
+            first.target_language,
+            tuple(rules),
+        )
+        index = self._index(cache_key, rules)
+        if sum(index.token_counts) <= self.token_budget:
+            return rules
+
+        scores = self.scores(index, text)
+        pinned = [i for i, entry in enumerate(entries) if entry.pinned]
+        # Stable sort: rules with the same score keep their original order
+        ranked = [
+            int(i) for i in np.argsort(-scores, kind="stable") if not entries[i].pinned
+        ]
+
+        selected = list(pinned)
+        used_tokens = sum(index.token_counts[i] for i in pinned)
+        for i in ranked:
+            if used_tokens + index.token_counts[i] <= self.token_budget:
+                selected.append(i)
+                used_tokens += index.token_counts[i]
+
+        logger.info(
+            f"Selected {len(selected)}/{len(rules)} rules ({len(pinned)} pinned, "
+            f"~{used_tokens}/{self.token_budget} tokens)"
+        )
+        # Keep the original order so the prompt stays stable between calls
+        return [rules[i] for i in sorted(selected)]
+
+
+# Global selector instance
+rule_selector = RuleSelector()
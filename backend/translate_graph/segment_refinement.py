@@ -0,0 +1,245 @@
+"""Find the sentences of a translation concerned by the feedback of the user.
+
+A refinement usually concerns a word or a sentence of the translation. When the
+sentences of the original text and of the translation align one to one, the
+quoted phrases and the specific words of the feedback are matched against both,
+and only the sentences where they appear are rewritten by the model. The other
+sentences are kept as they are. Generic instruction words ("more", "again",
+"use", "tone"...) are ignored, they say how to rewrite, not where.
+
+No plan is returned (so the whole translation is refined) when the sentences
+don't align, when the feedback doesn't point at any sentence (e.g. "make it
+more formal") or when it concerns most of them.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from config import config
+from translate_graph.match_words import GlossaryMatcher, matching_mode
+from translate_graph.segments import Segment, split_segments
+from utils.improvement_gate import STYLE_WORDS
+from utils.logger import logger
+
+# Quotes open after a space so apostrophes ("don't") are not taken for quotes
+QUOTED_PATTERN = re.compile(r"(?:^|(?<=\s))[\"'“‘«「『](.+?)[\"'”’»」』](?!\w)")
+FEEDBACK_WORD_PATTERN = re.compile(r"[^\W\d_][\w-]{2,}")
+
+# Similarity of the feedback words with the words of the sentences (0-100)
+FEEDBACK_MATCH_THRESHOLD = 90
+
+# Words of a feedback about the whole text, which don't point at a sentence
+INSTRUCTION_WORDS = STYLE_WORDS | {
+    "about",
+    "again",
+    "all",
+    "also",
+    "and",
+    "another",
+    "any",
+    "are",
+    "bad",
+    "bit",
+    "but",
+    "can",
+    "change",
+    "clear",
+    "clearer",
+    "correct",
+    "could",
+    "don't",
+    "entire",
+    "every",
+    "everything",
+    "few",
+    "fix",
+    "for",
+    "from",
+    "good",
+    "has",
+    "have",
+    "improve",
+    "instead",
+    "into",
+    "its",
+    "just",
+    "keep",
+    "language",
+    "less",
+    "like",
+    "little",
+    "make",
+    "more",
+    "most",
+    "much",
+    "need",
+    "needs",
+    "not",
+    "now",
+    "one",
+    "other",
+    "please",
+    "prefer",
+    "read",
+    "reads",
+    "redo",
+    "rewrite",
+    "same",
+    "sentence",
+    "sentences",
+    "should",
+    "some",
+    "sound",
+    "sounds",
+    "than",
+    "that",
+    "the",
+    "them",
+    "then",
+    "there",
+    "these",
+    "this",
+    "too",
+    "translate",
+    "translated",
+    "translation",
+    "try",
+    "use",
+    "using",
+    "very",
+    "want",
+    "way",
+    "was",
+    "whole",
+    "with",
+    "word",
+    "words",
+    "worse",
+    "would",
+    "wrong",
+    "you",
+    "your",
+}
+
+
+@dataclass
+class SegmentRefinementPlan:
+    """Aligned sentences of the original text and the translation, and the ones to rewrite."""
+
+    source_segments: List[Segment]
+    translation_segments: List[Segment]
+    affected: List[int] = field(default_factory=list)
+
+
+def feedback_terms(feedback: str) -> tuple[List[str], List[str]]:
+    """Get the quoted phrases and the specific words of the feedback."""
+    quoted = list(
+        dict.fromkeys(
+            phrase.strip()
+            for phrase in QUOTED_PATTERN.findall(feedback)
+            if phrase.strip()
+        )
+    )
+    words = [
+        word
+        for word in dict.fromkeys(FEEDBACK_WORD_PATTERN.findall(feedback))
+        if word not in quoted and word.lower() not in INSTRUCTION_WORDS
+    ]
+    return quoted, words
+
+
+def _segments_with_terms(
+    terms: List[str], segments: List[Segment], language: str
+) -> dict[str, set[int]]:
+    """Get the segments where each term appears."""
+    matcher = GlossaryMatcher(
+        dict.fromkeys(terms, ""),
+        threshold=FEEDBACK_MATCH_THRESHOLD,
+        mode=matching_mode(language),
+    )
+    found: dict[str, set[int]] = {}
+    for index, segment in enumerate(segments):
+        for span in matcher.find_spans(segment.text):
+            found.setdefault(span.term, set()).add(index)
+    return found
+
+
+def _affected_segments(
+    terms: List[str],
+    source_segments: List[Segment],
+    translation_segments: List[Segment],
+    source_language: str,
+    target_language: str,
+) -> set[int]:
+    """Get the sentences where the terms appear, in the original text or the translation."""
+    affected: set[int] = set()
+    for segments, language in (
+        (source_segments, source_language),
+        (translation_segments, target_language),
+    ):
+        for indexes in _segments_with_terms(terms, segments, language).values():
+            # Words present in most sentences ("the", "de"...) don't point anywhere
+            if len(indexes) <= len(segments) * config.SEGMENT_REFINEMENT_MAX_SHARE:
+                affected.update(indexes)
+    return affected
+
+
+def plan_segment_refinement(
+    original_text: str,
+    translation: str,
+    feedback: str,
+    source_language: str,
+    target_language: str,
+) -> SegmentRefinementPlan | None:
+    """Find the sentences of the translation the feedback is about.
+
+    Args:
+        original_text: Text that was translated.
+        translation: Current translation the feedback refers to.
+        feedback: Message of the user.
+        source_language: Language of the original text.
+        target_language: Language of the translation.
+
+    Returns:
+        The plan with the sentences to rewrite, or None to refine the whole translation.
+    """
+    source_segments = split_segments(original_text)
+    translation_segments = split_segments(translation)
+    if len(source_segments) < 2:
+        return None
+    if len(source_segments) != len(translation_segments):
+        logger.info("Refining the whole translation, sentences don't align")
+        return None
+
+    # Quoted phrases are the most precise pointers, words are used without them
+    affected: set[int] = set()
+    for terms in feedback_terms(feedback):
+        if terms:
+            affected = _affected_segments(
+                terms,
+                source_segments,
+                translation_segments,
+                source_language,
+                target_language,
+            )
+        if affected:
+            break
+
+    if not affected:
+        logger.info(
+            "Refining the whole translation, feedback doesn't point at a sentence"
+        )
+        return None
+    if len(affected) > len(source_segments) * config.SEGMENT_REFINEMENT_MAX_SHARE:
+        logger.info(
+            f"Refining the whole translation, feedback concerns {len(affected)}/"
+            f"{len(source_segments)} sentences"
+        )
+        return None
+
+    return SegmentRefinementPlan(
+        source_segments=source_segments,
+        translation_segments=translation_segments,
+        affected=sorted(affected),
+    )
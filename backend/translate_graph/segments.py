@@ -0,0 +1,70 @@
+"""Split texts in sentences (segments) and put them back together.
+
+Segments keep their character offsets, so the text between them (spaces,
+newlines, list markers...) is preserved when some of them are replaced.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Closing quotes and brackets belong to the sentence they end
+CLOSING_CHARS = "\"'”’)]」』）"
+
+# A sentence ends after . ! ? (and closing quotes or brackets) followed by a
+# space, after CJK full stops, or at a line break
+SEGMENT_BOUNDARY = re.compile(
+    r"(?<=[.!?])[\"'”’)\]]*\s+|(?<=[。！？])[”’」』）]*\s*|\n\s*"
+)
+
+
+@dataclass
+class Segment:
+    """A sentence of a text and its offsets, end excluded."""
+
+    start: int
+    end: int
+    text: str
+
+
+def split_segments(text: str) -> List[Segment]:
+    """Split a text in sentences, without the whitespace around them."""
+    segments = []
+    position = 0
+    for boundary in SEGMENT_BOUNDARY.finditer(text):
+        separator = boundary.group()
+        end = boundary.start() + len(separator) - len(separator.lstrip(CLOSING_CHARS))
+        _append(segments, text, position, end)
+        position = boundary.end()
+    _append(segments, text, position, len(text))
+    return segments
+
+
+def _append(segments: List[Segment], text: str, start: int, end: int) -> None:
+    piece = text[start:end]
+    stripped = piece.strip()
+    if stripped:
+        start += len(piece) - len(piece.lstrip())
+        segments.append(Segment(start, start + len(stripped), stripped))
+
+
+def replace_segments(
+    text: str, segments: List[Segment], replacements: Dict[int, str]
+) -> str:
+    """Replace some segments of a text, keeping everything between them.
+
+    Args:
+        text: Text the segments were split from.
+        segments: Segments of the text.
+        replacements: New text of the segments to replace, by segment index.
+    """
+    pieces = []
+    position = 0
+    for index, segment in enumerate(segments):
+        if index not in replacements:
+            continue
+        pieces.append(text[position : segment.start])
+        pieces.append(replacements[index])
+        position = segment.end
+    pieces.append(text[position:])
+    return "".join(pieces)
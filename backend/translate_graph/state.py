@@ -4,7 +4,7 @@ from typing import Annotated
 
 from langchain_core.messages import BaseMessage
 from langgraph.graph import MessagesState, add_messages
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 ###################
@@ -32,6 +32,53 @@ class RulesUpdate(UpdateRulesClass):
     """Call this tool to conduct update on a specific adjustment from the user."""
 
 
+class RefinementResult(BaseModel):
+    """Refined translation and the improvements detected in the user feedback."""
+
+    translation: str = Field(description="The updated translation, without any prefix")
+    glossary_updates: list[UpdateGlossaryClass] = Field(
+        default_factory=list,
+        description="Words of the original text that should always be translated differently",
+    )
+    rules_updates: list[UpdateRulesClass] = Field(
+        default_factory=list,
+        description="General rules about translating between the two languages",
+    )
+
+
+class RepairedSentence(BaseModel):
+    """Repaired translation of a sentence."""
+
+    number: int = Field(description="Number of the sentence")
+    translation: str = Field(description="The repaired translation of the sentence")
+
+
+class RepairResult(BaseModel):
+    """Sentences repaired to apply the glossary."""
+
+    sentences: list[RepairedSentence] = Field(default_factory=list)
+
+
+class SegmentTranslationResult(BaseModel):
+    """Translations of the numbered segments of a text."""
+
+    sentences: list[RepairedSentence] = Field(default_factory=list)
+
+
+class SegmentRefinementResult(BaseModel):
+    """Rewritten sentences of a translation and the improvements detected in the user feedback."""
+
+    sentences: list[RepairedSentence] = Field(default_factory=list)
+    glossary_updates: list[UpdateGlossaryClass] = Field(
+        default_factory=list,
+        description="Words of the original text that should always be translated differently",
+    )
+    rules_updates: list[UpdateRulesClass] = Field(
+        default_factory=list,
+        description="General rules about translating between the two languages",
+    )
+
+
 class NoUpdate(BaseModel):
     """Call this tool when no update is needed."""
 
@@ -47,6 +94,9 @@ class TranslateInputState(MessagesState):
     source_language: str
     target_language: str
     user_id: str | None
+    # Glossary and rules snapshot with its revisions loaded by the caller (e.g.
+    # once for several target languages), consumed by the initial translation
+    preloaded_snapshot: dict | None
 
 
 class TranslateState(TranslateInputState):
@@ -55,3 +105,11 @@ class TranslateState(TranslateInputState):
     messages: Annotated[list[BaseMessage], add_messages]
     original_text: str = ""
     test: str = ""
+    # Segments of the original text and the distinct ones sent to the model
+    deduplication: dict
+    # Glossary entries matched in the original text and rule texts used to
+    # translate it, reused by refinements while their revisions don't change
+    glossary_snapshot: dict[str, dict[str, str]]
+    glossary_revision: str
+    rules_snapshot: list[str]
+    rules_revision: str
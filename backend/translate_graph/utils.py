@@ -1,16 +1,131 @@
-from database.models import LangRuleEntry
+from translate_graph.compliance import ComplianceViolation
+from translate_graph.match_words import GlossaryMatch
+from translate_graph.segments import Segment
+from translate_graph.state import RefinementResult, SegmentRefinementResult
+from utils.logger import logger
+from utils.token_estimator import token_estimator
+
+
+def format_glossary_entry(key: str, value: dict[str, str]) -> str:
+    """Format a glossary entry as a line of the prompt."""
+    return f"{key}: {value['target']} ({value['note']})"
 
 
 def format_glossary(glossary: dict[str, dict[str, str]]) -> str:
     """Format the glossary to be used in the prompt."""
     return "\n".join(
-        [
-            f"{key}: {value['target']} ({value['note']})"
-            for key, value in glossary.items()
-        ]
+        [format_glossary_entry(key, value) for key, value in glossary.items()]
+    )
+
+
+def select_glossary_matches(
+    matches: list[GlossaryMatch], token_budget: int
+) -> dict[str, dict[str, str]]:
+    """Keep the most valuable glossary matches that fit in the token budget.
+
+    Exact matches come first, then the terms found most often, then the closest
+    fuzzy matches. The selected matches keep the order of the glossary.
+
+    Args:
+        matches: Matches returned by score_glossary_matches.
+        token_budget: Tokens available for the glossary lines of the prompt.
+
+    Returns:
+        Glossary snapshot: {"found_text": {"target": ..., "note": ...}}
+    """
+    ranked = sorted(
+        range(len(matches)),
+        key=lambda i: (not matches[i].exact, -matches[i].count, -matches[i].score),
+    )
+    selected = set()
+    used_tokens = 0
+    for i in ranked:
+        tokens = token_estimator.estimate(
+            format_glossary_entry(matches[i].found_text, matches[i].entry)
+        )
+        if used_tokens + tokens <= token_budget:
+            selected.add(i)
+            used_tokens += tokens
+
+    dropped = len(matches) - len(selected)
+    if dropped:
+        logger.info(
+            f"Dropped {dropped}/{len(matches)} glossary matches over the budget "
+            f"(~{used_tokens}/{token_budget} tokens)"
+        )
+    return {
+        match.found_text: match.entry
+        for i, match in enumerate(matches)
+        if i in selected
+    }
+
+
+def format_rules(rules: list[str]) -> str:
+    """Format the rule texts to be used in the prompt."""
+    return "\n".join(rules)
+
+
+def format_numbered_segments(segments: list[str]) -> str:
+    """Format the segments of a text to be translated one by one."""
+    return "\n".join(
+        f"[{number}] {segment}" for number, segment in enumerate(segments, start=1)
     )
 
 
-def format_rules(rules: list[LangRuleEntry]) -> str:
-    """Format the rules to be used in the prompt."""
-    return "\n".join([rule.text for rule in rules])
+def format_repair_sentences(violations: list[ComplianceViolation]) -> str:
+    """Format the sentences missing glossary targets to be used in the repair prompt."""
+    blocks = []
+    for number, violation in enumerate(violations, start=1):
+        terms = "\n".join(
+            f"  {format_glossary_entry(term['term'], term)}"
+            for term in violation.missing
+        )
+        blocks.append(
+            f"[{number}]\nOriginal: {violation.source_text}\n"
+            f"Translation: {violation.translation}\nGlossary terms:\n{terms}"
+        )
+    return "\n\n".join(blocks)
+
+
+def format_refinement_sentences(
+    source_segments: list[Segment],
+    translation_segments: list[Segment],
+    affected: list[int],
+) -> str:
+    """Format the sentences to rewrite, with the sentences around them as context."""
+    blocks = []
+    for number, index in enumerate(affected, start=1):
+        lines = [f"[{number}]"]
+        if index > 0:
+            lines.append(f"Context before: {translation_segments[index - 1].text}")
+        lines.append(f"Original: {source_segments[index].text}")
+        lines.append(f"Translation: {translation_segments[index].text}")
+        if index + 1 < len(translation_segments):
+            lines.append(f"Context after: {translation_segments[index + 1].text}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def refinement_tool_calls(
+    result: RefinementResult | SegmentRefinementResult,
+) -> list[dict]:
+    """Convert the improvements of a combined refinement to improvement tool calls."""
+    tool_calls = [
+        {
+            "name": "GlossaryUpdate",
+            "args": update.model_dump(),
+            "id": None,
+            "type": "tool_call",
+        }
+        for update in result.glossary_updates
+    ]
+    tool_calls.extend(
+        {
+            "name": "RulesUpdate",
+            "args": update.model_dump(),
+            "id": None,
+            "type": "tool_call",
+        }
+        for update in result.rules_updates
+    )
+    return tool_calls
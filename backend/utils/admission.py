@@ -0,0 +1,209 @@
+"""Admission control of the LLM-bound endpoints.
+
+At most ``max_in_flight`` requests run at once, a bounded number wait for a
+free slot, and the rest are rejected right away with a 503 and a Retry-After
+header instead of slowing every request down together. Limits are per worker
+process.
+
+Waiting requests are queued per priority tier and served by stride scheduling:
+each tier gets freed slots in proportion to its weight, so paying subscribers
+are served first without starving anonymous traffic. When the queue is full, a
+request sheds the newest waiter of a lower tier instead of being rejected.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import HTTPException
+
+from config import config
+from constants import PRIORITY_FREE, PRIORITY_WEIGHTS
+from utils.logger import logger
+
+# Weight of the latest run in the moving average of the slot hold time
+HOLD_TIME_SMOOTHING = 0.2
+
+
+class AdmissionController:
+    """Bound the requests running at once, queueing a few and shedding the rest."""
+
+    def __init__(
+        self,
+        max_in_flight: int = None,
+        max_queue: int = None,
+        queue_timeout: float = None,
+    ):
+        """Initialize the controller.
+
+        Args:
+            max_in_flight: Requests allowed to run at once. Defaults to MAX_IN_FLIGHT_LLM_CALLS.
+            max_queue: Requests allowed to wait for a slot. Defaults to ADMISSION_QUEUE_SIZE.
+            queue_timeout: Seconds a request may wait for a slot. Defaults to ADMISSION_QUEUE_TIMEOUT_SECONDS.
+        """
+        self.max_in_flight = max(1, max_in_flight or config.MAX_IN_FLIGHT_LLM_CALLS)
+        self.max_queue = config.ADMISSION_QUEUE_SIZE if max_queue is None else max_queue
+        self.queue_timeout = (
+            config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+            if queue_timeout is None
+            else queue_timeout
+        )
+        self._in_flight = 0
+        self._queues: Dict[str, deque[asyncio.Future]] = {
+            tier: deque() for tier in PRIORITY_WEIGHTS
+        }
+        # Stride scheduling: the tier whose pass would advance the least is served next
+        self._pass: Dict[str, float] = dict.fromkeys(PRIORITY_WEIGHTS, 0.0)
+        self._virtual_time = 0.0
+        self._admitted = dict.fromkeys(PRIORITY_WEIGHTS, 0)
+        self._queued = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._rejected_shed = 0
+        self._average_hold_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, tier: str = PRIORITY_FREE) -> AsyncIterator[None]:
+        """Hold a slot while the block runs.
+
+        Args:
+            tier: Priority tier of the request ("paid", "free" or "anonymous").
+
+        Raises:
+            HTTPException: 503 with Retry-After if no slot frees up in time.
+        """
+        await self._acquire(tier)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_hold_time(time.monotonic() - started)
+            self._release()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a slot."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _acquire(self, tier: str) -> None:
+        if self._in_flight < self.max_in_flight and not self.queue_depth:
+            self._in_flight += 1
+            self._admitted[tier] += 1
+            return
+
+        if self.queue_depth >= self.max_queue and not self._shed_lower_than(tier):
+            self._rejected_queue_full += 1
+            self._reject("queue full", tier)
+
+        queue = self._queues[tier]
+        if not queue:
+            # A tier that was idle doesn't get credit for the time it didn't use
+            self._pass[tier] = max(self._pass[tier], self._virtual_time)
+        # The waiter resolves to True when handed a slot, False when shed
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self._queued += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter, tier)
+            raise
+
+        if not waiter.done():
+            self._abandon(waiter, tier)
+            self._rejected_timeout += 1
+            self._reject("queue timeout", tier)
+        if not waiter.result():
+            self._rejected_shed += 1
+            self._reject("shed for a higher priority request", tier)
+        # The releasing request handed its slot over, in_flight is unchanged
+        self._admitted[tier] += 1
+
+    def _shed_lower_than(self, tier: str) -> bool:
+        """Drop the newest waiter of the lowest tier below the given one."""
+        for lower in sorted(PRIORITY_WEIGHTS, key=PRIORITY_WEIGHTS.get):
+            if PRIORITY_WEIGHTS[lower] >= PRIORITY_WEIGHTS[tier]:
+                return False
+            if self._queues[lower]:
+                self._queues[lower].pop().set_result(False)
+                return True
+        return False
+
+    def _abandon(self, waiter: asyncio.Future, tier: str) -> None:
+        """Leave the queue, giving back the slot if it was handed over meanwhile."""
+        if waiter.done():
+            if waiter.result():
+                self._release()
+        else:
+            waiter.cancel()
+            self._queues[tier].remove(waiter)
+
+    def _next_tier(self) -> str | None:
+        waiting = [tier for tier, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        return min(
+            waiting, key=lambda tier: self._pass[tier] + 1 / PRIORITY_WEIGHTS[tier]
+        )
+
+    def _release(self) -> None:
+        # Hand the slot over to a waiter instead of freeing it, so new arrivals
+        # can't overtake the queue
+        tier = self._next_tier()
+        if tier is None:
+            self._in_flight -= 1
+            return
+        self._virtual_time = self._pass[tier]
+        self._pass[tier] += 1 / PRIORITY_WEIGHTS[tier]
+        self._queues[tier].popleft().set_result(True)
+
+    def _record_hold_time(self, seconds: float) -> None:
+        if not self._average_hold_seconds:
+            self._average_hold_seconds = seconds
+        else:
+            self._average_hold_seconds += HOLD_TIME_SMOOTHING * (
+                seconds - self._average_hold_seconds
+            )
+
+    def retry_after_seconds(self) -> int:
+        """Estimate when a slot should be available, from the queue and the hold time."""
+        backlog = (self.queue_depth + 1) / self.max_in_flight
+        return max(1, math.ceil(backlog * self._average_hold_seconds))
+
+    def _reject(self, reason: str, tier: str) -> None:
+        retry_after = self.retry_after_seconds()
+        logger.warning(
+            f"Request rejected by admission control ({reason}). Tier: {tier}. "
+            f"In flight: {self._in_flight}. Queued: {self.queue_depth}. Retry after: {retry_after}s"
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the current load and the admission counters."""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_tier": {
+                tier: len(queue) for tier, queue in self._queues.items()
+            },
+            "admitted": sum(self._admitted.values()),
+            "admitted_by_tier": dict(self._admitted),
+            "queued": self._queued,
+            "rejected_queue_full": self._rejected_queue_full,
+            "rejected_timeout": self._rejected_timeout,
+            "rejected_shed": self._rejected_shed,
+            "average_hold_seconds": round(self._average_hold_seconds, 3),
+        }
+
+
+# Global admission controller of the graph endpoints
+admission_controller = AdmissionController()
@@ -1,10 +1,19 @@
 """Utility functions for graph operations."""
 
-from typing import Any, Dict
+import asyncio
+from typing import Any, Awaitable, Dict
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
+from langgraph.checkpoint.base import CheckpointTuple
 
-from translate_graph.index import graph
+from translate_graph.index import checkpointer, graph
+from utils.logger import logger
+
+# How often a running graph checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Non-standard status (nginx) for requests closed by the client
+CLIENT_CLOSED_REQUEST = 499
 
 
 def create_graph_config(conversation_id: str) -> Dict[str, Dict[str, str]]:
@@ -31,3 +40,50 @@ def get_graph_state(conversation_id: str) -> Dict[str, Any]:
                 detail=f"Conversation state not found for ID: {conversation_id}",
             )
         raise e
+
+
+def latest_checkpoint(conversation_id: str) -> CheckpointTuple | None:
+    """Get the latest checkpoint of a conversation, None if it has none."""
+    return checkpointer.get_tuple(create_graph_config(conversation_id))
+
+
+def rollback_conversation(conversation_id: str, saved: CheckpointTuple | None) -> None:
+    """Restore a conversation to a checkpoint taken before a run that didn't finish.
+
+    A run interrupted midway leaves the conversation pending on the node it was
+    in (e.g. a refinement with its feedback already saved), which the next
+    request would resume. A conversation that had no checkpoint is deleted.
+    """
+    if saved is None:
+        checkpointer.delete_thread(conversation_id)
+    else:
+        checkpointer.restore(saved)
+    logger.info(f"Rolled back conversation {conversation_id} after an unfinished run")
+
+
+async def run_until_disconnected(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """Await the graph run, cancelling it if the HTTP client disconnects.
+
+    Cancellation reaches the LLM call in flight, so no more tokens are spent
+    (or charged to the user) on a response nobody will read.
+
+    Raises:
+        HTTPException: 499 if the client disconnected before the run finished.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling {request.url.path}")
+                task.cancel()
+                # Let the run unwind (and its checkpoint writes settle) before returning
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(
+                    status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request"
+                )
+    finally:
+        if not task.done():
+            task.cancel()
@@ -1,41 +1,320 @@
-"""In-memory cache for storing improvement tool calls by conversation ID."""
+"""Cache for storing improvement tool calls by conversation ID.
 
-from typing import Any, Dict, List
+Entries expire after a TTL and the number of conversations is capped (least
+recently used conversations are evicted first). The default backend lives in
+memory; the SQLite backend keeps suggestions across restarts and shares them
+between workers.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from config import config
+from utils.logger import logger
+from utils.state_store import StateStore
+
+# Seconds between two sweeps of the expired entries of every conversation
+PURGE_INTERVAL_SECONDS = 60
+
+
+def _matches_filter(call: Any, filter_criteria: Dict[str, str]) -> bool:
+    """Check whether a tool call matches every key of the filter criteria."""
+    return all(
+        call.get("args", {}).get(key) == value for key, value in filter_criteria.items()
+    )
 
 
 class ImprovementToolCallsCache:
-    """In-memory cache for improvement tool calls indexed by conversation ID."""
+    """Thread-safe in-memory cache for improvement tool calls indexed by conversation ID."""
 
-    def __init__(self):
-        """Initialize the improvement tool calls cache."""
-        self._cache: Dict[str, List[Any]] = {}
+    def __init__(
+        self,
+        ttl_seconds: int = None,
+        max_conversations: int = None,
+    ):
+        """Initialize the improvement tool calls cache.
+
+        Args:
+            ttl_seconds: Lifetime of each tool call. Defaults to IMPROVEMENT_CACHE_TTL_SECONDS.
+            max_conversations: Maximum conversations kept before LRU eviction.
+        """
+        self.ttl_seconds = ttl_seconds or config.IMPROVEMENT_CACHE_TTL_SECONDS
+        self.max_conversations = (
+            max_conversations or config.IMPROVEMENT_CACHE_MAX_CONVERSATIONS
+        )
+        # conversation_id -> [(expires_at, tool_call)], ordered from least to most recently used
+        self._cache: OrderedDict[str, List[Tuple[float, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expirations = 0
+        self._next_purge = 0.0
 
     def get_calls(self, conversation_id: str) -> List[Any]:
         """Get improvement tool calls for a conversation ID."""
-        return self._cache.get(conversation_id, [])
+        now = time.monotonic()
+        with self._lock:
+            entries = self._live_entries(conversation_id, now)
+            self._purge_expired(now)
+            if entries:
+                self._cache.move_to_end(conversation_id)
+            return [call for _, call in entries]
 
     def add_calls(self, conversation_id: str, tool_calls: List[Any]) -> None:
         """Add improvement tool calls to existing ones for a conversation ID."""
-        if conversation_id not in self._cache:
-            self._cache[conversation_id] = []
-        self._cache[conversation_id].extend(tool_calls)
+        now = time.monotonic()
+        expires_at = now + self.ttl_seconds
+
+        with self._lock:
+            entries = self._live_entries(conversation_id, now)
+            entries.extend((expires_at, call) for call in tool_calls)
+            self._cache[conversation_id] = entries
+            self._cache.move_to_end(conversation_id)
+            self._purge_expired(now)
+            self._evict_overflow()
 
     def remove_calls(
         self, conversation_id: str, filter_criteria: Dict[str, str]
     ) -> None:
         """Remove improvement tool calls that match filter criteria."""
-        if conversation_id not in self._cache:
+        with self._lock:
+            if conversation_id not in self._cache:
+                return
+
+            self._cache[conversation_id] = [
+                (expires_at, call)
+                for expires_at, call in self._cache[conversation_id]
+                if not _matches_filter(call, filter_criteria)
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get size and eviction metrics of the cache."""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "conversations": len(self._cache),
+                "entries": sum(len(entries) for entries in self._cache.values()),
+                "max_conversations": self.max_conversations,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _live_entries(
+        self, conversation_id: str, now: float
+    ) -> List[Tuple[float, Any]]:
+        """Drop expired entries of a conversation and return the remaining ones."""
+        entries = self._cache.get(conversation_id)
+        if entries is None:
+            return []
+
+        live = [(expires_at, call) for expires_at, call in entries if expires_at > now]
+        self._expirations += len(entries) - len(live)
+        if live:
+            self._cache[conversation_id] = live
+        else:
+            del self._cache[conversation_id]
+        return live
+
+    def _purge_expired(self, now: float) -> None:
+        """Drop the expired entries of every conversation, once per purge interval."""
+        if now < self._next_purge:
             return
+        self._next_purge = now + PURGE_INTERVAL_SECONDS
+        for conversation_id in list(self._cache):
+            self._live_entries(conversation_id, now)
+
+    def _evict_overflow(self) -> None:
+        """Evict least recently used conversations above the configured cap."""
+        while len(self._cache) > self.max_conversations:
+            _, entries = self._cache.popitem(last=False)
+            self._evictions += 1
+            logger.debug(f"Evicted {len(entries)} improvement tool calls from cache")
+
+
+IMPROVEMENT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS improvement_conversations (
+    conversation_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_improvement_conversations_access
+ON improvement_conversations(last_access);
+CREATE TABLE IF NOT EXISTS improvement_tool_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    tool_call TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_improvement_tool_calls_conversation
+ON improvement_tool_calls(conversation_id, expires_at);
+"""
+
+
+class SQLiteImprovementToolCallsCache:
+    """SQLite-backed improvement cache shared between workers and kept across restarts."""
+
+    def __init__(
+        self,
+        db_path: str = None,
+        ttl_seconds: int = None,
+        max_conversations: int = None,
+    ):
+        """Initialize the cache tables.
+
+        Args:
+            db_path: Path to the SQLite database. Defaults to STATE_DATABASE_PATH.
+            ttl_seconds: Lifetime of each tool call. Defaults to IMPROVEMENT_CACHE_TTL_SECONDS.
+            max_conversations: Maximum conversations kept before LRU eviction.
+        """
+        self.ttl_seconds = ttl_seconds or config.IMPROVEMENT_CACHE_TTL_SECONDS
+        self.max_conversations = (
+            max_conversations or config.IMPROVEMENT_CACHE_MAX_CONVERSATIONS
+        )
+        self.store = StateStore(db_path=db_path, schema=IMPROVEMENT_CACHE_SCHEMA)
+        # Counters are per process, the stored sizes are shared
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expirations = 0
+        self._next_purge = 0.0
+
+    def get_calls(self, conversation_id: str) -> List[Any]:
+        """Get improvement tool calls for a conversation ID."""
+        now = time.time()
+        with self.store.connection() as conn:
+            self._delete_expired(conn, now, conversation_id)
+            self._purge_expired(conn, now)
+            rows = conn.execute(
+                "SELECT tool_call FROM improvement_tool_calls WHERE conversation_id = ? ORDER BY id",
+                (conversation_id,),
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    "UPDATE improvement_conversations SET last_access = ? WHERE conversation_id = ?",
+                    (now, conversation_id),
+                )
+        return [json.loads(row["tool_call"]) for row in rows]
+
+    def add_calls(self, conversation_id: str, tool_calls: List[Any]) -> None:
+        """Add improvement tool calls to existing ones for a conversation ID."""
+        now = time.time()
+        with self.store.connection() as conn:
+            conn.executemany(
+                "INSERT INTO improvement_tool_calls (conversation_id, tool_call, expires_at) VALUES (?, ?, ?)",
+                [
+                    (conversation_id, json.dumps(call), now + self.ttl_seconds)
+                    for call in tool_calls
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO improvement_conversations (conversation_id, last_access) VALUES (?, ?)",
+                (conversation_id, now),
+            )
+            self._purge_expired(conn, now)
+            self._evict_overflow(conn)
 
-        self._cache[conversation_id] = [
-            call
-            for call in self._cache[conversation_id]
-            if not all(
-                call.get("args", {}).get(key) == value
-                for key, value in filter_criteria.items()
+    def remove_calls(
+        self, conversation_id: str, filter_criteria: Dict[str, str]
+    ) -> None:
+        """Remove improvement tool calls that match filter criteria."""
+        with self.store.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, tool_call FROM improvement_tool_calls WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchall()
+            ids_to_remove = [
+                (row["id"],)
+                for row in rows
+                if _matches_filter(json.loads(row["tool_call"]), filter_criteria)
+            ]
+            conn.executemany(
+                "DELETE FROM improvement_tool_calls WHERE id = ?", ids_to_remove
             )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get size and eviction metrics of the cache."""
+        with self.store.connection() as conn:
+            conversations = conn.execute(
+                "SELECT COUNT(*) FROM improvement_conversations"
+            ).fetchone()[0]
+            entries = conn.execute(
+                "SELECT COUNT(*) FROM improvement_tool_calls"
+            ).fetchone()[0]
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "conversations": conversations,
+                "entries": entries,
+                "max_conversations": self.max_conversations,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _delete_expired(self, conn, now: float, conversation_id: str) -> None:
+        """Delete the expired tool calls of one conversation, and the conversation once empty."""
+        cursor = conn.execute(
+            "DELETE FROM improvement_tool_calls WHERE conversation_id = ? AND expires_at <= ?",
+            (conversation_id, now),
+        )
+        conn.execute(
+            "DELETE FROM improvement_conversations WHERE conversation_id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM improvement_tool_calls WHERE conversation_id = ?)",
+            (conversation_id, conversation_id),
+        )
+        with self._lock:
+            self._expirations += cursor.rowcount
+
+    def _purge_expired(self, conn, now: float) -> None:
+        """Delete the expired tool calls of every conversation, once per purge interval."""
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + PURGE_INTERVAL_SECONDS
+
+        cursor = conn.execute(
+            "DELETE FROM improvement_tool_calls WHERE expires_at <= ?", (now,)
+        )
+        conn.execute(
+            "DELETE FROM improvement_conversations WHERE NOT EXISTS "
+            "(SELECT 1 FROM improvement_tool_calls "
+            "WHERE improvement_tool_calls.conversation_id = improvement_conversations.conversation_id)"
+        )
+        with self._lock:
+            self._expirations += cursor.rowcount
+
+    def _evict_overflow(self, conn) -> None:
+        """Evict least recently used conversations above the configured cap."""
+        evicted = [
+            row["conversation_id"]
+            for row in conn.execute(
+                "SELECT conversation_id FROM improvement_conversations "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_conversations,),
+            ).fetchall()
         ]
+        if not evicted:
+            return
+
+        conn.executemany(
+            "DELETE FROM improvement_tool_calls WHERE conversation_id = ?",
+            [(conversation_id,) for conversation_id in evicted],
+        )
+        conn.executemany(
+            "DELETE FROM improvement_conversations WHERE conversation_id = ?",
+            [(conversation_id,) for conversation_id in evicted],
+        )
+        with self._lock:
+            self._evictions += len(evicted)
+
+
+def create_improvement_cache():
+    """Create the improvement cache for the configured backend."""
+    if config.IMPROVEMENT_CACHE_BACKEND == "sqlite":
+        return SQLiteImprovementToolCallsCache()
+    return ImprovementToolCallsCache()
 
 
 # Global cache instance
-improvement_cache = ImprovementToolCallsCache()
+improvement_cache = create_improvement_cache()
@@ -0,0 +1,181 @@
+"""Local pre-classifier deciding whether an improvement extraction call is worthwhile.
+
+Most refinement feedback is stylistic ("make it shorter", "more formal") and
+never yields glossary or rule updates. The gate scores the feedback with
+lexical cues and the diff between the previous and the refined translation,
+and the extraction LLM call is skipped when the score is below the threshold.
+"""
+
+import difflib
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from config import config
+from utils.logger import logger
+
+# Log the skip rate every this many decisions
+SKIP_RATE_LOG_INTERVAL = 50
+
+WORD_PATTERN = re.compile(r"[\w-]+", re.UNICODE)
+
+# Feedback cues that name a term or a general rule, with their weight
+TERM_CUE_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), weight)
+    for pattern, weight in (
+        (r"[\"'“”«»‘’`].+?[\"'“”«»‘’`]", 0.3),  # quoted words
+        (r"->|→|=>", 0.3),
+        (r"\binstead of\b", 0.3),
+        (r"\bshould (be|say|read)\b", 0.25),
+        (r"\btranslate[sd]?\b.+\bas\b", 0.3),
+        (r"\b(always|never|every time|whenever)\b", 0.35),
+        (r"\b(term|word|glossary|rule|terminology|spelling)\b", 0.2),
+        (r"\bnot\b.+\bbut\b", 0.2),
+        (r"\b(use|say|write|call it)\b", 0.15),
+    )
+]
+
+STYLE_WORDS = {
+    "shorter",
+    "longer",
+    "short",
+    "long",
+    "formal",
+    "informal",
+    "casual",
+    "tone",
+    "concise",
+    "simpler",
+    "simple",
+    "simplify",
+    "fluent",
+    "natural",
+    "polite",
+    "friendly",
+    "rephrase",
+    "reword",
+    "better",
+    "professional",
+    "style",
+    "smoother",
+}
+
+
+@dataclass
+class GateDecision:
+    """Score of a refinement and whether the extraction call should run."""
+
+    score: float
+    worthwhile: bool
+    features: Dict[str, Any] = field(default_factory=dict)
+
+
+def _words(text: str) -> list[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+class ImprovementGate:
+    """Score refinements and track how many extraction calls are skipped."""
+
+    def __init__(self, threshold: float = None):
+        """Initialize the gate.
+
+        Args:
+            threshold: Minimum score to run the extraction. 0 always runs it.
+        """
+        self.threshold = (
+            config.IMPROVEMENT_GATE_THRESHOLD if threshold is None else threshold
+        )
+        self._lock = threading.Lock()
+        self._decisions = 0
+        self._skipped = 0
+
+    def score(
+        self, feedback: str, previous_translation: str, new_translation: str
+    ) -> GateDecision:
+        """Score how likely the feedback is to produce glossary or rule updates."""
+        feedback_words = _words(feedback)
+        previous_words = _words(previous_translation)
+        new_words = _words(new_translation)
+
+        term_cues = sum(
+            weight for pattern, weight in TERM_CUE_PATTERNS if pattern.search(feedback)
+        )
+        style_words = sum(1 for word in feedback_words if word in STYLE_WORDS)
+
+        # Words the refinement introduced that the user wrote in the feedback
+        introduced = set(new_words) - set(previous_words)
+        requested_words = len(introduced & set(feedback_words))
+
+        matcher = difflib.SequenceMatcher(a=previous_words, b=new_words, autojunk=False)
+        similarity = matcher.ratio()
+        replaced_words = sum(
+            max(i2 - i1, j2 - j1)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != "equal"
+        )
+        # A few words swapped in an otherwise unchanged text looks like terminology
+        targeted_change = 0 < replaced_words <= 6 and similarity >= 0.8
+
+        score = 0.0
+        score += min(term_cues, 0.7)
+        score += 0.3 if requested_words else 0.0
+        score += 0.2 if targeted_change else 0.0
+        if style_words and term_cues < 0.3:
+            score -= 0.3
+        if similarity < 0.5:
+            # Full rewrites come from stylistic requests
+            score -= 0.1
+        score = max(0.0, min(1.0, score))
+
+        return GateDecision(
+            score=score,
+            worthwhile=score >= self.threshold,
+            features={
+                "term_cues": round(term_cues, 2),
+                "style_words": style_words,
+                "requested_words": requested_words,
+                "replaced_words": replaced_words,
+                "similarity": round(similarity, 3),
+            },
+        )
+
+    def should_extract(
+        self, feedback: str, previous_translation: str, new_translation: str
+    ) -> bool:
+        """Decide whether to run the extraction call and record the decision."""
+        if self.threshold <= 0:
+            return True
+
+        decision = self.score(feedback, previous_translation, new_translation)
+        logger.info(
+            f"Improvement gate score: {decision.score:.2f} (threshold {self.threshold}). "
+            f"Extract: {decision.worthwhile}. Features: {decision.features}"
+        )
+
+        with self._lock:
+            self._decisions += 1
+            if not decision.worthwhile:
+                self._skipped += 1
+            if self._decisions % SKIP_RATE_LOG_INTERVAL == 0:
+                logger.info(
+                    f"Improvement gate skip rate: {self._skipped}/{self._decisions} "
+                    f"({self._skipped / self._decisions:.0%})"
+                )
+
+        return decision.worthwhile
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of decisions and skipped extraction calls."""
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "decisions": self._decisions,
+                "skipped": self._skipped,
+                "skip_rate": self._skipped / self._decisions if self._decisions else 0,
+            }
+
+
+# Global gate instance
+improvement_gate = ImprovementGate()
@@ -1,30 +1,73 @@
 """LLM service for the backend."""
 
+import asyncio
 import time
-from collections import deque
+from dataclasses import replace
 from datetime import datetime
+from typing import Any, Callable
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
 
 from config import config
+from constants import PRIORITY_FREE, PRIORITY_PAID
 from utils.logger import logger
+from utils.model_router import (
+    FALLBACK_ROUTE,
+    FAST_ROUTE,
+    PRIMARY_ROUTE,
+    ModelRouter,
+    RoutingDecision,
+    RoutingRequest,
+)
+from utils.provider_pool import PoolMember, ProviderPool
+from utils.rate_limit_store import create_rate_limit_store
+from utils.token_estimator import token_estimator
 from utils.user_tracking_service import UserTrackingService
 
 # Theoretically are like 250000 on the free google api rate but let's keep it to 50k to be safe
+# Budget of each API key, a pool of keys gets the sum of its available keys
 MAX_TOKENS_PER_MINUTE = 50000
 
 
+def _input_tokens(response: Any) -> int | None:
+    """Get the prompt tokens of a plain message answer, None for structured outputs."""
+    if isinstance(response, dict):
+        # The provider adds the output schema to the prompt
+        return None
+    return response.usage_metadata.get("input_tokens")
+
+
+def _total_tokens(response: Any) -> int:
+    """Get the total tokens of a message or of a structured output with its raw message."""
+    message = response["raw"] if isinstance(response, dict) else response
+    return message.usage_metadata["total_tokens"]
+
+
 class LLM_Service:
     """LLM service for the backend."""
 
     def __init__(self):
-        """Initialize the LLM service with primary and fallback models."""
+        """Initialize the LLM service with primary, fallback and optional fast models.
+
+        Each model is a pool with one client per configured API key.
+        """
         print("GOOGLE_LLM_MODEL", config.GOOGLE_LLM_MODEL)
-        self.llm_primary = init_chat_model(config.GOOGLE_LLM_MODEL)
-        self.llm_fallback = init_chat_model(config.OPENAI_LLM_MODEL)
-        self.history = deque()
-        self.penalty_until = 0
+        # Token history and penalty may be shared with other workers
+        self.rate_limits = create_rate_limit_store()
+        models = {
+            PRIMARY_ROUTE: config.GOOGLE_LLM_MODEL,
+            FALLBACK_ROUTE: config.OPENAI_LLM_MODEL,
+        }
+        if config.FAST_LLM_MODEL:
+            models[FAST_ROUTE] = config.FAST_LLM_MODEL
+        self.pools = {
+            route: ProviderPool(route, model, self.rate_limits, MAX_TOKENS_PER_MINUTE)
+            for route, model in models.items()
+        }
+        self.llm_primary = self.pools[PRIMARY_ROUTE].members[0].llm
+        self.llm_fallback = self.pools[FALLBACK_ROUTE].members[0].llm
+        self.router = ModelRouter(routes=self.pools)
         self._user_tracking = None
 
     @property
@@ -37,75 +80,289 @@ class LLM_Service:
     def print_history(self):
         """Print the token usage history for debugging purposes."""
         now = time.time()
-        if not self.history:
-            logger.info("History is empty.")
-            return
-        logger.info("\n=== Token History ===")
-        for ts, tokens in list(self.history):
-            dt = datetime.fromtimestamp(ts).strftime("%H:%M:%S")
-            minutes_ago = round((now - ts) / 60, 2)
-            logger.info(f"{dt} | {tokens} tokens | {minutes_ago} min ago")
-        logger.info("=====================\n")
-
-    def invoke(self, prompt: str) -> BaseMessage:
-        """Invoke the LLM with the given prompt."""
-        now = time.time()
+        for member in self.pools[PRIMARY_ROUTE].members:
+            history = self.rate_limits.history(member.bucket, now)
+            if not history:
+                logger.info(f"History of {member.bucket} is empty.")
+                continue
+            logger.info(f"\n=== Token History ({member.bucket}) ===")
+            for ts, tokens in history:
+                dt = datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+                minutes_ago = round((now - ts) / 60, 2)
+                logger.info(f"{dt} | {tokens} tokens | {minutes_ago} min ago")
+            logger.info("=====================\n")
 
-        # Clean history (older than 60s)
-        while self.history and now - self.history[0][0] > 60:
-            self.history.popleft()
+    def invoke(
+        self, prompt: str, *, source_text: str = None, language_pair: str = None
+    ) -> BaseMessage:
+        """Invoke the LLM with the given prompt.
 
-        # Calculate tokens used in last minute for rate limiting
-        tokens_last_min = sum(t for _, t in self.history)
-
-        # Select appropriate LLM based on rate limits and penalty mode
-        llm = self._select_llm(now, tokens_last_min)
-
-        # Invoke the LLM
-        try:
-            response = llm.invoke(prompt)
-            logger.info(f"LLM MODEL USED: {llm.get_name()}")
-            tokens_used = response.usage_metadata["total_tokens"]
-        except Exception as e:
-            logger.error(f"Error with {llm.get_name()}: {e}")
-            # If primary failed, activate penalty and retry with fallback
-            if llm is self.llm_primary:
-                self.penalty_until = now + 300  # 5 min penalty
-                tokens_used = 0  # Fake high token count for penalty
-                self.history.append((now, tokens_used))
-                logger.warning(
-                    "Primary failed. Forcing fallback + penalty mode for 5 minutes."
+        Args:
+            prompt: Prompt sent to the model.
+            source_text: Text being translated, used to route short texts to the fast model.
+            language_pair: Language pair of the call (e.g. "en-es"), used for routing.
+        """
+        return self._invoke(prompt, lambda llm: llm, source_text, language_pair)
+
+    def invoke_structured(
+        self,
+        prompt: str,
+        schema: type[BaseModel],
+        *,
+        source_text: str = None,
+        language_pair: str = None,
+    ) -> BaseModel:
+        """Invoke the LLM and parse its answer into the given schema.
+
+        Goes through the same routing, rate limiting, fallback and usage tracking as invoke.
+        """
+        result = self._invoke(
+            prompt,
+            lambda llm: llm.with_structured_output(schema, include_raw=True),
+            source_text,
+            language_pair,
+        )
+        if result["parsing_error"]:
+            raise result["parsing_error"]
+        return result["parsed"]
+
+    async def ainvoke(
+        self, prompt: str, *, source_text: str = None, language_pair: str = None
+    ) -> BaseMessage:
+        """Invoke the LLM asynchronously, the call is aborted if the task is cancelled."""
+        return await self._ainvoke(prompt, lambda llm: llm, source_text, language_pair)
+
+    async def ainvoke_structured(
+        self,
+        prompt: str,
+        schema: type[BaseModel],
+        *,
+        source_text: str = None,
+        language_pair: str = None,
+    ) -> BaseModel:
+        """Asynchronous version of invoke_structured."""
+        result = await self._ainvoke(
+            prompt,
+            lambda llm: llm.with_structured_output(schema, include_raw=True),
+            source_text,
+            language_pair,
+        )
+        if result["parsing_error"]:
+            raise result["parsing_error"]
+        return result["parsed"]
+
+    def _invoke(
+        self,
+        prompt: str,
+        prepare: Callable[[Any], Any],
+        source_text: str | None,
+        language_pair: str | None,
+    ) -> Any:
+        """Invoke the runnable built by prepare() from the routed LLM."""
+        now, decision = self._route(prompt, source_text, language_pair)
+        tried = []
+        decision, member = self._next_member(decision, now, tried)
+        while True:
+            started = time.monotonic()
+            try:
+                response = prepare(member.llm).invoke(prompt)
+            except Exception as e:
+                tried.append(member)
+                retry = self._handle_failure(decision, member, now, started, e, tried)
+                if retry is None:
+                    raise
+                decision, member = retry
+                continue
+
+            self._record_usage(decision, member, prompt, now, started, response)
+            return response
+
+    async def _ainvoke(
+        self,
+        prompt: str,
+        prepare: Callable[[Any], Any],
+        source_text: str | None,
+        language_pair: str | None,
+    ) -> Any:
+        """Asynchronous version of _invoke.
+
+        Cancellation propagates into the provider request. A cancelled call is
+        not a provider failure and, as no usage is reported, nothing is recorded.
+        Routing and recording read and write the rate limit store and the user
+        quotas, so they run in a thread instead of blocking the event loop.
+        """
+        now, decision = await asyncio.to_thread(
+            self._route, prompt, source_text, language_pair
+        )
+        tried = []
+        decision, member = await asyncio.to_thread(
+            self._next_member, decision, now, tried
+        )
+        while True:
+            started = time.monotonic()
+            try:
+                response = await prepare(member.llm).ainvoke(prompt)
+            except asyncio.CancelledError:
+                logger.info(f"LLM call to {member.bucket} cancelled")
+                self.router.record(
+                    decision,
+                    "cancelled",
+                    time.monotonic() - started,
+                    model=member.llm.get_name(),
                 )
-                return self.llm_fallback.invoke(prompt)
-            else:
                 raise
+            except Exception as e:
+                tried.append(member)
+                retry = await asyncio.to_thread(
+                    self._handle_failure, decision, member, now, started, e, tried
+                )
+                if retry is None:
+                    raise
+                decision, member = retry
+                continue
 
-        # Update history for primary model rate limiting
-        if llm is self.llm_primary:
-            self.history.append((now, tokens_used))
+            await asyncio.to_thread(
+                self._record_usage, decision, member, prompt, now, started, response
+            )
+            return response
 
-        # Update user tracking (handles both user ID and IP logic)
-        self.user_tracking.check_and_update_usage(tokens_used)
+    def _route(
+        self, prompt: str, source_text: str | None, language_pair: str | None
+    ) -> tuple[float, RoutingDecision]:
+        """Get the call timestamp and the routing decision for it."""
+        now = time.time()
+        primary = self.pools[PRIMARY_ROUTE]
 
-        # logger.info(
-        #     f"Model={llm.get_name()} | TokensThisCall={tokens_used} | TokensLastMin={tokens_last_min + tokens_used}"
-        # )
+        # Calculate tokens used in last minute for rate limiting
+        tokens_last_min = primary.tokens_in_window(now)
+        tier = self.user_tracking.get_priority_tier()
+        available_budget = primary.budget(now)
 
-        return response
+        # The answer of a translation is about as long as the translated text
+        estimated_tokens = token_estimator.estimate(
+            prompt, primary.model
+        ) + token_estimator.estimate(source_text or "", primary.model)
 
-    def _select_llm(self, now: float, tokens_last_min: int):
-        """Select the appropriate LLM based on current conditions."""
-        # Check penalty mode
-        if now < self.penalty_until:
-            return self.llm_fallback
-        elif tokens_last_min > MAX_TOKENS_PER_MINUTE:
+        decision = self.router.choose(
+            RoutingRequest(
+                prompt_chars=len(prompt),
+                source_chars=len(source_text if source_text is not None else prompt),
+                language_pair=language_pair,
+                tier=tier,
+                tokens_last_min=tokens_last_min,
+                token_budget=self._token_budget(tier, available_budget),
+                # Every primary key is out of rotation
+                penalised=available_budget == 0,
+                estimated_tokens=estimated_tokens,
+            )
+        )
+        if decision.reason == "budget":
             logger.warning(
-                f"Token usage in last minute = {tokens_last_min} (> {MAX_TOKENS_PER_MINUTE}). "
+                f"Token usage in last minute = {tokens_last_min} (budget {decision.request.token_budget} for {tier} tier). "
                 f"Switching to fallback model: {self.llm_fallback.get_name()}"
             )
-            return self.llm_fallback
+        return now, decision
+
+    def _next_member(
+        self, decision: RoutingDecision, now: float, tried: list[PoolMember]
+    ) -> tuple[RoutingDecision, PoolMember] | None:
+        """Get the least used key of the route not tried yet, moving to the fallback if none is left."""
+        member = self.pools[decision.route].acquire(now, exclude=tried)
+        if member is not None:
+            return decision, member
+
+        if decision.route != FALLBACK_ROUTE:
+            fallback = replace(
+                decision,
+                route=FALLBACK_ROUTE,
+                reason=f"no {decision.route} key available",
+            )
+            return self._next_member(fallback, now, tried)
+
+        # The fallback is the last resort, use it even if out of rotation
+        member = self.pools[FALLBACK_ROUTE].acquire(
+            now, exclude=tried, ignore_penalties=True
+        )
+        return (decision, member) if member is not None else None
+
+    def _handle_failure(
+        self,
+        decision: RoutingDecision,
+        member: PoolMember,
+        now: float,
+        started: float,
+        error: Exception,
+        tried: list[PoolMember],
+    ) -> tuple[RoutingDecision, PoolMember] | None:
+        """Log a failed call, take its key out of rotation if rate-limited or failing and get the key to retry with, if any."""
+        logger.error(f"Error with {member.llm.get_name()} ({member.bucket}): {error}")
+        self.router.record(
+            decision, "error", time.monotonic() - started, model=member.llm.get_name()
+        )
+        self.pools[decision.route].penalise(member, error, now)
+
+        # Retry with another key of the same model, then with the fallback
+        return self._next_member(
+            replace(decision, reason=f"retry after {member.bucket} error"), now, tried
+        )
+
+    def _record_usage(
+        self,
+        decision: RoutingDecision,
+        member: PoolMember,
+        prompt: str,
+        now: float,
+        started: float,
+        response: Any,
+    ) -> None:
+        """Record the tokens of a completed call for routing, rate limiting and user quotas."""
+        logger.info(f"LLM MODEL USED: {member.llm.get_name()} ({member.bucket})")
+        tokens_used = _total_tokens(response)
+        self.router.record(
+            decision,
+            "ok",
+            time.monotonic() - started,
+            tokens=tokens_used,
+            model=member.llm.get_name(),
+        )
+
+        # Update history of the key for rate limiting and load balancing
+        self.pools[decision.route].record(member, tokens_used, now)
+
+        input_tokens = _input_tokens(response)
+        if input_tokens:
+            token_estimator.calibrate(
+                self.pools[decision.route].model, prompt, input_tokens
+            )
+
+        # Update user tracking (handles both user ID and IP logic)
+        self.user_tracking.check_and_update_usage(tokens_used)
+
+    def _token_budget(self, tier: str, budget: int) -> int:
+        """Get the primary model tokens per minute the tier may fill.
+
+        Paying subscribers can use the whole budget, a share of it is kept out
+        of reach of the other tiers, and anonymous traffic is moved to the
+        fallback first.
+        """
+        if tier == PRIORITY_PAID:
+            share = 1.0
+        elif tier == PRIORITY_FREE:
+            share = 1 - config.PAID_RESERVED_TOKEN_SHARE
         else:
-            return self.llm_primary
+            share = min(
+                config.ANONYMOUS_TOKEN_SHARE, 1 - config.PAID_RESERVED_TOKEN_SHARE
+            )
+        return int(budget * share)
+
+    def stats(self) -> dict:
+        """Get the routing averages and the usage of every key."""
+        now = time.time()
+        return {
+            "routes": self.router.stats(),
+            "keys": {route: pool.stats(now) for route, pool in self.pools.items()},
+            "token_estimator": token_estimator.stats(),
+        }
 
     def __call__(self, *args, **kwargs):
         """Allow LLM_Service() to be called directly like an LLM."""
@@ -0,0 +1,269 @@
+"""Routing policy choosing the model of each LLM call.
+
+Two policies are available:
+
+- ``static``: the primary model, unless it is penalised or the per-minute
+  token budget is spent, in which case the fallback.
+- ``adaptive``: also looks at the text length, the language pair and the
+  latency and error rate observed per model. Short texts go to the fast model
+  (if configured), long ones to the primary; a model failing or slower than
+  the latency target is avoided while another one is healthy; the fallback is
+  used as soon as the call would not fit in the remaining budget. An avoided
+  model still gets one probe call per interval, otherwise its averages would
+  never change and it would be avoided for good.
+
+Every decision is logged with its outcome as a single JSON line prefixed with
+``ROUTING_LOG_PREFIX`` so the policies can be compared offline.
+"""
+
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable
+
+from config import config
+from utils.logger import logger
+
+PRIMARY_ROUTE = "primary"
+FALLBACK_ROUTE = "fallback"
+FAST_ROUTE = "fast"
+
+ROUTING_POLICIES = ("static", "adaptive")
+
+ROUTING_LOG_PREFIX = "Routing decision: "
+
+# Weight of the latest call in the moving averages
+EWMA_ALPHA = 0.2
+
+# Calls observed before the error rate of a model is trusted
+MIN_SAMPLES = 5
+
+
+@dataclass
+class RouteStats:
+    """Moving averages of the calls made to a route."""
+
+    latency_seconds: float = 0.0
+    error_rate: float = 0.0
+    samples: int = 0
+    # Monotonic time of the last call, or of the last probe sent
+    updated_at: float = 0.0
+
+    def update(self, latency_seconds: float | None, error: bool) -> None:
+        """Add a call to the averages. Latency is only tracked for successful calls."""
+        if self.samples == 0:
+            self.error_rate = float(error)
+        else:
+            self.error_rate += EWMA_ALPHA * (float(error) - self.error_rate)
+        if latency_seconds is not None:
+            if not self.latency_seconds:
+                self.latency_seconds = latency_seconds
+            else:
+                self.latency_seconds += EWMA_ALPHA * (
+                    latency_seconds - self.latency_seconds
+                )
+        self.samples += 1
+        self.updated_at = time.monotonic()
+
+
+@dataclass
+class RoutingRequest:
+    """What the router knows about a call."""
+
+    prompt_chars: int
+    source_chars: int
+    language_pair: str | None
+    tier: str
+    tokens_last_min: int
+    token_budget: int
+    penalised: bool
+    # Prompt and expected answer, from the local token estimator
+    estimated_tokens: int = 0
+
+
+@dataclass
+class RoutingDecision:
+    """Route chosen for a call and why."""
+
+    route: str
+    reason: str
+    policy: str
+    request: RoutingRequest
+    stats: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+class ModelRouter:
+    """Choose the model of each call and keep the per-model health averages."""
+
+    def __init__(self, policy: str = None, routes: Iterable[str] = None):
+        """Initialize the router.
+
+        Args:
+            policy: "static" or "adaptive". Defaults to ROUTING_POLICY.
+            routes: Routes that have a model configured.
+        """
+        self.policy = (policy or config.ROUTING_POLICY).lower()
+        if self.policy not in ROUTING_POLICIES:
+            raise ValueError(
+                f"Unknown routing policy: {self.policy}. Expected one of {ROUTING_POLICIES}"
+            )
+        self.routes = set(routes or (PRIMARY_ROUTE, FALLBACK_ROUTE))
+        self.fast_max_chars = config.FAST_MODEL_MAX_CHARS
+        self.fast_language_pairs = set(config.FAST_MODEL_LANGUAGE_PAIRS)
+        self.max_error_rate = config.ROUTER_MAX_ERROR_RATE
+        self.latency_slo_seconds = config.ROUTER_LATENCY_SLO_SECONDS
+        self.probe_interval_seconds = config.ROUTER_PROBE_INTERVAL_SECONDS
+        self._stats: Dict[str, RouteStats] = {
+            route: RouteStats() for route in self.routes
+        }
+        self._lock = threading.Lock()
+
+    def choose(self, request: RoutingRequest) -> RoutingDecision:
+        """Choose the route of a call."""
+        if self.policy == "static":
+            route, reason = self._choose_static(request)
+        else:
+            route, reason = self._choose_adaptive(request)
+        return RoutingDecision(
+            route=route,
+            reason=reason,
+            policy=self.policy,
+            request=request,
+            stats=self.stats(),
+        )
+
+    def _choose_static(self, request: RoutingRequest) -> tuple[str, str]:
+        if request.penalised:
+            return FALLBACK_ROUTE, "penalty"
+        if request.tokens_last_min > request.token_budget:
+            return FALLBACK_ROUTE, "budget"
+        return PRIMARY_ROUTE, "default"
+
+    def _choose_adaptive(self, request: RoutingRequest) -> tuple[str, str]:
+        if request.penalised:
+            return FALLBACK_ROUTE, "penalty"
+        if request.tokens_last_min + request.estimated_tokens > request.token_budget:
+            return FALLBACK_ROUTE, "budget"
+
+        if self._fast_eligible(request):
+            # Not worth it if the fast model is slower than the primary in practice
+            if self._healthy(FAST_ROUTE) and not self._faster(
+                PRIMARY_ROUTE, FAST_ROUTE
+            ):
+                return FAST_ROUTE, "short text"
+            if self._probe_due(FAST_ROUTE):
+                return FAST_ROUTE, "probe"
+
+        reason = None
+        if not self._healthy(PRIMARY_ROUTE) and self._healthy(FALLBACK_ROUTE):
+            reason = "primary errors"
+        elif self._too_slow(PRIMARY_ROUTE) and self._faster(
+            FALLBACK_ROUTE, PRIMARY_ROUTE
+        ):
+            reason = "primary latency"
+        if reason is None:
+            return PRIMARY_ROUTE, "default"
+        if self._probe_due(PRIMARY_ROUTE):
+            return PRIMARY_ROUTE, "probe"
+        return FALLBACK_ROUTE, reason
+
+    def _fast_eligible(self, request: RoutingRequest) -> bool:
+        if FAST_ROUTE not in self.routes:
+            return False
+        if request.source_chars > self.fast_max_chars:
+            return False
+        if (
+            self.fast_language_pairs
+            and request.language_pair not in self.fast_language_pairs
+        ):
+            return False
+        return True
+
+    def _healthy(self, route: str) -> bool:
+        if route not in self.routes:
+            return False
+        with self._lock:
+            stats = self._stats[route]
+            return (
+                stats.samples < MIN_SAMPLES or stats.error_rate <= self.max_error_rate
+            )
+
+    def _too_slow(self, route: str) -> bool:
+        if not self.latency_slo_seconds:
+            return False
+        with self._lock:
+            return self._stats[route].latency_seconds > self.latency_slo_seconds
+
+    def _probe_due(self, route: str) -> bool:
+        """Whether an avoided route should get a probe call, reserving it if so.
+
+        Only the route actually chosen gets new samples, so a probe is sent once
+        no call went to the route for a probe interval.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats[route]
+            if now - stats.updated_at < self.probe_interval_seconds:
+                return False
+            # Concurrent calls don't all become probes
+            stats.updated_at = now
+            return True
+
+    def _faster(self, route: str, than: str) -> bool:
+        """Whether a healthy route has a lower observed latency than another one."""
+        if not self._healthy(route):
+            return False
+        with self._lock:
+            latency = self._stats[route].latency_seconds
+            other = self._stats[than].latency_seconds if than in self._stats else 0
+        return bool(latency and other and latency < other)
+
+    def record(
+        self,
+        decision: RoutingDecision,
+        outcome: str,
+        latency_seconds: float,
+        tokens: int = 0,
+        model: str = "",
+    ) -> None:
+        """Update the averages of the route and log the decision with its outcome.
+
+        Args:
+            decision: Decision returned by choose().
+            outcome: "ok", "error" or "cancelled". Cancelled calls don't update the averages.
+            latency_seconds: Duration of the call.
+            tokens: Tokens reported by the provider.
+            model: Name of the model that answered.
+        """
+        if outcome != "cancelled":
+            with self._lock:
+                self._stats[decision.route].update(
+                    latency_seconds if outcome == "ok" else None,
+                    error=outcome == "error",
+                )
+
+        entry = {
+            "policy": decision.policy,
+            "route": decision.route,
+            "reason": decision.reason,
+            "model": model,
+            **asdict(decision.request),
+            "stats": decision.stats,
+            "outcome": outcome,
+            "latency_seconds": round(latency_seconds, 3),
+            "tokens": tokens,
+        }
+        logger.info(ROUTING_LOG_PREFIX + json.dumps(entry))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the moving averages of every route."""
+        with self._lock:
+            return {
+                route: {
+                    "latency_seconds": round(stats.latency_seconds, 3),
+                    "error_rate": round(stats.error_rate, 3),
+                    "samples": stats.samples,
+                }
+                for route, stats in self._stats.items()
+            }
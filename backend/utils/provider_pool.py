@@ -0,0 +1,232 @@
+"""Pool of credentials of a model provider, each with its own token budget.
+
+A model configured with several API keys gets one client per key. Each key
+has its own tokens-per-minute bucket in the rate limit store, calls go to the
+key with the fewest tokens spent in the current window, and a key that is
+rate-limited or whose provider fails is taken out of rotation for a while. The
+budget of the pool is the sum of the budgets of its available keys, so
+throughput scales with the number of keys.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+from langchain.chat_models import init_chat_model
+
+from config import config
+from utils.logger import logger
+
+# Env var listing the API keys of each provider of init_chat_model
+PROVIDER_API_KEYS = {
+    "google_genai": "GOOGLE_API_KEYS",
+    "openai": "OPENAI_API_KEYS",
+}
+
+# How long a key is out of rotation after hitting its provider rate limit
+RATE_LIMITED_PENALTY_SECONDS = 60
+
+# How long a key is out of rotation after a failure of its provider (server
+# error, authentication, timeout), so calls don't keep paying for it
+PROVIDER_ERROR_PENALTY_SECONDS = 30
+
+RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "resource exhausted", "quota")
+
+# Statuses below 500 that are about the key or the provider, not the call
+PROVIDER_ERROR_STATUSES = (401, 403, 408)
+
+# Errors without a status: the provider couldn't be reached or didn't answer in time
+PROVIDER_ERROR_TYPE_MARKERS = ("timeout", "connect")
+
+# Google answers an invalid API key with a 400
+INVALID_KEY_MARKERS = ("api_key_invalid", "api key not valid")
+
+
+def _error_chain(error: Exception) -> List[BaseException]:
+    """Get an error and the errors it was raised from (the SDK errors under the LangChain ones)."""
+    chain = []
+    while error is not None and error not in chain:
+        chain.append(error)
+        error = error.__cause__
+    return chain
+
+
+def _status_code(error: Exception) -> int | None:
+    """Get the HTTP status of a provider error, None if it has none."""
+    for cause in _error_chain(error):
+        status = getattr(cause, "status_code", None) or getattr(cause, "code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether a provider error is a rate limit (HTTP 429 or quota) error."""
+    if _status_code(error) == 429:
+        return True
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+def is_provider_error(error: Exception) -> bool:
+    """Whether an error is a failure of the provider or the key rather than of the call.
+
+    Server errors, authentication errors, timeouts and connection errors are.
+    A bad request or an answer that can't be parsed are not, another call with
+    the same key may work.
+    """
+    message = str(error).lower()
+    if any(marker in message for marker in INVALID_KEY_MARKERS):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status in PROVIDER_ERROR_STATUSES
+    return any(
+        isinstance(cause, (TimeoutError, ConnectionError))
+        or any(
+            marker in type(cause).__name__.lower()
+            for marker in PROVIDER_ERROR_TYPE_MARKERS
+        )
+        for cause in _error_chain(error)
+    )
+
+
+def api_keys_for(model: str) -> List[str]:
+    """Get the API keys configured for the provider of a model ("provider:model")."""
+    if ":" not in model:
+        configured = [env for env in PROVIDER_API_KEYS.values() if getattr(config, env)]
+        if configured:
+            logger.warning(
+                f"{', '.join(configured)} ignored for model {model}, prefix it with "
+                f"its provider (e.g. google_genai:{model}) to balance calls across the keys"
+            )
+        return []
+    env_var = PROVIDER_API_KEYS.get(model.split(":", 1)[0])
+    return getattr(config, env_var) if env_var else []
+
+
+@dataclass
+class PoolMember:
+    """A client of the pool and the rate limit bucket of its key."""
+
+    bucket: str
+    llm: Any
+
+
+class ProviderPool:
+    """Clients of a model, one per API key, balanced by least-used budget."""
+
+    def __init__(
+        self,
+        route: str,
+        model: str,
+        rate_limits,
+        tokens_per_minute: int,
+        api_keys: Iterable[str] = None,
+    ):
+        """Initialize the pool.
+
+        Args:
+            route: Name of the route served by the pool, used as bucket prefix.
+            model: Model passed to init_chat_model ("provider:model").
+            rate_limits: Store of the token history and penalties.
+            tokens_per_minute: Budget of each key.
+            api_keys: API keys of the pool. Defaults to the keys configured for the provider,
+                or the provider's default credentials if none.
+        """
+        self.route = route
+        self.model = model
+        self.rate_limits = rate_limits
+        self.tokens_per_minute = tokens_per_minute
+        keys = list(api_keys if api_keys is not None else api_keys_for(model))
+
+        if not keys:
+            self.members = [PoolMember(bucket=route, llm=init_chat_model(model))]
+        else:
+            # Buckets are named after a hash of the key so every worker agrees on them
+            self.members = [
+                PoolMember(
+                    bucket=f"{route}:{hashlib.sha256(key.encode()).hexdigest()[:8]}",
+                    llm=init_chat_model(model, api_key=key),
+                )
+                for key in keys
+            ]
+
+    def available(self, now: float) -> List[PoolMember]:
+        """Get the members that are not out of rotation."""
+        return [
+            member
+            for member in self.members
+            if now >= self.rate_limits.penalty_until(member.bucket)
+        ]
+
+    def tokens_in_window(self, now: float) -> int:
+        """Get the tokens spent by the whole pool during the current window."""
+        return sum(
+            self.rate_limits.tokens_in_window(member.bucket, now)
+            for member in self.members
+        )
+
+    def budget(self, now: float) -> int:
+        """Get the tokens per minute of the available members."""
+        return self.tokens_per_minute * len(self.available(now))
+
+    def acquire(
+        self,
+        now: float,
+        exclude: Iterable[PoolMember] = (),
+        ignore_penalties: bool = False,
+    ) -> PoolMember | None:
+        """Get the member with the fewest tokens spent in the window.
+
+        Args:
+            now: Current timestamp.
+            exclude: Members not to use (e.g. already tried for this call).
+            ignore_penalties: Also consider members out of rotation.
+        """
+        excluded = {id(member) for member in exclude}
+        candidates = [
+            member
+            for member in (self.members if ignore_penalties else self.available(now))
+            if id(member) not in excluded
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda member: self.rate_limits.tokens_in_window(member.bucket, now),
+        )
+
+    def record(self, member: PoolMember, tokens: int, now: float) -> None:
+        """Record tokens spent by a member."""
+        self.rate_limits.record(member.bucket, tokens, now)
+
+    def penalise(self, member: PoolMember, error: Exception, now: float) -> None:
+        """Take a member out of rotation after a rate limit or provider error.
+
+        Other errors (a bad request, a response that can't be parsed...) are
+        about the call, not the key, so the key stays in rotation.
+        """
+        if is_rate_limit_error(error):
+            seconds = RATE_LIMITED_PENALTY_SECONDS
+        elif is_provider_error(error):
+            seconds = PROVIDER_ERROR_PENALTY_SECONDS
+        else:
+            return
+        self.rate_limits.set_penalty(member.bucket, now + seconds)
+        logger.warning(
+            f"{member.bucket} out of rotation for {seconds}s. "
+            f"Available {self.route} keys: {len(self.available(now))}/{len(self.members)}"
+        )
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        """Get the tokens spent and the availability of every member."""
+        return {
+            member.bucket: {
+                "tokens_last_min": self.rate_limits.tokens_in_window(
+                    member.bucket, now
+                ),
+                "available": now >= self.rate_limits.penalty_until(member.bucket),
+            }
+            for member in self.members
+        }
@@ -0,0 +1,144 @@
+"""Token usage history and penalty state used for LLM rate limiting.
+
+The in-memory store is per process. The SQLite store keeps the same state in
+the shared runtime-state database so every worker sees the tokens spent by the
+others and the penalties they triggered.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+from config import config
+from utils.state_store import StateStore
+
+# Window used for tokens-per-minute rate limiting
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+
+class MemoryRateLimitStore:
+    """Per-process token usage history, keyed by bucket (e.g. a model)."""
+
+    def __init__(self):
+        """Initialize the empty history."""
+        self._history: Dict[str, deque] = defaultdict(deque)
+        self._penalties: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, bucket: str, tokens: int, timestamp: float = None) -> None:
+        """Record tokens spent on a bucket."""
+        with self._lock:
+            self._history[bucket].append((timestamp or time.time(), tokens))
+
+    def history(self, bucket: str, now: float = None) -> List[Tuple[float, int]]:
+        """Get the (timestamp, tokens) records of the current window."""
+        now = now or time.time()
+        with self._lock:
+            history = self._history[bucket]
+            # Clean history (older than the window)
+            while history and now - history[0][0] > RATE_LIMIT_WINDOW_SECONDS:
+                history.popleft()
+            return list(history)
+
+    def tokens_in_window(self, bucket: str, now: float = None) -> int:
+        """Get the tokens spent on a bucket during the current window."""
+        return sum(tokens for _, tokens in self.history(bucket, now))
+
+    def set_penalty(self, bucket: str, until: float) -> None:
+        """Mark a bucket as penalised until the given timestamp."""
+        with self._lock:
+            self._penalties[bucket] = until
+
+    def penalty_until(self, bucket: str) -> float:
+        """Get the timestamp until which a bucket is penalised."""
+        with self._lock:
+            return self._penalties.get(bucket, 0)
+
+
+RATE_LIMIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_token_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bucket TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_token_usage_bucket
+ON llm_token_usage(bucket, created_at);
+CREATE TABLE IF NOT EXISTS llm_penalties (
+    bucket TEXT PRIMARY KEY,
+    penalty_until REAL NOT NULL
+);
+"""
+
+
+class SQLiteRateLimitStore:
+    """Token usage history shared between workers through SQLite."""
+
+    def __init__(self, db_path: str = None):
+        """Initialize the rate limit tables.
+
+        Args:
+            db_path: Path to the SQLite database. Defaults to STATE_DATABASE_PATH.
+        """
+        self.store = StateStore(db_path=db_path, schema=RATE_LIMIT_SCHEMA)
+
+    def record(self, bucket: str, tokens: int, timestamp: float = None) -> None:
+        """Record tokens spent on a bucket, dropping its records older than the window."""
+        timestamp = timestamp or time.time()
+        with self.store.connection() as conn:
+            conn.execute(
+                "DELETE FROM llm_token_usage WHERE bucket = ? AND created_at < ?",
+                (bucket, timestamp - RATE_LIMIT_WINDOW_SECONDS),
+            )
+            conn.execute(
+                "INSERT INTO llm_token_usage (bucket, created_at, tokens) VALUES (?, ?, ?)",
+                (bucket, timestamp, tokens),
+            )
+
+    def history(self, bucket: str, now: float = None) -> List[Tuple[float, int]]:
+        """Get the (timestamp, tokens) records of the current window."""
+        now = now or time.time()
+        with self.store.connection() as conn:
+            conn.execute(
+                "DELETE FROM llm_token_usage WHERE created_at < ?",
+                (now - RATE_LIMIT_WINDOW_SECONDS,),
+            )
+            rows = conn.execute(
+                "SELECT created_at, tokens FROM llm_token_usage WHERE bucket = ? ORDER BY created_at",
+                (bucket,),
+            ).fetchall()
+        return [(row["created_at"], row["tokens"]) for row in rows]
+
+    def tokens_in_window(self, bucket: str, now: float = None) -> int:
+        """Get the tokens spent on a bucket during the current window."""
+        now = now or time.time()
+        with self.store.connection() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(tokens), 0) FROM llm_token_usage WHERE bucket = ? AND created_at >= ?",
+                (bucket, now - RATE_LIMIT_WINDOW_SECONDS),
+            ).fetchone()
+        return row[0]
+
+    def set_penalty(self, bucket: str, until: float) -> None:
+        """Mark a bucket as penalised until the given timestamp."""
+        with self.store.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_penalties (bucket, penalty_until) VALUES (?, ?)",
+                (bucket, until),
+            )
+
+    def penalty_until(self, bucket: str) -> float:
+        """Get the timestamp until which a bucket is penalised."""
+        with self.store.connection() as conn:
+            row = conn.execute(
+                "SELECT penalty_until FROM llm_penalties WHERE bucket = ?", (bucket,)
+            ).fetchone()
+        return row["penalty_until"] if row else 0
+
+
+def create_rate_limit_store():
+    """Create the rate limit store for the configured state backend."""
+    if config.STATE_BACKEND == "sqlite":
+        return SQLiteRateLimitStore()
+    return MemoryRateLimitStore()
@@ -0,0 +1,71 @@
+"""Coalesce identical concurrent calls into a single execution."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """A call in flight and the callers waiting for it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run a coroutine once per key for concurrent callers and share the outcome.
+
+    The first caller of a key starts the coroutine; callers arriving while it
+    runs wait for it and receive the same result (or exception). A caller that
+    is cancelled stops waiting, and the call itself is cancelled once no caller
+    is left. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        """Initialize the table of calls in flight."""
+        self._calls: Dict[Hashable, _Call] = {}
+        self._executed = 0
+        self._shared = 0
+        self._cancelled = 0
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Run fn for the key, or wait for the call already in flight.
+
+        Returns:
+            Tuple of the result and whether it was shared from another caller.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self._shared += 1
+        else:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._executed += 1
+
+        call.waiters += 1
+        try:
+            # Shield the call so one caller's cancellation doesn't abort the others
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                self._cancelled += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of executed, shared, cancelled and in-flight calls."""
+        return {
+            "in_flight": len(self._calls),
+            "executed": self._executed,
+            "shared": self._shared,
+            "cancelled": self._cancelled,
+        }
@@ -0,0 +1,39 @@
+"""SQLite store for runtime state that must be shared between workers."""
+
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+from config import config
+
+
+class StateStore:
+    """Small SQLite wrapper for shared runtime state (caches, rate limits)."""
+
+    def __init__(self, db_path: str = None, schema: str = ""):
+        """Initialize the store and create its tables.
+
+        Args:
+            db_path: Path to the SQLite database. If None, uses STATE_DATABASE_PATH.
+            schema: SQL script creating the tables used by the caller.
+        """
+        self.db_path = db_path or config.STATE_DATABASE_PATH
+        with self.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if schema:
+                conn.executescript(schema)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection, committing on success and rolling back on error."""
+        # A generous timeout lets concurrent workers wait on each other's writes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
@@ -0,0 +1,127 @@
+"""Local token count estimator, calibrated against the usage reported by the models.
+
+Token counts are otherwise only known after a call, from ``usage_metadata``.
+The estimator counts tokens with a few script-aware heuristics (latin words
+take about four characters per token, CJK characters about one token each,
+punctuation one token) and multiplies the result by a per-model ratio learnt
+from the input tokens the provider reports for every completed call.
+"""
+
+import math
+import re
+import threading
+from typing import Dict
+
+# Characters covered by one token, per kind of text
+LATIN_CHARS_PER_TOKEN = 4
+# Cyrillic, Greek, Arabic, Hebrew, Devanagari... are split into shorter pieces
+OTHER_CHARS_PER_TOKEN = 2.5
+CJK_TOKENS_PER_CHAR = 1.0
+
+# Scripts costing about one token per character: kana, CJK ideographs, Hangul and Thai
+CJK_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\u0e00-\u0e7f]"
+)
+LATIN_WORD_PATTERN = re.compile(r"[A-Za-z0-9\u00c0-\u024f]+")
+OTHER_WORD_PATTERN = re.compile(r"[^\W_]+")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+# Weight of the latest call in the calibration ratio
+CALIBRATION_ALPHA = 0.1
+
+# Bounds of the calibration ratio, so a bad sample can't derail the estimate
+MIN_RATIO = 0.25
+MAX_RATIO = 4.0
+
+# Calls shorter than this are too noisy to calibrate with
+MIN_CALIBRATION_TOKENS = 20
+
+# Instructions, glossary and rules added around the user text in a translation prompt
+PROMPT_OVERHEAD_TOKENS = 400
+
+
+def raw_token_estimate(text: str) -> int:
+    """Estimate the tokens of a text with the uncalibrated heuristics."""
+    if not text:
+        return 0
+    cjk_chars = len(CJK_PATTERN.findall(text))
+    if cjk_chars:
+        text = CJK_PATTERN.sub(" ", text)
+
+    # Common short words are a single token, longer ones are split in pieces
+    latin_tokens = sum(
+        max(1, round(len(word) / LATIN_CHARS_PER_TOKEN))
+        for word in LATIN_WORD_PATTERN.findall(text)
+    )
+    other_text = LATIN_WORD_PATTERN.sub(" ", text)
+    other_tokens = sum(
+        max(1, round(len(word) / OTHER_CHARS_PER_TOKEN))
+        for word in OTHER_WORD_PATTERN.findall(other_text)
+    )
+    punctuation = len(PUNCTUATION_PATTERN.findall(text))
+    return math.ceil(
+        cjk_chars * CJK_TOKENS_PER_CHAR + latin_tokens + other_tokens + punctuation
+    )
+
+
+class TokenEstimator:
+    """Estimate token counts per model, calibrated with the observed usage."""
+
+    def __init__(self):
+        """Initialize the estimator with uncalibrated ratios."""
+        self._ratios: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, text: str, model: str = None) -> int:
+        """Estimate the tokens of a text for a model."""
+        with self._lock:
+            ratio = self._ratios.get(model, 1.0)
+        return math.ceil(raw_token_estimate(text) * ratio)
+
+    def estimate_translation(self, text: str, model: str = None) -> int:
+        """Estimate the total tokens of translating a text: prompt and answer."""
+        text_tokens = self.estimate(text, model)
+        return PROMPT_OVERHEAD_TOKENS + 2 * text_tokens
+
+    def estimate_refinement(
+        self, original_text: str, translation: str, feedback: str, model: str = None
+    ) -> int:
+        """Estimate the total tokens of refining a translation.
+
+        The prompt carries the original text, the current translation and the
+        feedback, and the answer is about as long as the translation.
+        """
+        return (
+            PROMPT_OVERHEAD_TOKENS
+            + self.estimate(original_text, model)
+            + 2 * self.estimate(translation, model)
+            + self.estimate(feedback, model)
+        )
+
+    def calibrate(self, model: str, text: str, actual_tokens: int) -> None:
+        """Update the ratio of a model with the tokens it reported for a text."""
+        raw = raw_token_estimate(text)
+        if raw < MIN_CALIBRATION_TOKENS or not actual_tokens:
+            return
+        observed = min(MAX_RATIO, max(MIN_RATIO, actual_tokens / raw))
+        with self._lock:
+            if model not in self._ratios:
+                self._ratios[model] = observed
+            else:
+                self._ratios[model] += CALIBRATION_ALPHA * (
+                    observed - self._ratios[model]
+                )
+            self._samples[model] = self._samples.get(model, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the calibration ratio and sample count of every model."""
+        with self._lock:
+            return {
+                model: {"ratio": round(ratio, 3), "samples": self._samples[model]}
+                for model, ratio in self._ratios.items()
+            }
+
+
+# Global estimator instance
+token_estimator = TokenEstimator()
@@ -16,7 +16,13 @@ from contextvars import ContextVar
 
 from fastapi import HTTPException, Request
 
-from constants import DEFAULT_IP_QUOTA_LIMIT, DEFAULT_USER_QUOTA_LIMIT
+from constants import (
+    DEFAULT_IP_QUOTA_LIMIT,
+    DEFAULT_USER_QUOTA_LIMIT,
+    PRIORITY_ANONYMOUS,
+    PRIORITY_FREE,
+    PRIORITY_PAID,
+)
 from database.connection import get_database_connection
 from database.user_ip_operations import UserIPOperations
 from database.user_operations import UserOperations
@@ -27,6 +33,9 @@ current_request_ip: ContextVar[str] = ContextVar(
     "current_request_ip", default="unknown"
 )
 current_user_id: ContextVar[str] = ContextVar("current_user_id", default="unknown")
+current_priority_tier: ContextVar[str] = ContextVar(
+    "current_priority_tier", default=PRIORITY_ANONYMOUS
+)
 
 
 class UserTrackingService:
@@ -142,6 +151,45 @@ class UserTrackingService:
         """Get the current request's IP address from context."""
         return current_request_ip.get()
 
+    def resolve_priority_tier(self) -> str:
+        """Look up the priority tier of the current user.
+
+        It queries the database, so async endpoints call it in the threadpool
+        and set the result in context with set_priority_tier.
+
+        Returns:
+            str: "paid" for active subscribers, "free" for other signed in users
+            and "anonymous" for IP-tracked requests.
+        """
+        user_id = self.get_user_id()
+        if not user_id or user_id == "unknown":
+            tier = PRIORITY_ANONYMOUS
+        else:
+            user = self.user_ops.get_user(user_id)
+            is_paid = user is not None and user.subscription_status == "active"
+            tier = PRIORITY_PAID if is_paid else PRIORITY_FREE
+        return tier
+
+    def set_priority_tier(self, tier: str) -> None:
+        """Set the current request's priority tier in context."""
+        current_priority_tier.set(tier)
+
+    def get_priority_tier(self) -> str:
+        """Get the current request's priority tier from context."""
+        return current_priority_tier.get()
+
+    def get_usage_owner(self) -> str:
+        """Get who the usage of the current request is charged to.
+
+        Returns:
+            str: "user:<user_id>" for signed in users, "ip:<address>" for
+            IP-tracked requests.
+        """
+        user_id = self.get_user_id()
+        if user_id and user_id != "unknown":
+            return f"user:{user_id}"
+        return f"ip:{self.get_request_ip()}"
+
     def check_and_update_usage(self, tokens_used: int) -> None:
         """Check usage limits and update token counts.
 
@@ -163,6 +211,39 @@ class UserTrackingService:
         else:
             self._handle_ip_tracking(ip_address, tokens_used)
 
+    def check_quota_for(self, estimated_tokens: int) -> None:
+        """Check before calling the LLM that the estimated tokens fit in the remaining quota.
+
+        Args:
+            estimated_tokens: Tokens the request is expected to use
+
+        Raises:
+            HTTPException: If the request would exceed the usage limit
+        """
+        user_id = self.get_user_id()
+
+        if user_id and user_id != "unknown":
+            user = self.user_ops.get_user(user_id)
+            if not user:
+                return
+            limit = user.quota_limit if user.quota_limit else DEFAULT_USER_QUOTA_LIMIT
+            used = user.quota_used
+        else:
+            user_ip = self.user_ip_ops.get_user_ip(self.get_request_ip())
+            limit = self.MAX_TOKENS_PER_IP
+            used = user_ip.token_count if user_ip else 0
+
+        if used + estimated_tokens > limit:
+            logger.warning(
+                f"Request of ~{estimated_tokens} tokens rejected, {used}/{limit} tokens already used"
+            )
+            raise HTTPException(
+                status_code=429,
+                detail=f"This request (~{estimated_tokens} tokens) would exceed your usage limit of {limit} tokens "
+                f"({max(limit - used, 0)} left). "
+                f"We are still in beta, join the waitlist to get access when it's released.",
+            )
+
     def _handle_user_tracking(self, user_id: str, tokens_used: int) -> None:
         """Handle tracking for authenticated users."""
         # Get user usage record (creates if doesn't exist)